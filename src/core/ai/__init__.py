@@ -32,8 +32,14 @@ from core.ai.tiers import (
     TIER_ECONOMY,
     TIERS,
 )
+from core.ai.ratelimit import (
+    PRIORITY_INTERACTIVE,
+    PRIORITY_NORMAL,
+    PRIORITY_BULK,
+    PRIORITIES,
+)
 from core.ai.errors import AIError, Kind
-from core.ai.cancellation import CancellationToken
+from core.ai.cancellation import CancellationToken, Deadline
 
 
 # ── Facade functions ────────────────────────────────────────────────────────
@@ -46,15 +52,37 @@ def complete(prompt: str, *,
              task: str = "",
              tier: str = TIER_STANDARD,
              provider: str | None = None,
-             model: str | None = None) -> str:
+             model: str | None = None,
+             use_cache: bool = True,
+             cache_hint: str | None = None,
+             priority: str | None = None,
+             deadline: float | Deadline | None = None) -> str:
     """Plain text completion.
 
     `task` is the namespace identifier (e.g. "translate", "subtitle.refine").
     Routing consults task_routing[task][tier] first, then falls back to
     tier_routing[tier] for legacy callers that pass task=''.
+
+    `use_cache=False` bypasses the on-disk response cache (X4).
+
+    `cache_hint` marks the stable leading part of `prompt` (e.g. the
+    instruction preamble every batch repeats) for the provider's prefix
+    cache (X4-A); see prompts.stable_prefix() and describe()'s
+    `supports_prefix_cache`.
+
+    `priority` ("interactive" / "normal" / "bulk") decides who gets the
+    provider's next free concurrency slot; None = the task's default
+    (config.TASK_PRIORITY). Bulk work ages up while waiting, so it is
+    delayed by interactive calls, never starved.
+
+    `deadline` is a time budget in seconds (or a Deadline shared by several
+    calls): fallbacks stop and the in-flight request is aborted when it runs
+    out. Every adapter call is also capped by the provider's timeout_sec.
     """
     return router.complete(prompt, task=task, tier=tier,
-                           provider=provider, model=model)
+                           provider=provider, model=model,
+                           use_cache=use_cache, cache_hint=cache_hint,
+                           priority=priority, deadline=deadline)
 
 
 def complete_json(prompt: str, *,
@@ -62,19 +90,125 @@ def complete_json(prompt: str, *,
                   task: str = "",
                   tier: str = TIER_STANDARD,
                   provider: str | None = None,
-                  model: str | None = None) -> dict:
-    """Structured JSON completion. See complete() for `task` semantics."""
+                  model: str | None = None,
+                  use_cache: bool = True,
+                  cache_hint: str | None = None,
+                  priority: str | None = None,
+                  deadline: float | Deadline | None = None) -> dict:
+    """Structured JSON completion. See complete() for `task` / `use_cache`
+    / `cache_hint` / `priority` / `deadline`."""
     return router.complete_json(
         prompt, schema=schema, task=task, tier=tier,
-        provider=provider, model=model,
+        provider=provider, model=model, use_cache=use_cache,
+        cache_hint=cache_hint, priority=priority, deadline=deadline,
+    )
+
+
+def complete_stream(prompt: str, *,
+                    task: str = "",
+                    tier: str = TIER_STANDARD,
+                    provider: str | None = None,
+                    model: str | None = None,
+                    use_cache: bool = True,
+                    cache_hint: str | None = None,
+                    priority: str | None = None,
+                    deadline: float | Deadline | None = None):
+    """Streaming text completion: iterator of text deltas (X5)."""
+    return router.complete_stream(prompt, task=task, tier=tier,
+                                  provider=provider, model=model,
+                                  use_cache=use_cache, cache_hint=cache_hint,
+                                  priority=priority, deadline=deadline)
+
+
+def complete_json_stream(prompt: str, *,
+                         schema: dict,
+                         stream_key: str,
+                         task: str = "",
+                         tier: str = TIER_STANDARD,
+                         provider: str | None = None,
+                         model: str | None = None,
+                         use_cache: bool = True,
+                         cache_hint: str | None = None,
+                         priority: str | None = None,
+                         deadline: float | Deadline | None = None,
+                         route: dict | None = None):
+    """Streaming complete_json(): iterator over the elements of the array
+    property `stream_key`, each yielded as soon as the model closes it.
+    A `route` dict receives the "provider" / "model" that answered."""
+    return router.complete_json_stream(
+        prompt, schema=schema, stream_key=stream_key, task=task, tier=tier,
+        provider=provider, model=model, use_cache=use_cache,
+        cache_hint=cache_hint, priority=priority, deadline=deadline,
+        route=route,
+    )
+
+
+def complete_json_batch(prompts: list, *,
+                        schema: dict,
+                        task: str = "",
+                        tier: str = TIER_STANDARD,
+                        provider: str | None = None,
+                        model: str | None = None,
+                        use_cache: bool = True,
+                        cache_hint: str | None = None,
+                        deadline: float | Deadline | None = None,
+                        poll_sec: float = 30.0,
+                        progress_cb=None,
+                        route: dict | None = None) -> list:
+    """complete_json() for many prompts as one offline provider batch job —
+    slow (minutes to hours) but cheap; for nightly bulk work. Blocks,
+    polling every `poll_sec`; a restarted process calling again with the
+    same prompts resumes the pending job. Returns a list parallel to
+    `prompts` of dicts / per-request Exceptions. Needs a provider with
+    "batch": true (describe()'s `supports_batch`). A `route` dict receives
+    the "provider" / "model" the job went to."""
+    return router.complete_json_batch(
+        prompts, schema=schema, task=task, tier=tier,
+        provider=provider, model=model, use_cache=use_cache,
+        cache_hint=cache_hint, deadline=deadline, poll_sec=poll_sec,
+        progress_cb=progress_cb, route=route,
     )
 
 
+def get_batch_jobs() -> list:
+    """Summaries of the offline batch jobs in the job table."""
+    return router.get_batch_jobs()
+
+
+def resume_batch_jobs() -> list:
+    """Poll every pending batch job once, collecting finished results."""
+    return router.resume_batch_jobs()
+
+
+def lookup_translations(texts: list, *, source_lang: str, target_lang: str,
+                        task: str = "translate", tier: str = TIER_STANDARD) -> dict:
+    """Translation memory: {index in `texts`: remembered translation} for
+    the provider and model `task` is routed to. Lines are matched after whitespace
+    normalization; hit / miss counts go to get_stats()."""
+    return router.lookup_translations(texts, source_lang=source_lang,
+                                      target_lang=target_lang, task=task, tier=tier)
+
+
+def store_translations(pairs: list, *, source_lang: str, target_lang: str,
+                       provider: str, model: str) -> None:
+    """Remember (source text, translation) pairs in the translation memory,
+    under the provider / model that answered (a call's `route`)."""
+    router.store_translations(pairs, source_lang=source_lang,
+                              target_lang=target_lang, provider=provider, model=model)
+
+
 def describe(task: str = "", tier: str = TIER_STANDARD) -> dict:
-    """Capability metadata for (task, tier). Phase 1 returns placeholders."""
+    """Capability metadata for (task, tier) — context window, JSON / stream /
+    cache support, safe concurrency, latency. See AIRouter.describe()."""
     return router.describe(task, tier)
 
 
+def get_stats() -> dict:
+    """Per-provider call counters (calls, tokens, cached_input_tokens,
+    latency, ...). See AIRouter.get_stats()."""
+    return router.get_stats()
+
+
 def asr(audio_path: str, *,
         task: str = "asr.transcribe",
         provider: str = "lemonfox",
@@ -123,6 +257,83 @@ def tts(text: str, output_path: str, *,
     )
 
 
+# ── Async facade ────────────────────────────────────────────────────────────
+# Same contracts as the sync functions above, for asyncio callers. They
+# share the router's routing, cache, limiter, stats and breakers.
+
+async def acomplete(prompt: str, *,
+                    task: str = "",
+                    tier: str = TIER_STANDARD,
+                    provider: str | None = None,
+                    model: str | None = None,
+                    use_cache: bool = True,
+                    cache_hint: str | None = None,
+                    priority: str | None = None,
+                    deadline: float | Deadline | None = None) -> str:
+    """Async complete(). Cancelling the awaiting task aborts the request."""
+    return await router.acomplete(prompt, task=task, tier=tier,
+                                  provider=provider, model=model,
+                                  use_cache=use_cache, cache_hint=cache_hint,
+                                  priority=priority, deadline=deadline)
+
+
+async def acomplete_json(prompt: str, *,
+                         schema: dict,
+                         task: str = "",
+                         tier: str = TIER_STANDARD,
+                         provider: str | None = None,
+                         model: str | None = None,
+                         use_cache: bool = True,
+                         cache_hint: str | None = None,
+                         priority: str | None = None,
+                         deadline: float | Deadline | None = None) -> dict:
+    """Async complete_json()."""
+    return await router.acomplete_json(prompt, schema=schema, task=task, tier=tier,
+                                       provider=provider, model=model,
+                                       use_cache=use_cache, cache_hint=cache_hint,
+                                       priority=priority, deadline=deadline)
+
+
+async def aasr(audio_path: str, *,
+               task: str = "asr.transcribe",
+               provider: str = "lemonfox",
+               language: str | None = None,
+               translate: bool = False,
+               speaker_labels: bool = False,
+               on_event=None) -> dict:
+    """Async asr(); the upload runs on a worker thread, so `on_event` is
+    called from that thread."""
+    _ = task
+    return await router.aasr(
+        audio_path,
+        provider=provider,
+        language=language,
+        translate=translate,
+        speaker_labels=speaker_labels,
+        on_event=on_event,
+    )
+
+
+async def atts(text: str, output_path: str, *,
+               task: str = "tts.synthesize",
+               provider: str = "fish_audio",
+               voice_id: str,
+               audio_format: str = "mp3",
+               should_cancel=None,
+               on_chunk=None) -> None:
+    """Async tts() on a worker thread; cancelling the awaiting task stops
+    the stream at the next chunk."""
+    _ = task
+    return await router.atts(
+        text, output_path,
+        provider=provider,
+        voice_id=voice_id,
+        audio_format=audio_format,
+        should_cancel=should_cancel,
+        on_chunk=on_chunk,
+    )
+
+
 def is_tts_sdk_available(provider: str = "fish_audio") -> bool:
     """Check whether the given TTS provider's SDK is installed."""
     from core.ai.providers import fish_audio as _fish_audio
@@ -146,14 +357,31 @@ __all__ = [
     "TIER_STANDARD",
     "TIER_ECONOMY",
     "TIERS",
+    "PRIORITY_INTERACTIVE",
+    "PRIORITY_NORMAL",
+    "PRIORITY_BULK",
+    "PRIORITIES",
     "AIError",
     "Kind",
     "CancellationToken",
+    "Deadline",
     "complete",
     "complete_json",
+    "complete_stream",
+    "complete_json_stream",
+    "complete_json_batch",
+    "get_batch_jobs",
+    "resume_batch_jobs",
+    "lookup_translations",
+    "store_translations",
     "describe",
+    "get_stats",
     "asr",
     "tts",
+    "acomplete",
+    "acomplete_json",
+    "aasr",
+    "atts",
     "is_tts_sdk_available",
     "list_models",
 ]
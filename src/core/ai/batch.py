@@ -0,0 +1,131 @@
+"""Persistent job table for offline provider batch jobs.
+
+Nightly back-catalogue translation doesn't need answers in seconds. Batch
+endpoints (OpenAI's /batches protocol) take a whole file of requests,
+answer within a completion window and bill at a discount. The router
+(`AIRouter.complete_json_batch`) packs many complete_json requests into one
+submission; this table is what lets the wait survive a restart.
+
+Layout (`config.batch_dir()`, i.e. `<repo>/user_data/ai_batches/`):
+
+    <job_id>.json  {"id", "provider", "model", "task", "remote_id",
+                    "status", "created", "updated", "progress",
+                    "requests": [custom_id, ...],
+                    "results":  {custom_id: value},
+                    "errors":   {custom_id: message},
+                    "error":    <whole-job failure message> | null}
+
+custom_ids are response-cache keys (cache.make_key), and the job id hashes
+(provider, model, custom_ids). Re-running the same submission — the nightly
+job restarted after a crash, say — therefore finds the existing job and
+resumes polling it instead of paying twice. Finished jobs answer re-runs
+from the table for `KEEP_SEC`, then are pruned.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+PENDING   = "pending"       # submitted, remote job not finished yet
+COMPLETED = "completed"     # results collected
+FAILED    = "failed"        # remote job failed / expired / was cancelled
+
+KEEP_SEC = 7 * 24 * 3600    # finished jobs are pruned after a week
+
+
+def make_job_id(provider: str, model: str, custom_ids: list) -> str:
+    payload = json.dumps([provider, model, sorted(custom_ids)],
+                         ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class BatchJobs:
+    """Thread-safe job table, one JSON file per job; writes are atomic.
+    Jobs are plain dicts — callers mutate one and hand it to save()."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def get(self, job_id: str) -> dict | None:
+        path = self._path(job_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def create(self, job_id: str, *, provider: str, model: str, task: str,
+               remote_id: str, requests: list) -> dict:
+        now = time.time()
+        job = {
+            "id":        job_id,
+            "provider":  provider,
+            "model":     model,
+            "task":      task,
+            "remote_id": remote_id,
+            "status":    PENDING,
+            "created":   now,
+            "updated":   now,
+            "progress":  {"completed": 0, "failed": 0, "total": len(requests)},
+            "requests":  list(requests),
+            "results":   {},
+            "errors":    {},
+            "error":     None,
+        }
+        self.save(job)
+        return job
+
+    def save(self, job: dict) -> None:
+        job["updated"] = time.time()
+        path = self._path(job["id"])
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(job, f, ensure_ascii=False)
+            os.replace(tmp, path)
+
+    def jobs(self) -> list:
+        """Every job in the table, oldest first. Prunes expired finished
+        jobs on the way."""
+        try:
+            names = [n for n in os.listdir(self.root) if n.endswith(".json")]
+        except OSError:
+            return []
+        found = []
+        cutoff = time.time() - KEEP_SEC
+        for name in names:
+            job = self.get(name[:-len(".json")])
+            if job is None:
+                continue
+            if job.get("status") != PENDING and job.get("updated", 0) < cutoff:
+                self.delete(job["id"])
+                continue
+            found.append(job)
+        found.sort(key=lambda j: j.get("created", 0))
+        return found
+
+    def pending(self) -> list:
+        return [j for j in self.jobs() if j.get("status") == PENDING]
+
+    def delete(self, job_id: str) -> None:
+        try:
+            os.remove(self._path(job_id))
+        except OSError:
+            pass
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.root, f"{job_id}.json")
+
+
+def summary(job: dict) -> dict:
+    """A job without its payload, for listings."""
+    return {key: job.get(key) for key in
+            ("id", "provider", "model", "task", "remote_id", "status",
+             "created", "updated", "progress", "error")}
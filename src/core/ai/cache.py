@@ -0,0 +1,191 @@
+"""Client-side response cache (X4 "B" — SHA256 content-addressed).
+
+Re-running translate / segments / refine on the same SRT while tuning a
+prompt used to pay full latency and tokens every time. The router now
+consults this cache before dispatching to a provider adapter.
+
+Layout on disk (`config.cache_dir()`, i.e. `<repo>/user_data/ai_cache/`):
+
+    ab/abcdef0123....json   {"created": <epoch>, "value": <str | dict>}
+
+The key is sha256 over (provider, model, task, prompt, schema), so any
+change to the prompt template or schema naturally misses. Entries expire
+after `ttl_sec`; the whole directory is capped at `max_bytes` with LRU
+eviction (file mtime is bumped on every hit so the order survives a
+restart).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+DEFAULT_TTL_SEC   = 7 * 24 * 3600         # 7 days
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024     # 100 MB
+
+
+def make_key(provider: str, model: str, prompt: str,
+             schema: dict | None = None, task: str = "") -> str:
+    """Hex sha256 of the request identity. Schema is serialized with
+    sorted keys so dict ordering doesn't cause spurious misses."""
+    payload = json.dumps(
+        [provider, model, task, prompt, schema],
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe disk cache with TTL + total-size LRU eviction.
+
+    The in-memory index (key -> file size, oldest first) is built lazily
+    from the directory on first use; disk errors never propagate to the
+    caller — a broken cache degrades to a miss, not a failed AI call.
+    """
+
+    def __init__(self, root: str, *,
+                 ttl_sec: float = DEFAULT_TTL_SEC,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 enabled: bool = True):
+        self.root = root
+        self.ttl_sec = ttl_sec
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._index: OrderedDict[str, int] | None = None
+        self._total = 0
+
+    # ── Public API ───────────────────────────────────────────────────────────
+
+    def get(self, key: str):
+        """Return the cached value, or None on miss / expiry / read error."""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        with self._lock:
+            self._ensure_index()
+            if key not in self._index:
+                return None
+        # File I/O happens outside the lock; only the index is shared.
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._discard(key)
+            return None
+        if time.time() - float(entry.get("created", 0)) > self.ttl_sec:
+            self._discard(key)
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+        return entry.get("value")
+
+    def put(self, key: str, value) -> None:
+        """Store `value` (str or JSON-serializable dict) under `key`."""
+        if not self.enabled or value is None:
+            return
+        path = self._path(key)
+        data = json.dumps({"created": time.time(), "value": value},
+                          ensure_ascii=False)
+        with self._lock:
+            self._ensure_index()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            self._total -= self._index.pop(key, 0)
+            self._index[key] = size
+            self._total += size
+            evicted = self._evict()
+        _remove(evicted)
+
+    def clear(self) -> None:
+        """Drop every entry (AI console / tests)."""
+        with self._lock:
+            self._ensure_index()
+            paths = [self._path(key) for key in self._index]
+            self._index.clear()
+            self._total = 0
+        _remove(paths)
+
+    def info(self) -> dict:
+        """{"entries", "bytes", "max_bytes", "ttl_sec", "enabled"}."""
+        with self._lock:
+            self._ensure_index()
+            return {
+                "entries":   len(self._index),
+                "bytes":     self._total,
+                "max_bytes": self.max_bytes,
+                "ttl_sec":   self.ttl_sec,
+                "enabled":   self.enabled,
+            }
+
+    def _discard(self, key: str) -> None:
+        with self._lock:
+            path = self._forget(key)
+        _remove([path])
+
+    # ── Internals (caller holds self._lock) ──────────────────────────────────
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def _ensure_index(self) -> None:
+        # One directory scan on first use; every later call is bookkeeping.
+        if self._index is not None:
+            return
+        found = []
+        if os.path.isdir(self.root):
+            for sub in os.listdir(self.root):
+                sub_dir = os.path.join(self.root, sub)
+                if not os.path.isdir(sub_dir):
+                    continue
+                for fname in os.listdir(sub_dir):
+                    if not fname.endswith(".json"):
+                        continue
+                    try:
+                        st = os.stat(os.path.join(sub_dir, fname))
+                    except OSError:
+                        continue
+                    found.append((st.st_mtime, fname[:-len(".json")], st.st_size))
+        found.sort()
+        self._index = OrderedDict((key, size) for _mtime, key, size in found)
+        self._total = sum(self._index.values())
+        _remove(self._evict())
+
+    def _forget(self, key: str) -> str:
+        """Drop `key` from the index; returns its path for the caller to
+        remove once the lock is released."""
+        self._total -= self._index.pop(key, 0)
+        return self._path(key)
+
+    def _evict(self) -> list:
+        """Forget LRU entries until under max_bytes; returns their paths."""
+        paths = []
+        while self._total > self.max_bytes and self._index:
+            paths.append(self._forget(next(iter(self._index))))
+        return paths
+
+
+def _remove(paths: list) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -3,17 +3,27 @@
 Python has no safe thread-interrupt primitive, so cancellation has to be
 cooperative: workers check the token at safe points and abort themselves.
 
-Phase 1 scaffolds the contract; Phase 7 wires provider adapters to
-`register_abort(lambda: response.close())` so HTTP requests can be torn
-down mid-flight (<1s cancel latency). Without that, cancellation waits for
-the current call to finish naturally.
+The LLM adapters register their abort (`response.close()` on the HTTP
+stream, `proc.kill()` on the CLI) so requests are torn down mid-flight
+(<1s cancel latency); Gemini's SDK has no abort, so it stops at the next
+stream chunk.
 
 Three-layer usage:
   - UI: on cancel button click, call token.cancel() — returns immediately.
   - Feature: between chunks, call token.throw_if_cancelled(provider).
   - Provider adapter: at HTTP start, token.register_abort(abort_fn).
+
+A `Deadline` is the time-based counterpart: one absolute end time for a
+whole request (limiter wait, retries, fallbacks). The router arms a token
+with `Deadline.arm()` so the adapter's abort fires when it passes. Armed
+tokens wait on one shared watcher thread, ordered by expiry, rather than a
+timer thread each.
 """
 
+import heapq
+import itertools
+import threading
+import time
 from typing import Callable
 from core.ai.errors import AIError, Kind
 
@@ -22,18 +32,18 @@ class CancellationToken:
     def __init__(self):
         self._cancelled: bool = False
         self._abort_cbs: list[Callable[[], None]] = []
+        # cancel() comes from other threads (UI, hedge loser, Deadline
+        # timer); the lock makes "cancelled?" + "append" atomic with it.
+        # Callbacks always run outside it.
+        self._lock = threading.Lock()
 
     def cancel(self) -> None:
         """Mark cancelled and fire all registered abort callbacks."""
-        self._cancelled = True
-        for cb in self._abort_cbs:
-            try:
-                cb()
-            except Exception:
-                # Abort callbacks must not raise — swallow to guarantee
-                # the other callbacks still run.
-                pass
-        self._abort_cbs.clear()
+        with self._lock:
+            self._cancelled = True
+            cbs, self._abort_cbs = self._abort_cbs, []
+        for cb in cbs:
+            _run_abort(cb)
 
     @property
     def cancelled(self) -> bool:
@@ -53,10 +63,116 @@ class CancellationToken:
         If already cancelled when called, invokes cb() immediately so that
         a provider starting a request *after* cancel still tears down.
         """
-        if self._cancelled:
-            try:
-                cb()
-            except Exception:
-                pass
-        else:
-            self._abort_cbs.append(cb)
+        with self._lock:
+            if not self._cancelled:
+                self._abort_cbs.append(cb)
+                return
+        _run_abort(cb)
+
+
+def _run_abort(cb: Callable[[], None]) -> None:
+    try:
+        cb()
+    except Exception:
+        # Abort callbacks must not raise — swallow to guarantee
+        # the other callbacks still run.
+        pass
+
+
+class Deadline:
+    """Absolute end time for a request, shared by every attempt it makes.
+
+    `core.ai.complete(..., deadline=30)` builds one from a number of
+    seconds; pass a Deadline instead to give several calls one budget
+    (e.g. the map and reduce steps of a long job).
+    """
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + max(0.0, float(seconds))
+
+    @classmethod
+    def coerce(cls, value) -> "Deadline | None":
+        """None -> None; a Deadline as-is; a number of seconds -> Deadline."""
+        if value is None or isinstance(value, cls):
+            return value
+        return cls(value)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def error(self, provider: str = "") -> AIError:
+        return AIError(Kind.NETWORK, provider or "—", "Deadline exceeded")
+
+    def throw_if_expired(self, provider: str = "") -> None:
+        if self.expired:
+            raise self.error(provider)
+
+    def arm(self, token: CancellationToken) -> Callable[[], None]:
+        """Cancel `token` when the deadline passes. Returns a disarm
+        function the caller must call once its request is over."""
+        return _WATCHER.arm(self.expires_at, token)
+
+
+class _DeadlineWatcher:
+    """Cancels armed tokens as their deadlines pass, from one daemon thread
+    (started on first use) sleeping until the earliest expiry."""
+
+    # Disarmed entries stay in the heap until they expire; rebuild it once
+    # they are this many and outnumber the live ones.
+    _COMPACT_MIN = 64
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap: list[list] = []          # [expires_at, seq, token | None]
+        self._seq = itertools.count()
+        self._dead = 0
+        self._thread: threading.Thread | None = None
+
+    def arm(self, expires_at: float, token: CancellationToken) -> Callable[[], None]:
+        entry = [expires_at, next(self._seq), token]
+        with self._cond:
+            heapq.heappush(self._heap, entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name="ai-deadline-watcher")
+                self._thread.start()
+            elif self._heap[0] is entry:
+                self._cond.notify()
+        return lambda: self._disarm(entry)
+
+    def _disarm(self, entry: list) -> None:
+        with self._cond:
+            if entry[2] is None:
+                return                       # already fired or disarmed
+            entry[2] = None
+            self._dead += 1
+            if self._dead >= self._COMPACT_MIN and self._dead * 2 > len(self._heap):
+                self._heap = [e for e in self._heap if e[2] is not None]
+                heapq.heapify(self._heap)
+                self._dead = 0
+
+    def _run(self) -> None:
+        while True:
+            due = []
+            with self._cond:
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    entry = heapq.heappop(self._heap)
+                    if entry[2] is None:
+                        self._dead -= 1
+                    else:
+                        due.append(entry[2])
+                        entry[2] = None
+                if not due:
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                    continue
+            # Outside the lock: aborts may block briefly (stream close, kill).
+            for token in due:
+                token.cancel()
+
+
+_WATCHER = _DeadlineWatcher()
@@ -6,12 +6,20 @@ module owns the on-disk format and provider catalog defaults.
 Path resolution: `keys_dir()` walks up from this file's location to the
 project root, then into `keys/`. Original code in src/ai_router.py went up
 one level; since we're now at src/core/ai/config.py, we go up three levels.
+
+At runtime the router doesn't read these files per request: it publishes a
+`ConfigSnapshot` (frozen tables + key contents + the files' mtimes) built by
+`build_snapshot()` and swaps it whole when something changes on disk.
 """
 
 import os
 import copy
 import json
+from dataclasses import dataclass
+from types import MappingProxyType
+from collections.abc import Mapping
 
+from core.ai.ratelimit import PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BULK
 from core.ai.tiers import TIER_PREMIUM, TIER_STANDARD, TIER_ECONOMY
 
 
@@ -25,6 +33,10 @@ _DEFAULT_PROVIDERS = {
         "key_file": "Gemini.key",
         "enabled":  True,
         "priority": 1,
+        "rpm":      0,          # requests/min, 0 = unlimited (see ratelimit.py)
+        "tpm":      0,          # tokens/min,   0 = unlimited
+        "max_concurrency": 4,
+        "timeout_sec": 120,     # hard per-request timeout (see request_timeout)
         "models": [
             "gemini-2.5-pro",
             "gemini-2.5-flash",
@@ -42,6 +54,11 @@ _DEFAULT_PROVIDERS = {
         "key_file": "DeepSeek.key",
         "enabled":  True,
         "priority": 2,
+        "rpm":      0,
+        "tpm":      0,
+        "max_concurrency": 4,
+        "timeout_sec": 120,
+        "batch":    False,      # endpoint offers the /batches API (see core.ai.batch)
         "models": [
             "deepseek-chat",
             "deepseek-reasoner",
@@ -58,6 +75,11 @@ _DEFAULT_PROVIDERS = {
         "key_file": "Custom.key",
         "enabled":  False,      # Disabled by default; user fills base_url via UI first
         "priority": 4,
+        "rpm":      0,
+        "tpm":      0,
+        "max_concurrency": 4,
+        "timeout_sec": 120,
+        "batch":    False,
         "models":   [],
         "tiers": {
             TIER_PREMIUM:  "",
@@ -73,6 +95,11 @@ _DEFAULT_PROVIDERS = {
         "executable": "claude",     # CLI binary name or full path
         "extra_args": [],           # Advanced: additional flags for `claude -p`
         "timeout_sec": 600,
+        "pool_size":  0,            # >0: keep N long-lived CLI workers (stream-json stdin)
+        "pool_max_requests": 1,     # prompts per worker (a session carries earlier prompts)
+        "rpm":        0,
+        "tpm":        0,
+        "max_concurrency": 2,
         "models": [
             "sonnet",
             "opus",
@@ -86,6 +113,103 @@ _DEFAULT_PROVIDERS = {
     },
 }
 
+# ── Default concurrency per provider type ───────────────────────────────────
+# Upper bound on requests kept in flight against one provider (X6). The
+# router's adaptive limiter (core/ai/ratelimit.py) moves between 1 and this
+# ceiling; a provider entry overrides it with its own "max_concurrency".
+# The CLI-backed ClaudeCode stays low because each call is a full process.
+
+DEFAULT_MAX_CONCURRENCY = {
+    "gemini":            4,
+    "openai_compatible": 4,
+    "claude_code":       2,
+}
+
+
+def rate_limits(provider_cfg: dict) -> dict:
+    """Limiter settings for a provider entry: {"rpm", "tpm", "max_concurrency"}.
+    Missing / invalid rpm/tpm read as 0 (unlimited)."""
+    out = {}
+    for field in ("rpm", "tpm"):
+        try:
+            out[field] = max(0.0, float(provider_cfg.get(field) or 0))
+        except (TypeError, ValueError):
+            out[field] = 0.0
+    out["max_concurrency"] = max_concurrency(provider_cfg)
+    return out
+
+
+# ── Request timeouts ─────────────────────────────────────────────────────────
+# Hard cap on one adapter call (socket wait / CLI run), so a stuck connection
+# can't hang a worker thread. A provider entry's "timeout_sec" overrides it;
+# a caller's deadline= can only shorten it.
+
+DEFAULT_TIMEOUT_SEC = {
+    "gemini":            120,
+    "openai_compatible": 120,
+    "claude_code":       600,
+}
+
+
+def request_timeout(provider_cfg) -> float:
+    """Per-call timeout in seconds for a provider entry (> 0)."""
+    value = provider_cfg.get("timeout_sec")
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        value = 0.0
+    if value > 0:
+        return value
+    return float(DEFAULT_TIMEOUT_SEC.get(provider_cfg.get("type"), 120))
+
+
+def max_concurrency(provider_cfg: dict) -> int:
+    """Configured in-flight request cap for a provider entry (>= 1)."""
+    value = provider_cfg.get("max_concurrency")
+    if value is None:
+        value = DEFAULT_MAX_CONCURRENCY.get(provider_cfg.get("type"), 1)
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return 1
+
+
+# ── Context windows ──────────────────────────────────────────────────────────
+# Input-token limits by model-id prefix (longest match wins), used for
+# describe()["max_input_tokens"]. A provider entry's own "max_input_tokens"
+# (> 0) overrides the table — e.g. for a Custom endpoint. Unknown -> 0.
+
+MODEL_CONTEXT_TOKENS = {
+    "gemini-2.5":        1_048_576,
+    "gemini-2.0":        1_048_576,
+    "gemini-1.5-pro":    2_097_152,
+    "gemini-1.5":        1_048_576,
+    "deepseek-chat":     128_000,
+    "deepseek-reasoner": 128_000,
+    "sonnet":            200_000,
+    "opus":              200_000,
+    "haiku":             200_000,
+    "claude-":           200_000,
+    "gpt-4o":            128_000,
+    "gpt-4.1":           1_047_576,
+}
+
+
+def max_input_tokens(provider_cfg, model: str) -> int:
+    """Input context size for `model` on this provider entry (0 = unknown)."""
+    try:
+        override = int(provider_cfg.get("max_input_tokens") or 0)
+    except (TypeError, ValueError):
+        override = 0
+    if override > 0:
+        return override
+    best = ""
+    for prefix in MODEL_CONTEXT_TOKENS:
+        if (model or "").startswith(prefix) and len(prefix) > len(best):
+            best = prefix
+    return MODEL_CONTEXT_TOKENS.get(best, 0)
+
+
 # ── Default tier routing ─────────────────────────────────────────────────────
 # User explicitly picks (provider, model) per tier in Router UI.
 # Unconfigured tier falls back to priority-based auto-selection at call time.
@@ -143,6 +267,20 @@ TASKS: list[tuple[str, str, str]] = [
 ]
 
 
+# ── Default request priority per task ───────────────────────────────────────
+# Class the rate limiter grants concurrency slots by (core/ai/ratelimit.py)
+# when a caller doesn't pass priority=. Short user-facing calls jump ahead of
+# long background batches; a task_routing cell's "priority" overrides this.
+# Tasks not listed are "normal".
+
+TASK_PRIORITY = {
+    "subtitle.titles":   PRIORITY_INTERACTIVE,
+    "subtitle.segments": PRIORITY_NORMAL,
+    "subtitle.refine":   PRIORITY_BULK,
+    "translate":         PRIORITY_BULK,
+}
+
+
 def task_category(task_id: str) -> str | None:
     """Return 'llm' | 'asr' | 'tts' | None for a given task_id."""
     for tid, cat, _label in TASKS:
@@ -193,6 +331,36 @@ def keys_dir() -> str:
     return os.path.normpath(os.path.join(here, "..", "..", "..", "keys"))
 
 
+def cache_dir() -> str:
+    """Return absolute path to the on-disk AI response cache directory.
+
+    Lives under `user_data/` (not `keys/`) so wiping the cache never
+    touches credentials; see BACKLOG "用户数据绿色化" for the planned
+    move of the rest of the user data.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    return os.path.normpath(os.path.join(here, "..", "..", "..", "user_data", "ai_cache"))
+
+
+def fixtures_dir() -> str:
+    """Default directory for recorded provider exchanges (core.ai.replay)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    return os.path.normpath(os.path.join(here, "..", "..", "..", "user_data", "ai_fixtures"))
+
+
+def memory_path() -> str:
+    """SQLite file of the translation memory (core.ai.memory)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    return os.path.normpath(os.path.join(here, "..", "..", "..", "user_data",
+                                         "ai_memory.sqlite3"))
+
+
+def batch_dir() -> str:
+    """Directory of the offline batch-job table (core.ai.batch)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    return os.path.normpath(os.path.join(here, "..", "..", "..", "user_data", "ai_batches"))
+
+
 def read_key(provider_cfg: dict) -> str | None:
     """Read provider's .key file. Returns None if key_file empty/missing/blank."""
     key_file = provider_cfg.get("key_file", "")
@@ -215,6 +383,107 @@ def has_auth(provider_cfg: dict) -> bool:
     return read_key(provider_cfg) is not None
 
 
+# ── Immutable runtime snapshot ───────────────────────────────────────────────
+# Worker threads read provider config, routing and keys on every AI request.
+# The router keeps all of it in one ConfigSnapshot and replaces the whole
+# object (a single attribute store) on change, so readers never lock and
+# never touch the filesystem. Tables are frozen (MappingProxyType / tuple)
+# so nobody can edit a published snapshot in place; writers thaw() a copy,
+# change it, persist it, and publish a new snapshot.
+
+def freeze(value):
+    """Recursively turn dicts into read-only mappings and lists into tuples."""
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """Inverse of freeze(): plain, mutable dicts / lists (a deep copy)."""
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(v) for v in value]
+    return value
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    providers:     Mapping
+    asr_providers: Mapping
+    tts_providers: Mapping
+    tier_routing:  Mapping
+    task_routing:  Mapping
+    keys:          Mapping      # key_file -> key text (None = missing / blank)
+    stamps:        tuple        # ((path, mtime_ns | None), ...) at build time
+
+    def key(self, provider_cfg: Mapping) -> str | None:
+        """Snapshot counterpart of read_key()."""
+        return self.keys.get(provider_cfg.get("key_file", ""))
+
+    def has_auth(self, provider_cfg: Mapping) -> bool:
+        """Snapshot counterpart of has_auth()."""
+        if provider_cfg.get("type") == "claude_code":
+            return True
+        return self.key(provider_cfg) is not None
+
+    def data(self) -> dict:
+        """Mutable deep copy of the tables, in load_config() / save_config()
+        shape."""
+        return {
+            "providers":     thaw(self.providers),
+            "asr_providers": thaw(self.asr_providers),
+            "tts_providers": thaw(self.tts_providers),
+            "tier_routing":  thaw(self.tier_routing),
+            "task_routing":  thaw(self.task_routing),
+        }
+
+
+def build_snapshot(data: dict) -> ConfigSnapshot:
+    """Freeze `data` and read every referenced key file once.
+
+    File mtimes are taken *before* the reads, so a file rewritten while we
+    read it shows up as changed on the next stale check.
+    """
+    key_files = sorted({
+        cfg.get("key_file", "")
+        for section in ("providers", "asr_providers", "tts_providers")
+        for cfg in data.get(section, {}).values()
+        if cfg.get("key_file")
+    })
+    paths = [os.path.join(keys_dir(), "providers.json")]
+    paths += [os.path.join(keys_dir(), kf) for kf in key_files]
+    stamps = file_stamps(paths)
+    keys = {kf: read_key({"key_file": kf}) for kf in key_files}
+    return ConfigSnapshot(
+        providers=freeze(data["providers"]),
+        asr_providers=freeze(data["asr_providers"]),
+        tts_providers=freeze(data["tts_providers"]),
+        tier_routing=freeze(data["tier_routing"]),
+        task_routing=freeze(data.get("task_routing", {})),
+        keys=MappingProxyType(keys),
+        stamps=stamps,
+    )
+
+
+def file_stamps(paths) -> tuple:
+    """((path, mtime_ns), ...) with None for files that don't exist."""
+    out = []
+    for path in paths:
+        try:
+            out.append((path, os.stat(path).st_mtime_ns))
+        except OSError:
+            out.append((path, None))
+    return tuple(out)
+
+
+def snapshot_stale(snapshot: ConfigSnapshot) -> bool:
+    """True if providers.json or any key file changed since the snapshot."""
+    return file_stamps([path for path, _ in snapshot.stamps]) != snapshot.stamps
+
+
 # ── Persistence ──────────────────────────────────────────────────────────────
 
 def load_config() -> dict:
@@ -264,10 +533,15 @@ def load_config() -> dict:
 
 
 def save_config(data: dict) -> None:
-    """Write providers.json. Creates the keys/ directory if missing."""
+    """Write providers.json. Creates the keys/ directory if missing.
+
+    Written to a temp file and renamed into place, so a concurrent reader
+    (the router's change watcher) never sees a half-written file.
+    """
     cfg_path = os.path.join(keys_dir(), "providers.json")
     os.makedirs(os.path.dirname(cfg_path), exist_ok=True)
-    with open(cfg_path, "w", encoding="utf-8") as f:
+    tmp_path = cfg_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
         json.dump({
             "tier_routing":  data["tier_routing"],
             "task_routing":  data.get("task_routing", {}),
@@ -275,6 +549,7 @@ def save_config(data: dict) -> None:
             "asr_providers": data["asr_providers"],
             "tts_providers": data["tts_providers"],
         }, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, cfg_path)
 
 
 # ── Schema migrations ────────────────────────────────────────────────────────
@@ -309,13 +584,29 @@ def _normalize_providers(providers: dict):
 
     Users upgrading from a previous release would otherwise not see newly
     introduced providers in their Router Manager because their providers.json
-    only carries the providers that existed when it was written.
+    only carries the providers that existed when it was written. Rate-limit
+    fields (rpm / tpm / max_concurrency), the max_input_tokens override
+    (0 = model table) and timeout_sec are backfilled on every entry,
+    including user-added ones, so they are visible for hand-editing; so are
+    the ClaudeCode worker-pool fields on claude_code entries and the batch
+    flag on openai_compatible ones.
     """
     dirty = False
     for name, default_cfg in _DEFAULT_PROVIDERS.items():
         if name not in providers:
             providers[name] = copy.deepcopy(default_cfg)
             dirty = True
+    for cfg in providers.values():
+        limits = {"rpm": 0, "tpm": 0, "max_concurrency": max_concurrency(cfg),
+                  "max_input_tokens": 0, "timeout_sec": int(request_timeout(cfg))}
+        if cfg.get("type") == "claude_code":
+            limits.update(pool_size=0, pool_max_requests=1)
+        elif cfg.get("type") == "openai_compatible":
+            limits.update(batch=False)
+        for key, value in limits.items():
+            if key not in cfg:
+                cfg[key] = value
+                dirty = True
     return providers, dirty
 
 
@@ -1,8 +1,9 @@
 """AIError contract with 9 error kinds.
 
-Phase 1 defines the contract; providers still raise plain RuntimeError as
-before. Phase 7 will add provider-specific native-exception mapping so that
-feature/UI layers can branch on `e.kind`.
+Phase 1 defines the contract. The LLM adapters already map throttling
+(RATE_LIMIT / QUOTA) because the router's rate limiter keys off it; the
+other kinds still surface as plain RuntimeError until Phase 7 adds the full
+native-exception mapping so feature/UI layers can branch on `e.kind`.
 
 UI mapping (see docs/design/04-ai-router.md): each Kind has a recommended
 action button that dispatches to the right remediation (AUTH -> open Router
@@ -48,3 +49,25 @@ class AIError(Exception):
 
     def __str__(self) -> str:
         return f"[{self.kind.value}/{self.provider}] {self.message}"
+
+
+def parse_retry_after(value) -> float | None:
+    """Parse a Retry-After header value (delta-seconds or HTTP-date).
+
+    Returns seconds to wait (>= 0), or None when missing / unparseable.
+    """
+    if value is None or value == "":
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    from email.utils import parsedate_to_datetime
+    from datetime import datetime, timezone
+    try:
+        when = parsedate_to_datetime(str(value))
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,217 @@
+"""Per-provider circuit breaker + recent-health ranking.
+
+A provider that keeps failing would otherwise be tried first on every call
+and pay a full timeout before the router falls through to the next
+candidate. Each provider gets a breaker:
+
+  closed     normal; FAILURE_THRESHOLD consecutive failures -> open
+  open       skipped by auto-routing for the cooldown (COOLDOWN_SEC,
+             doubled after each failed probe up to COOLDOWN_MAX_SEC)
+  half_open  cooldown elapsed; one background probe is in flight. Success
+             closes the breaker, failure re-opens it.
+
+The probe is started lazily by `allow()` — i.e. only when some caller
+actually wanted that provider — and runs on a daemon thread so the caller
+moves on to the next candidate immediately.
+
+Only failures that say something about the provider's health count: rate
+limiting is the limiter's job (core.ai.ratelimit), and refusals / malformed
+JSON / overflow / cancellation are about the request, not the endpoint.
+
+`rank()` gives a sort key from the last WINDOW outcomes (success rate, then
+median latency bucket) that the router uses to order fallback candidates.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+from core.ai.errors import AIError, Kind
+
+
+CLOSED    = "closed"
+OPEN      = "open"
+HALF_OPEN = "half_open"
+
+FAILURE_THRESHOLD = 3
+COOLDOWN_SEC      = 30.0
+COOLDOWN_MAX_SEC  = 300.0
+WINDOW            = 20        # recent outcomes kept per provider
+
+# Error kinds that don't reflect on provider health.
+_NEUTRAL_KINDS = (Kind.RATE_LIMIT, Kind.REFUSED, Kind.MALFORMED,
+                  Kind.OVERFLOW, Kind.CANCELLED)
+
+
+def counts_against(error: Exception) -> bool:
+    """True if `error` should count as a provider failure for the breaker."""
+    return not (isinstance(error, AIError) and error.kind in _NEUTRAL_KINDS)
+
+
+class CircuitBreaker:
+    """Breaker state + recent outcomes for one provider. Thread-safe."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0              # consecutive, while closed
+        self._cooldown = COOLDOWN_SEC
+        self._opened_at = 0.0
+        self._last_error: str | None = None
+        self._outcomes: deque = deque(maxlen=WINDOW)   # (ok, wall_ms | None)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def record_success(self, wall_ms: float | None = None) -> None:
+        with self._lock:
+            self._outcomes.append((True, wall_ms))
+            self._failures = 0
+            self._state = CLOSED
+            self._cooldown = COOLDOWN_SEC
+
+    def record_failure(self, error: str = "") -> None:
+        with self._lock:
+            self._outcomes.append((False, None))
+            self._last_error = error or self._last_error
+            if self._state == HALF_OPEN:
+                self._cooldown = min(COOLDOWN_MAX_SEC, self._cooldown * 2)
+                self._trip()
+                return
+            self._failures += 1
+            if self._state == CLOSED and self._failures >= FAILURE_THRESHOLD:
+                self._trip()
+
+    def try_half_open(self) -> bool:
+        """Move open -> half_open once the cooldown has elapsed. Returns True
+        for exactly one caller, which then owns the probe."""
+        with self._lock:
+            if self._state != OPEN:
+                return False
+            if time.monotonic() - self._opened_at < self._cooldown:
+                return False
+            self._state = HALF_OPEN
+            return True
+
+    def abort_probe(self) -> None:
+        """Probe ended without a recorded outcome -> back to open."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trip()
+
+    def rank(self) -> tuple:
+        """Sort key: lower is healthier. (-success_rate, latency_bucket)
+        with the rate rounded to 10% and latency bucketed per doubling above
+        one second, so small jitter doesn't reshuffle the order."""
+        with self._lock:
+            outcomes = list(self._outcomes)
+        if not outcomes:
+            return (-1.0, 0)
+        rate = sum(1 for ok, _ in outcomes if ok) / len(outcomes)
+        walls = sorted(ms for ok, ms in outcomes if ok and ms is not None)
+        bucket = 0
+        if walls:
+            p50 = walls[(len(walls) - 1) // 2]
+            if p50 >= 1000:
+                bucket = int(math.log2(p50 / 1000.0)) + 1
+        return (-round(rate, 1), bucket)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            outcomes = list(self._outcomes)
+            retry_in = 0.0
+            if self._state == OPEN:
+                retry_in = max(0.0, self._opened_at + self._cooldown - time.monotonic())
+            return {
+                "state":                self._state,
+                "consecutive_failures": self._failures,
+                "success_rate":         (round(sum(1 for ok, _ in outcomes if ok) / len(outcomes), 2)
+                                         if outcomes else None),
+                "retry_in_sec":         round(retry_in, 1),
+                "last_error":           self._last_error,
+            }
+
+    def _trip(self) -> None:
+        # caller holds self._lock
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._failures = 0
+
+
+class HealthMonitor:
+    """Registry of CircuitBreaker, one per provider, plus the probe runner.
+
+    `probe(name)` is supplied by the router; it should make one minimal real
+    call through the normal dispatch path (which records the outcome here)
+    and may raise.
+    """
+
+    def __init__(self, probe: Callable[[str], object] | None = None):
+        self._lock = threading.Lock()
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._probe = probe
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name)
+            return breaker
+
+    def record(self, name: str, *, success: bool, error: Exception | None = None,
+               wall_ms: float | None = None) -> None:
+        if success:
+            self.get(name).record_success(wall_ms)
+        elif error is None or counts_against(error):
+            self.get(name).record_failure(str(error or ""))
+
+    def allow(self, name: str) -> bool:
+        """True if auto-routing may send traffic to `name` right now. An
+        open breaker whose cooldown elapsed gets a background probe."""
+        breaker = self.get(name)
+        state = breaker.state
+        if state == CLOSED:
+            return True
+        if state == OPEN and breaker.try_half_open():
+            self._start_probe(breaker)
+        return False
+
+    def rank(self, name: str) -> tuple:
+        return self.get(name).rank()
+
+    def reset(self, name: str | None = None) -> None:
+        """Forget health for one provider (or all) — e.g. after its key or
+        endpoint changed."""
+        with self._lock:
+            if name is None:
+                self._breakers.clear()
+            else:
+                self._breakers.pop(name, None)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: b.snapshot() for name, b in breakers.items()}
+
+    def _start_probe(self, breaker: CircuitBreaker) -> None:
+        if self._probe is None:
+            breaker.abort_probe()
+            return
+
+        def run():
+            try:
+                self._probe(breaker.name)
+            except Exception:
+                pass
+            finally:
+                breaker.abort_probe()   # no-op if the call recorded an outcome
+
+        threading.Thread(target=run, name=f"ai-probe-{breaker.name}",
+                         daemon=True).start()
@@ -0,0 +1,185 @@
+"""Persistent translation memory (SQLite).
+
+Series reuse intros, outros, sponsor reads and catchphrases; translating
+them again every episode costs tokens and latency for an answer we already
+have. translate_srt_file() looks every subtitle line up here before
+batching, sends only unseen lines to the model, and files each successful
+batch's translations back.
+
+Storage (`config.memory_path()`, i.e. `<repo>/user_data/ai_memory.sqlite3`):
+
+    memory(source, source_lang, target_lang, provider, model, target,
+           hits, created, used)          PRIMARY KEY (source, source_lang,
+                                                      target_lang, provider,
+                                                      model)
+
+`source` is the normalized source text (normalize()): Unicode NFC, runs of
+whitespace — including the line breaks inside a cue — collapsed to one
+space, ends stripped. Case and punctuation are kept; they change the
+translation. `provider` / `model` are the provider and model id that
+produced the translation (not merely the routed ones — a fallback files
+under the model that answered), so switching the translate model starts a
+fresh memory rather than mixing styles. Rows unused for `max_age_sec` are
+pruned on open; a table from before the provider column is dropped.
+
+Like the response cache, a broken database (or an unwritable directory)
+degrades to misses — it never fails the translation.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+
+DEFAULT_MAX_AGE_SEC = 180 * 24 * 3600     # half a year
+
+_WS_RE = re.compile(r"\s+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS memory (
+    source      TEXT NOT NULL,
+    source_lang TEXT NOT NULL,
+    target_lang TEXT NOT NULL,
+    provider    TEXT NOT NULL,
+    model       TEXT NOT NULL,
+    target      TEXT NOT NULL,
+    hits        INTEGER NOT NULL DEFAULT 0,
+    created     REAL NOT NULL,
+    used        REAL NOT NULL,
+    PRIMARY KEY (source, source_lang, target_lang, provider, model)
+)
+"""
+
+# SQLite's default limit on host parameters per statement is 999.
+_LOOKUP_CHUNK = 500
+
+
+def normalize(text: str) -> str:
+    """Memory key form of a source line."""
+    return _WS_RE.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+class TranslationMemory:
+    """Thread-safe; one connection shared under a lock (lookups are a
+    handful of indexed SELECTs per file, not a hot path)."""
+
+    def __init__(self, path: str, *, max_age_sec: float = DEFAULT_MAX_AGE_SEC,
+                 enabled: bool = True):
+        self.path = path
+        self.max_age_sec = max_age_sec
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def lookup(self, texts: list, *, source_lang: str, target_lang: str,
+               provider: str, model: str) -> dict:
+        """{index in `texts`: stored translation} for every remembered line.
+        Blank lines are never looked up."""
+        if not self.enabled:
+            return {}
+        keys: dict[str, list] = {}
+        for i, text in enumerate(texts):
+            key = normalize(text)
+            if key:
+                keys.setdefault(key, []).append(i)
+        found: dict[int, str] = {}
+        sources = list(keys)
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                for start in range(0, len(sources), _LOOKUP_CHUNK):
+                    chunk = sources[start:start + _LOOKUP_CHUNK]
+                    marks = ",".join("?" * len(chunk))
+                    rows = conn.execute(
+                        f"SELECT source, target FROM memory WHERE source_lang = ? "
+                        f"AND target_lang = ? AND provider = ? AND model = ? "
+                        f"AND source IN ({marks})",
+                        [source_lang, target_lang, provider, model, *chunk],
+                    ).fetchall()
+                    for source, target in rows:
+                        for i in keys[source]:
+                            found[i] = target
+                    conn.executemany(
+                        "UPDATE memory SET hits = hits + 1, used = ? WHERE source = ? "
+                        "AND source_lang = ? AND target_lang = ? AND provider = ? "
+                        "AND model = ?",
+                        [(now, source, source_lang, target_lang, provider, model)
+                         for source, _ in rows],
+                    )
+                conn.commit()
+        except (sqlite3.Error, OSError):
+            return {}
+        return found
+
+    def store(self, pairs: list, *, source_lang: str, target_lang: str,
+              provider: str, model: str) -> None:
+        """Remember (source text, translation) pairs; later pairs for the same
+        source replace earlier ones."""
+        if not self.enabled:
+            return
+        now = time.time()
+        rows = [(normalize(source), source_lang, target_lang, provider, model, target,
+                 now, now)
+                for source, target in pairs
+                if normalize(source) and isinstance(target, str) and target.strip()]
+        if not rows:
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.executemany(
+                    "INSERT INTO memory (source, source_lang, target_lang, provider, "
+                    "model, target, created, used) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (source, source_lang, target_lang, provider, model) "
+                    "DO UPDATE SET target = excluded.target, used = excluded.used",
+                    rows,
+                )
+                conn.commit()
+        except (sqlite3.Error, OSError):
+            pass
+
+    def info(self) -> dict:
+        """{"path", "entries", "bytes", "enabled"}."""
+        entries = 0
+        try:
+            with self._lock:
+                entries = self._connect().execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+        except (sqlite3.Error, OSError):
+            pass
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        return {"path": self.path, "entries": entries, "bytes": size,
+                "enabled": self.enabled}
+
+    def clear(self) -> None:
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("DELETE FROM memory")
+                conn.commit()
+        except (sqlite3.Error, OSError):
+            pass
+
+    def _connect(self) -> sqlite3.Connection:
+        # caller holds self._lock
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(memory)")]
+            if columns and "provider" not in columns:
+                conn.execute("DROP TABLE memory")
+            conn.execute(_SCHEMA)
+            conn.execute("DELETE FROM memory WHERE used < ?",
+                         (time.time() - self.max_age_sec,))
+            conn.commit()
+            self._conn = conn
+        return self._conn
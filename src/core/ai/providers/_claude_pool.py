@@ -0,0 +1,241 @@
+"""Long-lived `claude` CLI workers for the ClaudeCode provider.
+
+Each `claude -p` spawn pays a Node.js cold start; a translation job of 30
+batches pays it 30 times. With `pool_size` > 0 in the provider config, the
+adapter instead keeps up to that many CLI processes running in
+`--input-format stream-json --output-format stream-json` mode and
+multiplexes prompts over their stdin: one JSON user message in, events out
+until the turn's `result` event.
+
+A worker serves one request at a time. It is recycled (killed, and a fresh
+one spawned on demand) when:
+  - a request times out, is cancelled, or is abandoned mid-turn — its
+    stdout would otherwise leak stale events into the next request,
+  - the process exits / its pipes break,
+  - it has served `pool_max_requests` prompts. A CLI session keeps the
+    conversation, so every prompt sees the earlier turns as context. The
+    default of 1 gives every prompt a fresh conversation; raising it
+    trades that isolation for fewer spawns.
+
+A worker retired after a successful turn is replaced at once, so the
+successor's cold start overlaps whatever the caller does before its next
+prompt instead of delaying it.
+
+Workers are keyed by their full argv (executable, model, extra args), so a
+config change simply starts using new workers; `shutdown()` kills the idle
+ones (called by the router when config reloads and at interpreter exit).
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import queue
+import subprocess
+import threading
+import time
+from collections import deque
+
+from core.ai.errors import AIError, Kind
+
+
+_EOF = object()
+
+
+class Worker:
+    """One persistent CLI process. Not thread-safe — the pool hands it to a
+    single request at a time."""
+
+    def __init__(self, cmd: list, generation: int):
+        self.generation = generation
+        self.served = 0
+        self.broken = False
+        self._active = 0          # id of the request in flight, 0 = idle
+        self._events: queue.Queue = queue.Queue()
+        self._stderr: deque = deque(maxlen=50)
+        self._proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+        )
+        threading.Thread(target=self._read_stdout, daemon=True).start()
+        threading.Thread(target=self._read_stderr, daemon=True).start()
+
+    @property
+    def alive(self) -> bool:
+        return not self.broken and self._proc.poll() is None
+
+    def stderr_tail(self, n: int = 10) -> list[str]:
+        return [line.rstrip() for line in list(self._stderr)[-n:]]
+
+    def request(self, message: dict, timeout: float, cancel=None):
+        """Send one stream-json user message; yield events through the
+        turn's `result` event. Any early exit kills the worker."""
+        self.served += 1
+        self._active = request_id = self.served
+        if cancel is not None:
+            cancel.register_abort(lambda: self._abort(request_id))
+        finished = False
+        try:
+            try:
+                self._proc.stdin.write(json.dumps(message, ensure_ascii=False) + "\n")
+                self._proc.stdin.flush()
+            except OSError as e:
+                self.broken = True
+                raise RuntimeError(
+                    "claude code worker exited: " + " | ".join(self.stderr_tail())
+                ) from e
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise AIError(Kind.NETWORK, "ClaudeCode",
+                                  f"Claude Code CLI timed out after {timeout:.0f}s")
+                try:
+                    event = self._events.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+                if event is _EOF:
+                    self.broken = True
+                    raise RuntimeError(
+                        "claude code worker exited: " + " | ".join(self.stderr_tail())
+                    )
+                yield event
+                if event.get("type") == "result":
+                    finished = True
+                    return
+        finally:
+            self._active = 0
+            if not finished:
+                self.kill()
+
+    def kill(self) -> None:
+        self.broken = True
+        if self._proc.poll() is None:
+            try:
+                self._proc.kill()
+            except OSError:
+                pass
+
+    def _abort(self, request_id: int) -> None:
+        # A cancel that arrives after this request finished must not hit
+        # whoever holds the worker now.
+        if self._active == request_id:
+            self.kill()
+
+    def _read_stdout(self) -> None:
+        try:
+            for line in self._proc.stdout:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    self._events.put(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        except (OSError, ValueError):
+            pass
+        self._events.put(_EOF)
+
+    def _read_stderr(self) -> None:
+        try:
+            for line in self._proc.stderr:
+                self._stderr.append(line)
+        except (OSError, ValueError):
+            pass
+
+
+class WorkerPool:
+    """Up to `size` workers per argv; callers beyond that wait for one."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._idle: dict[tuple, list[Worker]] = {}
+        self._count: dict[tuple, int] = {}
+        self._generation = 0
+
+    def run(self, cmd: list, message: dict, *, size: int, max_requests: int,
+            timeout: float, cancel=None):
+        """Yield the events of one turn on a pooled worker for `cmd`."""
+        key = tuple(cmd)
+        size = max(1, size)
+        worker = self._acquire(key, cmd, size)
+        ok = False
+        try:
+            yield from worker.request(message, timeout, cancel)
+            ok = True
+        finally:
+            retired = worker.served >= max(1, max_requests)
+            self._release(key, worker, reuse=ok and worker.alive and not retired)
+            if ok and retired:
+                self._prewarm(key, cmd, size, worker.generation)
+
+    def shutdown(self) -> None:
+        """Kill idle workers; busy ones are dropped when they come back."""
+        with self._cond:
+            self._generation += 1
+            for key, workers in self._idle.items():
+                for worker in workers:
+                    worker.kill()
+                self._count[key] = self._count.get(key, 0) - len(workers)
+            self._idle.clear()
+            self._cond.notify_all()
+
+    def size(self) -> int:
+        with self._cond:
+            return sum(self._count.values())
+
+    def _acquire(self, key: tuple, cmd: list, size: int) -> Worker:
+        with self._cond:
+            while True:
+                idle = self._idle.get(key, [])
+                while idle:
+                    worker = idle.pop()
+                    if worker.alive:
+                        return worker
+                    self._count[key] -= 1
+                if self._count.get(key, 0) < size:
+                    self._count[key] = self._count.get(key, 0) + 1
+                    generation = self._generation
+                    break
+                self._cond.wait()
+        try:
+            return Worker(cmd, generation)
+        except Exception:
+            with self._cond:
+                self._count[key] -= 1
+                self._cond.notify()
+            raise
+
+    def _prewarm(self, key: tuple, cmd: list, size: int, generation: int) -> None:
+        """Spawn an idle successor for a retired worker, unless a waiter
+        already took the freed slot or the config changed meanwhile."""
+        with self._cond:
+            if generation != self._generation or self._count.get(key, 0) >= size:
+                return
+            self._count[key] = self._count.get(key, 0) + 1
+        try:
+            worker = Worker(cmd, generation)
+        except Exception:
+            with self._cond:
+                self._count[key] -= 1
+                self._cond.notify()
+            return
+        self._release(key, worker, reuse=True)
+
+    def _release(self, key: tuple, worker: Worker, *, reuse: bool) -> None:
+        with self._cond:
+            if reuse and worker.generation == self._generation:
+                self._idle.setdefault(key, []).append(worker)
+            else:
+                worker.kill()
+                self._count[key] -= 1
+            self._cond.notify()
+
+
+POOL = WorkerPool()
+atexit.register(POOL.shutdown)
@@ -0,0 +1,65 @@
+"""Long-lived SDK client registry shared by provider adapters.
+
+Building an SDK client per call pays a fresh TLS handshake and connection
+pool every time. Adapters instead keep one client per (api_key, base_url)
+here; the underlying httpx pools are thread-safe and keep connections alive
+across calls and worker threads.
+
+The router calls `invalidate_all()` whenever credentials or endpoints may
+have changed (update_provider / reload_config). Dropped clients are not
+closed explicitly — another thread may still be mid-request on one — the
+pool is released when the last reference goes away.
+"""
+
+import threading
+import weakref
+from typing import Callable
+
+
+_REGISTRIES: list["ClientRegistry"] = []
+
+
+class ClientRegistry:
+    """Thread-safe (api_key, base_url) -> client cache for one adapter."""
+
+    def __init__(self, factory: Callable[[str, str], object]):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._clients: dict[tuple, object] = {}
+        _REGISTRIES.append(self)
+
+    def get(self, api_key: str, base_url: str = "", scope=None):
+        """Client for (api_key, base_url). `scope` adds a key component for
+        clients whose connections are bound to something else — async
+        clients pass their event loop, since an httpx.AsyncClient must not
+        be shared across loops."""
+        key = (api_key, base_url or "", id(scope) if scope is not None else None)
+        with self._lock:
+            entry = self._clients.get(key)
+            # id() of a closed, collected loop can be reused by a new one.
+            if entry is None or (scope is not None and entry[1]() is not scope):
+                ref = weakref.ref(scope) if scope is not None else (lambda: None)
+                if scope is not None:
+                    self._prune()
+                entry = self._clients[key] = (self._factory(api_key, base_url), ref)
+            return entry[0]
+
+    def _prune(self) -> None:
+        # caller holds self._lock; forget clients whose scope is gone
+        for key in [k for k, (_, ref) in self._clients.items()
+                    if k[2] is not None and ref() is None]:
+            del self._clients[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clients.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._clients)
+
+
+def invalidate_all() -> None:
+    """Drop every cached client in every adapter's registry."""
+    for registry in list(_REGISTRIES):
+        registry.clear()
@@ -45,3 +45,106 @@ def parse_json_response(raw: str, *, provider_hint: str) -> dict:
             f"(type={type(parsed).__name__}): {str(parsed)[:200]!r}"
         )
     return parsed
+
+
+class JSONArrayStreamParser:
+    """Incrementally extract the elements of one array property.
+
+    Fed raw text deltas from a streaming JSON completion, e.g.
+    '{"translations": [{"index": 1, "text": "..."}, {"ind' — `feed()`
+    returns every element of `translations` that has been fully closed so
+    far, decoded. Fences / prose before the property are skipped because
+    only the `"<key>": [` marker is searched for. Partial elements stay
+    buffered until a later delta completes them.
+    """
+
+    def __init__(self, key: str):
+        self._marker = json.dumps(key)
+        self._buf = ""
+        self._pos = -1          # scan position inside the array, -1 = not found yet
+        self.done = False
+
+    def feed(self, text: str) -> list:
+        self._buf += text
+        out = []
+        if self.done:
+            return out
+        if self._pos < 0 and not self._find_array():
+            return out
+        while True:
+            i = self._skip_separators(self._pos)
+            if i >= len(self._buf):
+                self._pos = i
+                return out
+            if self._buf[i] == "]":
+                self.done = True
+                return out
+            end = _scan_value_end(self._buf, i)
+            if end is None:
+                self._pos = i
+                return out
+            try:
+                out.append(json.loads(self._buf[i:end]))
+            except json.JSONDecodeError:
+                pass
+            self._pos = end
+
+    def _find_array(self) -> bool:
+        start = 0
+        while True:
+            at = self._buf.find(self._marker, start)
+            if at < 0:
+                return False
+            j = self._skip_ws(at + len(self._marker))
+            if j < len(self._buf) and self._buf[j] == ":":
+                j = self._skip_ws(j + 1)
+                if j >= len(self._buf):
+                    return False
+                if self._buf[j] == "[":
+                    self._pos = j + 1
+                    return True
+            elif j >= len(self._buf):
+                return False
+            start = at + 1
+
+    def _skip_ws(self, i: int) -> int:
+        while i < len(self._buf) and self._buf[i] in " \t\r\n":
+            i += 1
+        return i
+
+    def _skip_separators(self, i: int) -> int:
+        while i < len(self._buf) and self._buf[i] in " \t\r\n,":
+            i += 1
+        return i
+
+
+def _scan_value_end(s: str, i: int) -> int | None:
+    """End offset (exclusive) of the JSON value starting at s[i], or None
+    if the buffer ends before the value does."""
+    depth = 0
+    in_str = False
+    escaped = False
+    for j in range(i, len(s)):
+        c = s[j]
+        if in_str:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_str = False
+                if depth == 0:
+                    return j + 1
+        elif c == '"':
+            in_str = True
+        elif c in "{[":
+            depth += 1
+        elif c in "}]":
+            depth -= 1
+            if depth == 0:
+                return j + 1
+            if depth < 0:           # bare scalar closed by the array's ']'
+                return j
+        elif c == "," and depth == 0:
+            return j
+    return None
@@ -9,22 +9,54 @@ model to use Write/Edit; we only consume its text output.
 
 Phase 1: extracted verbatim from ai_router.py. Phase 7 will map subprocess
 errors (FileNotFoundError, TimeoutExpired, non-zero exit) to AIError kinds.
+
+A CancellationToken passed to any entry point makes the call run over the
+stream-json path with the subprocess' kill() registered as abort callback.
+`timeout` (seconds) shortens the provider's `timeout_sec` for one call; the
+process is killed when it runs out.
+
+With `pool_size` > 0 in the provider config every call goes to a pool of
+long-lived CLI workers instead of a fresh process (see _claude_pool).
+
+`acall` / `acall_json` run the blocking call on a worker thread (the CLI
+is a subprocess either way); cancelling the awaiting task kills it.
 """
 
+import asyncio
 import json
 import shutil
 import subprocess
+import threading
 
+from core.ai.cancellation import CancellationToken
+from core.ai.errors import AIError, Kind
+from core.ai.providers._claude_pool import POOL
 from core.ai.providers._json_utils import parse_json_response
 
 
-def call(cfg: dict, model_id: str, prompt: str) -> str:
+def _pooled(cfg: dict) -> bool:
+    try:
+        return int(cfg.get("pool_size") or 0) > 0
+    except (TypeError, ValueError):
+        return False
+
+
+def shutdown_pool() -> None:
+    """Stop idle pooled workers (config changed / app exiting)."""
+    POOL.shutdown()
+
+
+def call(cfg: dict, model_id: str, prompt: str, cancel=None, *,
+         timeout: float | None = None) -> str:
     """Plain text completion."""
+    if cancel is not None or _pooled(cfg):
+        return "".join(stream(cfg, model_id, prompt, cancel, timeout=timeout)).strip()
     cmd = _cmd(cfg, model_id, output_format="text")
-    return _run(cmd, cfg, prompt)
+    return _run(cmd, cfg, prompt, timeout)
 
 
-def call_json(cfg: dict, model_id: str, prompt: str, schema: dict) -> dict:
+def call_json(cfg: dict, model_id: str, prompt: str, schema: dict,
+              cancel=None, *, timeout: float | None = None) -> dict:
     """Structured JSON completion.
 
     Uses --output-format json, which wraps the model's text in a result
@@ -32,15 +64,12 @@ def call_json(cfg: dict, model_id: str, prompt: str, schema: dict) -> dict:
     The envelope's `result` field is the model's raw text; since we ask the
     model to emit JSON, we parse that string a second time.
     """
+    if cancel is not None or _pooled(cfg):
+        raw = "".join(stream_json(cfg, model_id, prompt, schema, cancel,
+                                  timeout=timeout))
+        return parse_json_response(raw.strip(), provider_hint="ClaudeCode")
     cmd = _cmd(cfg, model_id, output_format="json")
-    full_prompt = (
-        f"{prompt}\n\n"
-        "Respond with ONLY a single JSON object that strictly matches "
-        "this JSON Schema:\n"
-        f"{json.dumps(schema, ensure_ascii=False, indent=2)}\n"
-        "No prose. No markdown. No code fences. Just the JSON object."
-    )
-    envelope_raw = _run(cmd, cfg, full_prompt)
+    envelope_raw = _run(cmd, cfg, _json_prompt(prompt, schema), timeout)
 
     try:
         envelope = json.loads(envelope_raw)
@@ -57,6 +86,67 @@ def call_json(cfg: dict, model_id: str, prompt: str, schema: dict) -> dict:
     return parse_json_response(inner_text, provider_hint="ClaudeCode")
 
 
+async def acall(cfg: dict, model_id: str, prompt: str, *,
+                timeout: float | None = None) -> str:
+    """Async call()."""
+    return await _in_thread(call, cfg, model_id, prompt, timeout=timeout)
+
+
+async def acall_json(cfg: dict, model_id: str, prompt: str, schema: dict, *,
+                     timeout: float | None = None) -> dict:
+    """Async call_json()."""
+    return await _in_thread(call_json, cfg, model_id, prompt, schema, timeout=timeout)
+
+
+async def _in_thread(fn, *args, **kwargs):
+    token = CancellationToken()
+    try:
+        return await asyncio.to_thread(fn, *args, cancel=token, **kwargs)
+    except asyncio.CancelledError:
+        token.cancel()
+        raise
+
+
+def stream(cfg: dict, model_id: str, prompt: str, cancel=None, *,
+           timeout: float | None = None):
+    """Streaming text completion; yields text deltas.
+
+    Runs the CLI with `--output-format stream-json`, which emits one JSON
+    event per line. With --include-partial-messages the model's text
+    arrives as `stream_event` content_block_delta events; older CLIs only
+    emit whole `assistant` messages, and the final `result` event is the
+    last resort when neither produced text.
+    """
+    cmd = _cmd(cfg, model_id, output_format="stream-json")
+    if _pooled(cfg):
+        yield from _run_pooled(cmd, cfg, prompt, cancel, timeout)
+    else:
+        yield from _run_stream(cmd, cfg, prompt, cancel, timeout)
+
+
+def stream_json(cfg: dict, model_id: str, prompt: str, schema: dict,
+                cancel=None, *, timeout: float | None = None):
+    """Streaming variant of call_json(); yields raw JSON text deltas."""
+    yield from stream(cfg, model_id, _json_prompt(prompt, schema), cancel,
+                      timeout=timeout)
+
+
+def _timeout(cfg: dict, timeout: float | None) -> float:
+    """The provider's timeout_sec, shortened to `timeout` when given."""
+    limit = float(cfg.get("timeout_sec", 600))
+    return limit if timeout is None else max(0.0, min(limit, timeout))
+
+
+def _json_prompt(prompt: str, schema: dict) -> str:
+    return (
+        f"{prompt}\n\n"
+        "Respond with ONLY a single JSON object that strictly matches "
+        "this JSON Schema:\n"
+        f"{json.dumps(schema, ensure_ascii=False, indent=2)}\n"
+        "No prose. No markdown. No code fences. Just the JSON object."
+    )
+
+
 def _cmd(cfg: dict, model_id: str, *, output_format: str) -> list:
     """Build the argv list for a headless `claude -p` invocation."""
     executable = cfg.get("executable") or "claude"
@@ -65,6 +155,10 @@ def _cmd(cfg: dict, model_id: str, *, output_format: str) -> list:
         "--output-format", output_format,
         "--permission-mode", "bypassPermissions",
     ]
+    if output_format == "stream-json":
+        # stream-json requires --verbose in print mode; partial messages
+        # give token-level deltas instead of one event per turn.
+        cmd += ["--verbose", "--include-partial-messages"]
     if model_id:
         cmd += ["--model", model_id]
     extra = cfg.get("extra_args") or []
@@ -73,7 +167,7 @@ def _cmd(cfg: dict, model_id: str, *, output_format: str) -> list:
     return cmd
 
 
-def _run(cmd: list, cfg: dict, prompt: str) -> str:
+def _run(cmd: list, cfg: dict, prompt: str, timeout: float | None = None) -> str:
     """Spawn the Claude CLI subprocess with prompt on stdin, return stdout.
     Raises RuntimeError on missing binary, timeout, or non-zero exit."""
     executable = cmd[0] if cmd else "claude"
@@ -86,6 +180,7 @@ def _run(cmd: list, cfg: dict, prompt: str) -> str:
     resolved = shutil.which(executable)
     if resolved:
         cmd = [resolved] + list(cmd[1:])
+    timeout = _timeout(cfg, timeout)
 
     try:
         result = subprocess.run(
@@ -95,7 +190,7 @@ def _run(cmd: list, cfg: dict, prompt: str) -> str:
             text=True,
             encoding="utf-8",
             errors="replace",
-            timeout=int(cfg.get("timeout_sec", 600)),
+            timeout=timeout,
         )
     except FileNotFoundError:
         raise RuntimeError(
@@ -104,10 +199,180 @@ def _run(cmd: list, cfg: dict, prompt: str) -> str:
             "is on PATH, or set a full path in the AI Console."
         )
     except subprocess.TimeoutExpired:
-        raise RuntimeError(
-            f"Claude Code CLI timed out after {cfg.get('timeout_sec')}s"
-        )
+        raise AIError(Kind.NETWORK, "ClaudeCode",
+                      f"Claude Code CLI timed out after {timeout:.0f}s")
     if result.returncode != 0:
         tail = (result.stderr or "").strip().splitlines()[-10:]
-        raise RuntimeError("claude code failed: " + " | ".join(tail))
+        _raise_failure(tail)
     return (result.stdout or "").strip()
+
+
+def _run_stream(cmd: list, cfg: dict, prompt: str, cancel=None,
+                timeout: float | None = None):
+    """Popen variant of _run() that yields text deltas from stream-json
+    stdout. The process is killed on timeout, when the consumer stops
+    iterating early, or when `cancel` fires."""
+    executable = cmd[0] if cmd else "claude"
+    resolved = shutil.which(executable)
+    if resolved:
+        cmd = [resolved] + list(cmd[1:])
+    timeout = _timeout(cfg, timeout)
+
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+        )
+    except FileNotFoundError:
+        raise RuntimeError(
+            f"Claude Code CLI not found: {executable!r}. "
+            "Install from https://claude.com/claude-code and ensure it "
+            "is on PATH, or set a full path in the AI Console."
+        )
+
+    # stderr is drained on a side thread so a chatty CLI can't fill the
+    # pipe and deadlock us while we block on stdout.
+    stderr_lines: list[str] = []
+    err_reader = threading.Thread(
+        target=lambda: stderr_lines.extend(proc.stderr), daemon=True)
+    err_reader.start()
+    timed_out = threading.Event()
+
+    def _on_timeout():
+        timed_out.set()
+        proc.kill()
+
+    timer = threading.Timer(timeout, _on_timeout)
+    timer.daemon = True
+    timer.start()
+    if cancel is not None:
+        cancel.register_abort(proc.kill)
+
+    text = _EventText()
+    try:
+        proc.stdin.write(prompt)
+        proc.stdin.close()
+        for line in proc.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            yield from text.feed(event)
+        proc.wait()
+    except OSError:
+        # Broken stdin pipe after a kill() from the abort callback.
+        if cancel is not None:
+            cancel.throw_if_cancelled("ClaudeCode")
+        raise
+    finally:
+        timer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        err_reader.join(timeout=1)
+
+    if cancel is not None:
+        cancel.throw_if_cancelled("ClaudeCode")
+    if timed_out.is_set():
+        raise AIError(Kind.NETWORK, "ClaudeCode",
+                      f"Claude Code CLI timed out after {timeout:.0f}s")
+    if proc.returncode != 0 or (text.result or {}).get("is_error"):
+        tail = "".join(stderr_lines).strip().splitlines()[-10:]
+        if not tail and text.result:
+            tail = [str(text.result.get("result", ""))[:300]]
+        _raise_failure(tail)
+    yield from text.leftover()
+
+
+def _run_pooled(cmd: list, cfg: dict, prompt: str, cancel=None,
+                timeout: float | None = None):
+    """_run_stream() over a pooled long-lived worker. The CLI reads one
+    stream-json user message per turn from stdin."""
+    executable = cmd[0] if cmd else "claude"
+    resolved = shutil.which(executable)
+    if resolved:
+        cmd = [resolved] + list(cmd[1:])
+    cmd = cmd + ["--input-format", "stream-json"]
+    message = {
+        "type": "user",
+        "message": {"role": "user", "content": [{"type": "text", "text": prompt}]},
+    }
+    text = _EventText()
+    try:
+        for event in POOL.run(
+            cmd, message,
+            size=int(cfg.get("pool_size") or 1),
+            max_requests=int(cfg.get("pool_max_requests") or 1),
+            timeout=_timeout(cfg, timeout),
+            cancel=cancel,
+        ):
+            yield from text.feed(event)
+    except FileNotFoundError:
+        raise RuntimeError(
+            f"Claude Code CLI not found: {executable!r}. "
+            "Install from https://claude.com/claude-code and ensure it "
+            "is on PATH, or set a full path in the AI Console."
+        )
+    except RuntimeError:
+        if cancel is not None:
+            cancel.throw_if_cancelled("ClaudeCode")
+        raise
+    if (text.result or {}).get("is_error"):
+        _raise_failure([str(text.result.get("result", ""))[:300]])
+    yield from text.leftover()
+
+
+class _EventText:
+    """Pulls the model's text out of stream-json events.
+
+    With --include-partial-messages the text arrives as `stream_event`
+    content_block_delta events; older CLIs only emit whole `assistant`
+    messages, and the final `result` event is the last resort when neither
+    produced text.
+    """
+
+    def __init__(self):
+        self.emitted = False
+        self.partial = False
+        self.result: dict | None = None
+
+    def feed(self, event: dict) -> list[str]:
+        out = []
+        etype = event.get("type")
+        if etype == "stream_event":
+            inner = event.get("event") or {}
+            delta = inner.get("delta") or {}
+            if (inner.get("type") == "content_block_delta"
+                    and delta.get("type") == "text_delta" and delta.get("text")):
+                self.partial = True
+                out.append(delta["text"])
+        elif etype == "assistant" and not self.partial:
+            for block in (event.get("message") or {}).get("content") or []:
+                if block.get("type") == "text" and block.get("text"):
+                    out.append(block["text"])
+        elif etype == "result":
+            self.result = event
+        if out:
+            self.emitted = True
+        return out
+
+    def leftover(self) -> list[str]:
+        if not self.emitted and self.result and self.result.get("result"):
+            return [self.result["result"]]
+        return []
+
+
+def _raise_failure(tail: list) -> None:
+    message = "claude code failed: " + " | ".join(tail)
+    lowered = message.lower()
+    if "rate limit" in lowered or "429" in lowered:
+        raise AIError(Kind.RATE_LIMIT, "ClaudeCode", message)
+    raise RuntimeError(message)
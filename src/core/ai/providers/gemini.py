@@ -1,38 +1,306 @@
 """Gemini provider (type='gemini').
 
-Phase 1: extracted verbatim from ai_router.py; exceptions still bubble as
-RuntimeError. Phase 7 will wrap google.api_core.exceptions into AIError with
-the appropriate Kind (quota, rate limit, safety refusal, etc.).
+Phase 1: extracted from ai_router.py. HTTP 429 (google.api_core
+ResourceExhausted / TooManyRequests, google.genai APIError code 429) is
+mapped to AIError(RATE_LIMIT) for the router's limiter; Phase 7 will wrap
+the rest of the SDK exceptions (quota, safety refusal, etc.).
+
+Client handling: the google-genai SDK (`google.genai.Client`) is
+instance-scoped, so one long-lived client per API key is kept in a
+ClientRegistry and shared across threads with its keep-alive pool. The
+older google-generativeai SDK is only used as a fallback when google-genai
+is not installed; its `genai.configure()` is process-global, so that path
+re-configures only on key change and holds a lock while binding a model to
+the configured client.
+
+Cancellation: neither SDK lets another thread abort an in-flight request,
+so a CancellationToken passed to call / stream is honoured between stream
+chunks (cancellable calls run over the streaming endpoint for that). What
+bounds the wait itself is `timeout` (seconds), sent as the request timeout
+(`http_options.timeout` on google-genai, `request_options` on the legacy
+SDK); a timed-out request raises AIError(NETWORK).
+
+`acall` / `acall_json` (AIRouter.acomplete) use google-genai's native
+`client.aio` surface, with one client per (api_key, event loop); the legacy
+SDK path uses `generate_content_async`. Task cancellation aborts them.
+
+Prefix caching: Gemini 2.5 models cache repeated prompt prefixes
+implicitly. When the caller marks a stable `prefix` long enough to be worth
+an explicit cache (_CACHE_MIN_TOKENS, also the API's minimum for Flash), it
+is uploaded once as cached content (`client.caches.create`, TTL
+_CACHE_TTL_SEC) and later requests send only the remainder plus the cache
+name. A prefix the API refuses to cache (a 4xx from caches.create) is
+remembered for the TTL and sent inline; after a transient failure (timeout,
+429, 5xx, network) it is sent inline this once and the upload is retried
+on the next call. The cached token count from `usage_metadata` is written
+into the caller's `usage` dict. The legacy SDK path sends the prompt as-is.
 """
 
+import asyncio
+import hashlib
+import threading
+import time
+
+from core.ai.errors import AIError, Kind
+from core.ai.providers._clients import ClientRegistry
 from core.ai.providers._json_utils import parse_json_response
+from core.ai.singleflight import SingleFlight
+from core.ai.tokens import estimate_tokens
 
+_CACHE_MIN_TOKENS = 1024
+_CACHE_TTL_SEC    = 600
 
-def call(api_key: str, model_id: str, prompt: str) -> str:
-    """Plain text completion via google-generativeai SDK."""
-    import google.generativeai as genai
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(model_id)
-    response = model.generate_content(prompt)
+
+def _make_client(api_key: str, _base_url: str):
+    from google import genai
+    return genai.Client(api_key=api_key)
+
+
+_CLIENTS = ClientRegistry(_make_client)
+
+
+def supports_prefix_cache() -> bool:
+    """Prefix caching needs the google-genai SDK (see module docstring)."""
+    return _has_genai_sdk()
+
+
+def call(api_key: str, model_id: str, prompt: str, cancel=None, *,
+         prefix: str = "", usage: dict | None = None,
+         timeout: float | None = None) -> str:
+    """Plain text completion.
+
+    `prefix` is the stable leading part of `prompt` (see module docstring);
+    `usage`, when given, receives {"input_tokens", "cached_tokens"}."""
+    if cancel is not None:
+        return "".join(stream(api_key, model_id, prompt, cancel,
+                              prefix=prefix, usage=usage, timeout=timeout)).strip()
+    response = _generate(api_key, model_id, prompt, None, prefix, timeout)
+    _read_usage(response, usage)
     return response.text.strip()
 
 
-def call_json(api_key: str, model_id: str, prompt: str, schema: dict) -> dict:
+def call_json(api_key: str, model_id: str, prompt: str, schema: dict,
+              cancel=None, *, prefix: str = "", usage: dict | None = None,
+              timeout: float | None = None) -> dict:
     """Structured JSON completion via Gemini's native response_schema flag."""
-    import google.generativeai as genai
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(
-        model_id,
-        generation_config={
-            "response_mime_type": "application/json",
-            "response_schema": schema,
-        },
-    )
-    response = model.generate_content(prompt)
+    if cancel is not None:
+        raw = "".join(stream_json(api_key, model_id, prompt, schema, cancel,
+                                  prefix=prefix, usage=usage, timeout=timeout))
+        return parse_json_response(raw.strip(), provider_hint="Gemini")
+    response = _generate(api_key, model_id, prompt, {
+        "response_mime_type": "application/json",
+        "response_schema": schema,
+    }, prefix, timeout)
+    _read_usage(response, usage)
+    raw = (response.text or "").strip()
+    return parse_json_response(raw, provider_hint="Gemini")
+
+
+async def acall(api_key: str, model_id: str, prompt: str, *,
+                prefix: str = "", usage: dict | None = None,
+                timeout: float | None = None) -> str:
+    """Async call()."""
+    response = await _agenerate(api_key, model_id, prompt, None, prefix, timeout)
+    _read_usage(response, usage)
+    return response.text.strip()
+
+
+async def acall_json(api_key: str, model_id: str, prompt: str, schema: dict, *,
+                     prefix: str = "", usage: dict | None = None,
+                     timeout: float | None = None) -> dict:
+    """Async call_json()."""
+    response = await _agenerate(api_key, model_id, prompt, {
+        "response_mime_type": "application/json",
+        "response_schema": schema,
+    }, prefix, timeout)
+    _read_usage(response, usage)
     raw = (response.text or "").strip()
     return parse_json_response(raw, provider_hint="Gemini")
 
 
+def stream(api_key: str, model_id: str, prompt: str, cancel=None, *,
+           prefix: str = "", usage: dict | None = None,
+           timeout: float | None = None):
+    """Streaming text completion; yields text deltas as they arrive."""
+    yield from _generate_stream(api_key, model_id, prompt, None, cancel,
+                                prefix, usage, timeout)
+
+
+def stream_json(api_key: str, model_id: str, prompt: str, schema: dict,
+                cancel=None, *, prefix: str = "", usage: dict | None = None,
+                timeout: float | None = None):
+    """Streaming variant of call_json(); yields raw JSON text deltas."""
+    yield from _generate_stream(api_key, model_id, prompt, {
+        "response_mime_type": "application/json",
+        "response_schema": schema,
+    }, cancel, prefix, usage, timeout)
+
+
+def _generate_stream(api_key: str, model_id: str, prompt: str,
+                     config: dict | None, cancel=None, prefix: str = "",
+                     usage: dict | None = None, timeout: float | None = None):
+    try:
+        if _has_genai_sdk():
+            contents, config = _with_cached_prefix(
+                prompt, config, _cached_content(api_key, model_id, prefix, timeout), prefix)
+            chunks = _CLIENTS.get(api_key).models.generate_content_stream(
+                model=model_id, contents=contents, config=_with_timeout(config, timeout),
+            )
+        else:
+            chunks = _legacy_model(api_key, model_id, config).generate_content(
+                prompt, stream=True, **_legacy_timeout(timeout),
+            )
+        for chunk in chunks:
+            if cancel is not None:
+                cancel.throw_if_cancelled("Gemini")
+            _read_usage(chunk, usage)
+            text = getattr(chunk, "text", None)
+            if text:
+                yield text
+    except Exception as e:
+        _raise_mapped(e)
+
+
+def _raise_mapped(e: Exception):
+    """Re-raise `e`, as AIError(RATE_LIMIT) when it is a 429 and as
+    AIError(NETWORK) when the request timed out."""
+    if getattr(e, "code", None) == 429 or type(e).__name__ in (
+            "ResourceExhausted", "TooManyRequests"):
+        raise AIError(Kind.RATE_LIMIT, "Gemini", str(e), raw=e) from e
+    # httpx.*Timeout (google-genai) / api_core DeadlineExceeded (legacy)
+    if type(e).__name__.endswith("Timeout") or type(e).__name__ == "DeadlineExceeded":
+        raise AIError(Kind.NETWORK, "Gemini", f"Request timed out: {e}", raw=e) from e
+    raise e
+
+
+def _with_timeout(config: dict | None, timeout: float | None) -> dict | None:
+    """google-genai request config carrying the timeout (milliseconds)."""
+    if timeout is None:
+        return config
+    return dict(config or {}, http_options={"timeout": max(1, int(timeout * 1000))})
+
+
+def _legacy_timeout(timeout: float | None) -> dict:
+    return {"request_options": {"timeout": timeout}} if timeout is not None else {}
+
+
+def _generate(api_key: str, model_id: str, prompt: str, config: dict | None,
+              prefix: str = "", timeout: float | None = None):
+    """generate_content on the pooled client, 429 / timeout mapped onto
+    AIError."""
+    try:
+        if _has_genai_sdk():
+            client = _CLIENTS.get(api_key)
+            contents, config = _with_cached_prefix(
+                prompt, config, _cached_content(api_key, model_id, prefix, timeout), prefix)
+            return client.models.generate_content(
+                model=model_id, contents=contents, config=_with_timeout(config, timeout),
+            )
+        return _legacy_model(api_key, model_id, config).generate_content(
+            prompt, **_legacy_timeout(timeout))
+    except Exception as e:
+        _raise_mapped(e)
+
+
+async def _agenerate(api_key: str, model_id: str, prompt: str, config: dict | None,
+                     prefix: str = "", timeout: float | None = None):
+    """Async _generate()."""
+    try:
+        if _has_genai_sdk():
+            client = _CLIENTS.get(api_key, "", asyncio.get_running_loop())
+            name = None
+            if _cache_worthy(prefix):
+                name = await asyncio.to_thread(_cached_content, api_key, model_id, prefix,
+                                              timeout)
+            contents, config = _with_cached_prefix(prompt, config, name, prefix)
+            return await client.aio.models.generate_content(
+                model=model_id, contents=contents, config=_with_timeout(config, timeout),
+            )
+        model = _legacy_model(api_key, model_id, config)
+        return await model.generate_content_async(prompt, **_legacy_timeout(timeout))
+    except Exception as e:
+        _raise_mapped(e)
+
+
+# ── Prefix cache ─────────────────────────────────────────────────────────────
+
+_cache_lock = threading.Lock()
+# (api_key, model_id, sha256(prefix)) -> (cached content name | None, reuse-until)
+_cached_contents: dict[tuple, tuple] = {}
+# Concurrent batches needing the same prefix upload it once; the lock above
+# only guards the dict and is never held across the network call.
+_cache_flights = SingleFlight()
+
+
+def _cache_worthy(prefix: str) -> bool:
+    return bool(prefix) and estimate_tokens(prefix) >= _CACHE_MIN_TOKENS
+
+
+def _cached_content(api_key: str, model_id: str, prefix: str,
+                    timeout: float | None = None) -> str | None:
+    """Name of a live cached content holding `prefix`, creating it on first
+    use (bounded by `timeout`, like the call it serves). None when the
+    prefix is too short, the API refused to cache it, or the upload failed."""
+    if not _cache_worthy(prefix):
+        return None
+    key = (api_key, model_id, hashlib.sha256(prefix.encode("utf-8")).hexdigest())
+    with _cache_lock:
+        entry = _cached_contents.get(key)
+    if entry is not None and entry[1] > time.monotonic():
+        return entry[0]
+    name, _shared = _cache_flights.do(
+        "\0".join(key), lambda: _create_cached_content(key, prefix, timeout))
+    return name
+
+
+def _create_cached_content(key: tuple, prefix: str, timeout: float | None) -> str | None:
+    api_key, model_id, _digest = key
+    try:
+        from google.genai import types
+        cache = _CLIENTS.get(api_key).caches.create(
+            model=model_id,
+            config=types.CreateCachedContentConfig(
+                contents=[prefix], ttl=f"{_CACHE_TTL_SEC}s",
+                **_with_timeout({}, timeout),
+            ),
+        )
+        name = cache.name
+    except Exception as e:
+        if not _cache_refused(e):
+            return None     # transient (timeout, 429, 5xx, network): retry next call
+        name = None
+    # Stop reusing a minute before the server-side TTL runs out.
+    with _cache_lock:
+        _cached_contents[key] = (name, time.monotonic() + _CACHE_TTL_SEC - 60)
+    return name
+
+
+def _cache_refused(e: Exception) -> bool:
+    """True when caches.create rejected the prefix itself (a 4xx such as
+    400 for a too-small prefix or a model without caching), which retrying
+    won't fix; timeouts, 429s, 5xx and network errors are not refusals."""
+    code = getattr(e, "code", None)
+    return isinstance(code, int) and 400 <= code < 500 and code not in (408, 429)
+
+
+def _with_cached_prefix(prompt: str, config: dict | None, name: str | None,
+                        prefix: str):
+    """(contents, config) for a request: the remainder of the prompt plus
+    the cache reference when `name` is set, else the prompt unchanged."""
+    if not name:
+        return prompt, config
+    return prompt[len(prefix):], dict(config or {}, cached_content=name)
+
+
+def _read_usage(response, usage: dict | None) -> None:
+    """Copy prompt / cached token counts from `usage_metadata` into `usage`."""
+    meta = getattr(response, "usage_metadata", None)
+    if usage is None or meta is None:
+        return
+    usage["input_tokens"] = int(getattr(meta, "prompt_token_count", 0) or 0)
+    usage["cached_tokens"] = int(getattr(meta, "cached_content_token_count", 0) or 0)
+
+
 def list_models(api_key: str) -> list[str]:
     """Fetch the available generation-capable model IDs from Gemini.
 
@@ -40,11 +308,18 @@ def list_models(api_key: str) -> list[str]:
     be passed back into `call(model_id=...)` directly). Filtered to models
     that support generateContent (skips embedding-only / vision-only ones).
     """
-    import google.generativeai as genai
-    genai.configure(api_key=api_key)
+    if _has_genai_sdk():
+        models = _CLIENTS.get(api_key).models.list()
+        method_attr = "supported_actions"
+    else:
+        import google.generativeai as genai
+        with _legacy_lock:
+            _legacy_configure(api_key)
+            models = list(genai.list_models())
+        method_attr = "supported_generation_methods"
     out: list[str] = []
-    for m in genai.list_models():
-        methods = getattr(m, "supported_generation_methods", []) or []
+    for m in models:
+        methods = getattr(m, method_attr, []) or []
         if "generateContent" not in methods:
             continue
         name = getattr(m, "name", "") or ""
@@ -54,3 +329,53 @@ def list_models(api_key: str) -> list[str]:
             out.append(name)
     out.sort()
     return out
+
+
+# ── SDK selection ────────────────────────────────────────────────────────────
+
+_genai_sdk: bool | None = None
+
+
+def _has_genai_sdk() -> bool:
+    """True if the instance-scoped google-genai SDK is importable (cached)."""
+    global _genai_sdk
+    if _genai_sdk is None:
+        try:
+            from google import genai  # noqa: F401
+            _genai_sdk = True
+        except ImportError:
+            _genai_sdk = False
+    return _genai_sdk
+
+
+# ── Legacy google-generativeai fallback ──────────────────────────────────────
+
+_legacy_lock = threading.Lock()
+_legacy_key: str | None = None
+
+
+def _legacy_configure(api_key: str) -> None:
+    """genai.configure() only when the key actually changed. Caller holds
+    _legacy_lock."""
+    global _legacy_key
+    import google.generativeai as genai
+    if api_key != _legacy_key:
+        genai.configure(api_key=api_key)
+        _legacy_key = api_key
+
+
+def _legacy_model(api_key: str, model_id: str, config: dict | None):
+    """Build a GenerativeModel bound to the client for `api_key`.
+
+    The model resolves its client lazily from the global config, so it is
+    bound eagerly under the lock — a concurrent configure() for another key
+    can then no longer swap the client underneath this request.
+    """
+    import google.generativeai as genai
+    from google.generativeai import client as _genai_client
+    with _legacy_lock:
+        _legacy_configure(api_key)
+        model = genai.GenerativeModel(model_id, generation_config=config)
+        model._client = _genai_client.get_default_generative_client()
+    return model
+
@@ -3,24 +3,98 @@
 Covers DeepSeek and the user-defined Custom provider — any endpoint that
 speaks the OpenAI chat.completions protocol.
 
-Phase 1: extracted verbatim from ai_router.py; exceptions still bubble as
-RuntimeError. Phase 7 will wrap openai.APIError / openai.RateLimitError /
-openai.AuthenticationError into AIError with the appropriate Kind.
+Phase 1: extracted verbatim from ai_router.py. openai.RateLimitError is
+mapped to AIError(RATE_LIMIT / QUOTA) so the router's limiter can back
+off; other exceptions still bubble as-is until Phase 7 wraps
+openai.APIError / openai.AuthenticationError too.
+
+Clients are long-lived: one `OpenAI` instance (and its keep-alive httpx
+pool) per (api_key, base_url), shared across calls and threads via
+ClientRegistry.
+
+Every entry point takes an optional CancellationToken. Cancellable calls
+run over the streaming endpoint and register the HTTP response's close()
+as the abort callback, so a cancelled request is torn down mid-flight
+without closing the shared client. `timeout` (seconds) is the hard
+per-request limit handed to the SDK; a timed-out request raises
+AIError(NETWORK).
+
+`acall` / `acall_json` are the asyncio entry points (AIRouter.acomplete).
+They use `AsyncOpenAI`, one per (api_key, base_url, event loop) — an async
+httpx pool belongs to the loop that created it. Cancelling the awaiting
+task aborts the request; no CancellationToken is needed there.
+
+Prefix caching: DeepSeek (and api.openai.com) cache the longest repeated
+prompt prefix automatically, server-side. The request layout is already
+most-stable-first — the schema hint (constant per call site) as system
+message, then the whole prompt as one user message, which starts with the
+caller-marked stable `prefix` — so consecutive batches share their leading
+bytes without changing how the prompt is presented. `prefix` only turns on
+usage reporting: the cached token count the endpoint reports
+(`prompt_cache_hit_tokens` / `prompt_tokens_details.cached_tokens`) is
+written into the caller's `usage` dict.
+
+Batch API (`batch_submit` / `batch_status` / `batch_results`): endpoints
+that offer OpenAI's /batches protocol take a JSONL file of chat.completions
+requests and answer within a completion window, usually at a discount.
+core.ai.batch keeps the job table; these functions only speak the protocol.
 """
 
+import asyncio
 import json
+from urllib.parse import urlparse
 
+from core.ai.errors import AIError, Kind, parse_retry_after
+from core.ai.providers._clients import ClientRegistry
 from core.ai.providers._json_utils import parse_json_response
 
+_PROVIDER_HINT = "OpenAI-compatible"
 
-def call(api_key: str, base_url: str, model_id: str, prompt: str) -> str:
-    """Plain text completion via OpenAI-compatible chat.completions."""
+# Endpoints known to cache repeated prompt prefixes on their own.
+_AUTO_CACHE_HOSTS = ("api.deepseek.com", "api.openai.com")
+
+
+# SDK-internal retries are off: they would multiply the per-request timeout
+# past the caller's deadline. The router retries rate limits, falls back to
+# other providers, and gives explicit-provider calls (no fallback) one retry
+# after a connection error, timeout or 5xx (router._TRANSIENT_RETRIES).
+
+def _make_client(api_key: str, base_url: str):
     from openai import OpenAI
-    client = OpenAI(api_key=api_key, base_url=base_url)
-    response = client.chat.completions.create(
+    return OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+
+def _make_async_client(api_key: str, base_url: str):
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+
+_CLIENTS = ClientRegistry(_make_client)
+_ACLIENTS = ClientRegistry(_make_async_client)
+
+
+def supports_prefix_cache(base_url: str) -> bool:
+    """True if the endpoint is known to cache repeated prompt prefixes."""
+    return (urlparse(base_url or "").hostname or "") in _AUTO_CACHE_HOSTS
+
+
+def call(api_key: str, base_url: str, model_id: str, prompt: str,
+         cancel=None, *, prefix: str = "", usage: dict | None = None,
+         timeout: float | None = None) -> str:
+    """Plain text completion via OpenAI-compatible chat.completions.
+
+    `prefix` is the stable leading part of `prompt` (see module docstring);
+    `usage`, when given, receives {"input_tokens", "cached_tokens"}."""
+    if cancel is not None:
+        return "".join(stream(api_key, base_url, model_id, prompt, cancel,
+                              prefix=prefix, usage=usage, timeout=timeout)).strip()
+    client = _CLIENTS.get(api_key, base_url)
+    response = _create(
+        client, timeout,
         model=model_id,
-        messages=[{"role": "user", "content": prompt}],
+        messages=_messages(prompt),
     )
+    _read_usage(response, usage)
     return response.choices[0].message.content.strip()
 
 
@@ -30,8 +104,7 @@ def list_models(api_key: str, base_url: str) -> list[str]:
     Returns a sorted list of model IDs the key has access to. Raises
     RuntimeError if the call fails.
     """
-    from openai import OpenAI
-    client = OpenAI(api_key=api_key, base_url=base_url)
+    client = _CLIENTS.get(api_key, base_url)
     try:
         response = client.models.list()
     except Exception as e:
@@ -46,28 +119,300 @@ def list_models(api_key: str, base_url: str) -> list[str]:
 
 
 def call_json(api_key: str, base_url: str, model_id: str,
-              prompt: str, schema: dict) -> dict:
+              prompt: str, schema: dict, cancel=None, *,
+              prefix: str = "", usage: dict | None = None,
+              timeout: float | None = None) -> dict:
     """Structured JSON completion.
 
     OpenAI-compat endpoints accept `response_format={"type":"json_object"}`
     but do NOT accept a schema directly — we inject the schema as a system
     hint to steer the model, then validate by parsing.
     """
-    from openai import OpenAI
-    client = OpenAI(api_key=api_key, base_url=base_url)
-    schema_hint = (
-        "You must respond with a single JSON object that strictly matches "
-        "this JSON Schema:\n"
-        f"{json.dumps(schema, ensure_ascii=False, indent=2)}\n"
-        "Return only the JSON object. No markdown fences. No prose. No explanations."
+    if cancel is not None:
+        raw = "".join(stream_json(api_key, base_url, model_id, prompt, schema, cancel,
+                                  prefix=prefix, usage=usage, timeout=timeout))
+        return parse_json_response(raw.strip(), provider_hint=_PROVIDER_HINT)
+    client = _CLIENTS.get(api_key, base_url)
+    response = _create(
+        client, timeout,
+        model=model_id,
+        messages=_messages(prompt, schema),
+        response_format={"type": "json_object"},
     )
-    response = client.chat.completions.create(
+    _read_usage(response, usage)
+    raw = (response.choices[0].message.content or "").strip()
+    return parse_json_response(raw, provider_hint=_PROVIDER_HINT)
+
+
+async def acall(api_key: str, base_url: str, model_id: str, prompt: str, *,
+                prefix: str = "", usage: dict | None = None,
+                timeout: float | None = None) -> str:
+    """Async call()."""
+    client = _ACLIENTS.get(api_key, base_url, asyncio.get_running_loop())
+    response = await _acreate(
+        client, timeout,
         model=model_id,
-        messages=[
-            {"role": "system", "content": schema_hint},
-            {"role": "user",   "content": prompt},
-        ],
+        messages=_messages(prompt),
+    )
+    _read_usage(response, usage)
+    return response.choices[0].message.content.strip()
+
+
+async def acall_json(api_key: str, base_url: str, model_id: str,
+                     prompt: str, schema: dict, *,
+                     prefix: str = "", usage: dict | None = None,
+                     timeout: float | None = None) -> dict:
+    """Async call_json()."""
+    client = _ACLIENTS.get(api_key, base_url, asyncio.get_running_loop())
+    response = await _acreate(
+        client, timeout,
+        model=model_id,
+        messages=_messages(prompt, schema),
         response_format={"type": "json_object"},
     )
+    _read_usage(response, usage)
     raw = (response.choices[0].message.content or "").strip()
-    return parse_json_response(raw, provider_hint="OpenAI-compatible")
+    return parse_json_response(raw, provider_hint=_PROVIDER_HINT)
+
+
+def stream(api_key: str, base_url: str, model_id: str, prompt: str,
+           cancel=None, *, prefix: str = "", usage: dict | None = None,
+           timeout: float | None = None):
+    """Streaming text completion; yields content deltas as they arrive.
+    `timeout` bounds the wait for the response and for each chunk."""
+    client = _CLIENTS.get(api_key, base_url)
+    yield from _iter_deltas(_create(
+        client, timeout,
+        model=model_id,
+        messages=_messages(prompt),
+        stream=True,
+        **_stream_usage_option(prefix),
+    ), cancel, usage)
+
+
+def stream_json(api_key: str, base_url: str, model_id: str,
+                prompt: str, schema: dict, cancel=None, *,
+                prefix: str = "", usage: dict | None = None,
+                timeout: float | None = None):
+    """Streaming variant of call_json(); yields raw JSON text deltas.
+    The router parses them incrementally (see JSONArrayStreamParser)."""
+    client = _CLIENTS.get(api_key, base_url)
+    yield from _iter_deltas(_create(
+        client, timeout,
+        model=model_id,
+        messages=_messages(prompt, schema),
+        response_format={"type": "json_object"},
+        stream=True,
+        **_stream_usage_option(prefix),
+    ), cancel, usage)
+
+
+def batch_submit(api_key: str, base_url: str, model_id: str, requests: list, *,
+                 timeout: float | None = None) -> str:
+    """Upload `requests` — (custom_id, prompt, schema, prefix) tuples — as
+    one /batches job of JSON-mode chat.completions. Returns the remote
+    batch id."""
+    lines = []
+    for custom_id, prompt, schema, prefix in requests:
+        lines.append(json.dumps({
+            "custom_id": custom_id,
+            "method":    "POST",
+            "url":       "/v1/chat/completions",
+            "body": {
+                "model":           model_id,
+                "messages":        _messages(prompt, schema),
+                "response_format": {"type": "json_object"},
+            },
+        }, ensure_ascii=False))
+    client = _CLIENTS.get(api_key, base_url)
+    payload = ("\n".join(lines) + "\n").encode("utf-8")
+    upload = _batch_api(client.files.create, timeout,
+                        file=("batch.jsonl", payload), purpose="batch")
+    batch = _batch_api(client.batches.create, timeout,
+                       input_file_id=upload.id,
+                       endpoint="/v1/chat/completions",
+                       completion_window="24h")
+    return batch.id
+
+
+def batch_status(api_key: str, base_url: str, batch_id: str, *,
+                 timeout: float | None = None) -> dict:
+    """{"status", "output_file_id", "error_file_id", "total", "completed",
+    "failed"} of a submitted batch. Status is the endpoint's own
+    ("validating", "in_progress", "finalizing", "completed", "failed",
+    "expired", "cancelling", "cancelled")."""
+    client = _CLIENTS.get(api_key, base_url)
+    batch = _batch_api(client.batches.retrieve, timeout, batch_id)
+    counts = batch.request_counts
+    return {
+        "status":         batch.status,
+        "output_file_id": batch.output_file_id,
+        "error_file_id":  batch.error_file_id,
+        "total":          getattr(counts, "total", 0) or 0,
+        "completed":      getattr(counts, "completed", 0) or 0,
+        "failed":         getattr(counts, "failed", 0) or 0,
+    }
+
+
+def batch_results(api_key: str, base_url: str, output_file_id: str | None,
+                  error_file_id: str | None = None, *,
+                  timeout: float | None = None) -> dict:
+    """custom_id -> parsed JSON dict, or an Exception for requests that
+    failed (HTTP error inside the batch, or an unparseable answer)."""
+    client = _CLIENTS.get(api_key, base_url)
+    results: dict = {}
+    for file_id in (output_file_id, error_file_id):
+        if not file_id:
+            continue
+        content = _batch_api(client.files.content, timeout, file_id)
+        for line in content.text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            custom_id = entry.get("custom_id")
+            if custom_id is not None:
+                results[custom_id] = _batch_entry(entry)
+    return results
+
+
+def batch_cancel(api_key: str, base_url: str, batch_id: str, *,
+                 timeout: float | None = None) -> None:
+    client = _CLIENTS.get(api_key, base_url)
+    _batch_api(client.batches.cancel, timeout, batch_id)
+
+
+def _batch_entry(entry: dict):
+    """One output / error file line -> parsed dict or Exception."""
+    response = entry.get("response") or {}
+    body = response.get("body") or {}
+    error = entry.get("error") or body.get("error")
+    status = response.get("status_code", 200)
+    if error or status != 200:
+        message = (error or {}).get("message") if isinstance(error, dict) else error
+        kind = Kind.RATE_LIMIT if status == 429 else Kind.UNKNOWN
+        return AIError(kind, _PROVIDER_HINT, message or f"HTTP {status}")
+    try:
+        raw = (body["choices"][0]["message"]["content"] or "").strip()
+        return parse_json_response(raw, provider_hint=_PROVIDER_HINT)
+    except Exception as e:
+        return e
+
+
+def _messages(prompt: str, schema: dict | None = None) -> list:
+    """Chat messages, most stable first: the schema hint, then the prompt
+    (whose stable prefix leads it) as a single user message."""
+    messages = []
+    if schema is not None:
+        schema_hint = (
+            "You must respond with a single JSON object that strictly matches "
+            "this JSON Schema:\n"
+            f"{json.dumps(schema, ensure_ascii=False, indent=2)}\n"
+            "Return only the JSON object. No markdown fences. No prose. No explanations."
+        )
+        messages.append({"role": "system", "content": schema_hint})
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+def _stream_usage_option(prefix: str) -> dict:
+    # Usage arrives in a final chunk only when asked for. Requested only for
+    # prefix-cached calls, so endpoints that reject stream_options are
+    # unaffected otherwise.
+    return {"stream_options": {"include_usage": True}} if prefix else {}
+
+
+def _read_usage(response, usage: dict | None) -> None:
+    """Copy prompt / cached token counts from a response or final stream
+    chunk into `usage`."""
+    u = getattr(response, "usage", None)
+    if usage is None or u is None:
+        return
+    cached = getattr(u, "prompt_cache_hit_tokens", None)          # DeepSeek
+    if cached is None:
+        details = getattr(u, "prompt_tokens_details", None)       # OpenAI
+        cached = getattr(details, "cached_tokens", None)
+    usage["input_tokens"] = int(getattr(u, "prompt_tokens", 0) or 0)
+    usage["cached_tokens"] = int(cached or 0)
+
+
+def _iter_deltas(response, cancel=None, usage: dict | None = None):
+    """Yield non-empty content deltas from a stream=True response, closing
+    the HTTP stream if the consumer stops early or `cancel` fires."""
+    if cancel is not None:
+        cancel.register_abort(response.close)
+    try:
+        for chunk in response:
+            _read_usage(chunk, usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    except Exception:
+        if cancel is not None:
+            cancel.throw_if_cancelled(_PROVIDER_HINT)
+        raise
+    finally:
+        response.close()
+    if cancel is not None:
+        cancel.throw_if_cancelled(_PROVIDER_HINT)
+
+
+def _create(client, timeout: float | None, **kwargs):
+    """chat.completions.create with throttling and timeouts mapped onto
+    AIError."""
+    import openai
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    try:
+        return client.chat.completions.create(**kwargs)
+    except openai.RateLimitError as e:
+        raise _rate_limit_error(e) from e
+    except openai.APITimeoutError as e:
+        raise _timeout_error(e, timeout) from e
+
+
+async def _acreate(client, timeout: float | None, **kwargs):
+    """_create() on an AsyncOpenAI client."""
+    import openai
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    try:
+        return await client.chat.completions.create(**kwargs)
+    except openai.RateLimitError as e:
+        raise _rate_limit_error(e) from e
+    except openai.APITimeoutError as e:
+        raise _timeout_error(e, timeout) from e
+
+
+def _batch_api(method, timeout: float | None, *args, **kwargs):
+    """A files / batches SDK call with the same error mapping as _create()."""
+    import openai
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    try:
+        return method(*args, **kwargs)
+    except openai.RateLimitError as e:
+        raise _rate_limit_error(e) from e
+    except openai.APITimeoutError as e:
+        raise _timeout_error(e, timeout) from e
+
+
+def _timeout_error(e, timeout: float | None) -> AIError:
+    limit = f" after {timeout:.1f}s" if timeout is not None else ""
+    return AIError(Kind.NETWORK, _PROVIDER_HINT, f"Request timed out{limit}", raw=e)
+
+
+def _rate_limit_error(e) -> AIError:
+    """429 → RATE_LIMIT (honouring Retry-After), or QUOTA when the body
+    says the account is out of credit (OpenAI's `insufficient_quota`)."""
+    if getattr(e, "code", None) == "insufficient_quota":
+        return AIError(Kind.QUOTA, _PROVIDER_HINT, str(e), raw=e)
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    return AIError(Kind.RATE_LIMIT, _PROVIDER_HINT, str(e),
+                   retry_after=parse_retry_after(headers.get("retry-after")),
+                   raw=e)
@@ -0,0 +1,370 @@
+"""Process-wide per-provider rate limiting with adaptive concurrency (X6).
+
+Every LLM request the router dispatches goes through `RateLimiter.acquire()`
+/ `release()` for the target provider. Three independent gates apply:
+
+  1. Requests-per-minute token bucket   (provider cfg "rpm", 0 = unlimited)
+  2. Tokens-per-minute token bucket      (provider cfg "tpm", 0 = unlimited;
+                                          input estimated up front, output
+                                          charged after the reply arrives)
+  3. In-flight concurrency window, AIMD: +1/limit per success (≈ +1 per
+     window of successes), halved per congestion event, bounded by
+     [1, "max_concurrency"].
+
+A RATE_LIMIT error also pauses the provider until `retry_after` (or an
+exponential backoff when the provider didn't say), so concurrent callers
+queue here instead of piling more 429s onto the endpoint. The requests
+already in flight when the first 429 arrives usually hit it too; errors
+that come back while that pause is still running belong to the same
+congestion event and neither halve the window again nor lengthen the
+backoff (a longer `retry_after` still extends the pause).
+
+The live window feeds `describe()["safe_concurrency"]`, which feature code
+uses to size its worker pools.
+
+Concurrency slots are granted by priority class, not arrival order: a free
+slot goes to the waiting "interactive" request (console Test, title
+generation) before "normal", and "normal" before "bulk" (40-batch
+translations, refine). Waiting ages a request up one class every
+`AGING_SEC`, so a bulk job under a steady stream of interactive calls is
+delayed, never starved. Within a class it's FIFO.
+
+Async callers (AIRouter.acomplete) share the same limiter through
+`acquire_async()`, which never blocks the event loop: a queued coroutine
+awaits a future that the limiter resolves (via call_soon_threadsafe) when
+it reaches the head of the queue with a slot free.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import threading
+import time
+
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_NORMAL      = "normal"
+PRIORITY_BULK        = "bulk"
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BULK)
+
+_PRIORITY_RANK = {p: i for i, p in enumerate(PRIORITIES)}
+
+
+class TokenBucket:
+    """Continuous-refill bucket. `rate_per_min` <= 0 disables the bucket.
+
+    Uses reservation semantics: `reserve()` always debits immediately (the
+    level may go negative) and returns how long the caller must wait before
+    its reservation is covered. This keeps ordering fair without a queue.
+    """
+
+    def __init__(self, rate_per_min: float):
+        self._lock = threading.Lock()
+        self.configure(rate_per_min)
+
+    def configure(self, rate_per_min: float) -> None:
+        with self._lock:
+            self.rate_per_min = float(rate_per_min or 0)
+            self.capacity = self.rate_per_min        # one minute of burst
+            self._level = self.capacity
+            self._stamp = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate_per_min > 0
+
+    def reserve(self, amount: float) -> float:
+        """Debit `amount` and return seconds to wait (0 if available now)."""
+        if not self.enabled or amount <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self._level -= min(amount, self.capacity)
+            if self._level >= 0:
+                return 0.0
+            return -self._level / (self.rate_per_min / 60.0)
+
+    def level(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._level
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity,
+                          self._level + (now - self._stamp) * self.rate_per_min / 60.0)
+        self._stamp = now
+
+
+class ProviderLimiter:
+    """Rate + concurrency gate for one provider."""
+
+    BACKOFF_BASE_SEC = 2.0
+    BACKOFF_MAX_SEC  = 60.0
+    AGING_SEC        = 15.0     # waiting this long = one priority class up
+    QUEUE_RECHECK_SEC = 0.5     # acquire() re-evaluates aged order this often
+
+    def __init__(self, name: str, *, rpm: float = 0, tpm: float = 0,
+                 max_concurrency: int = 4):
+        self.name = name
+        self._cond = threading.Condition()
+        self._rpm = TokenBucket(rpm)
+        self._tpm = TokenBucket(tpm)
+        self._max = max(1, int(max_concurrency))
+        self._limit = float(self._max)
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._consecutive_limited = 0
+        self._rate_limited_total = 0
+        self._waiters: list[_Waiter] = []
+        self._seq = itertools.count()
+
+    def configure(self, *, rpm: float, tpm: float, max_concurrency: int) -> None:
+        """Apply new config, keeping live AIMD state where it still fits."""
+        if rpm != self._rpm.rate_per_min:
+            self._rpm.configure(rpm)
+        if tpm != self._tpm.rate_per_min:
+            self._tpm.configure(tpm)
+        with self._cond:
+            self._max = max(1, int(max_concurrency))
+            self._limit = min(self._limit, float(self._max)) or 1.0
+            self._notify()
+
+    # ── Acquire / release ────────────────────────────────────────────────────
+
+    def acquire(self, tokens: int = 0, priority: str = PRIORITY_NORMAL,
+                timeout: float | None = None) -> None:
+        """Block until a concurrency slot (granted by `priority`, see the
+        module docstring), an RPM token and `tokens` TPM are available.
+        Always pair with exactly one `release()`.
+
+        Raises TimeoutError — holding nothing — if that takes longer than
+        `timeout` seconds."""
+        give_up = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            waiter = self._enqueue(priority)
+            try:
+                while True:
+                    wait = self._take(waiter)
+                    if wait is None:
+                        break
+                    # release() notifies; the timeout covers a pause running
+                    # out and aging reordering the queue between wakeups.
+                    wait = wait or self.QUEUE_RECHECK_SEC
+                    if give_up is not None:
+                        left = give_up - time.monotonic()
+                        if left <= 0:
+                            raise TimeoutError(f"no {self.name} request slot within {timeout:.1f}s")
+                        wait = min(wait, left)
+                    self._cond.wait(wait)
+            except BaseException:
+                self._dequeue(waiter)
+                raise
+        # Bucket waits happen outside the condition so other callers can
+        # still release slots meanwhile.
+        wait = max(self._rpm.reserve(1), self._tpm.reserve(tokens))
+        if wait > 0:
+            if give_up is not None and time.monotonic() + wait > give_up:
+                self.release(success=False)
+                raise TimeoutError(f"{self.name} rate budget not available within {timeout:.1f}s")
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int = 0,
+                            priority: str = PRIORITY_NORMAL,
+                            timeout: float | None = None) -> None:
+        """acquire() for coroutines: queues like acquire(), then awaits a
+        future resolved by release() / _dequeue() once it is first in line,
+        so hundreds of waiting requests cost no threads and no polling."""
+        loop = asyncio.get_running_loop()
+        give_up = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            waiter = self._enqueue(priority)
+        try:
+            while True:
+                woken = loop.create_future()
+                with self._cond:
+                    wait = self._take(waiter)
+                    if wait is None:
+                        break
+                    waiter.wake = lambda future=woken: loop.call_soon_threadsafe(_resolve, future)
+                # A pause has a known end; a full window ends on a wake.
+                wait = wait or None
+                if give_up is not None:
+                    left = give_up - time.monotonic()
+                    if left <= 0:
+                        raise TimeoutError(f"no {self.name} request slot within {timeout:.1f}s")
+                    wait = left if wait is None else min(wait, left)
+                await asyncio.wait((woken,), timeout=wait)
+        except BaseException:
+            with self._cond:
+                waiter.wake = None
+                self._dequeue(waiter)
+            raise
+        wait = max(self._rpm.reserve(1), self._tpm.reserve(tokens))
+        if wait > 0:
+            if give_up is not None and time.monotonic() + wait > give_up:
+                self.release(success=False)
+                raise TimeoutError(f"{self.name} rate budget not available within {timeout:.1f}s")
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self.release(success=False)
+                raise
+
+    # Waiter queue; every helper below runs with self._cond held.
+
+    def _enqueue(self, priority: str) -> "_Waiter":
+        waiter = _Waiter(_PRIORITY_RANK.get(priority, _PRIORITY_RANK[PRIORITY_NORMAL]),
+                         next(self._seq), time.monotonic())
+        self._waiters.append(waiter)
+        return waiter
+
+    def _dequeue(self, waiter: "_Waiter") -> None:
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+            self._notify()   # the next in line may now be first
+
+    def _head(self, now: float) -> "_Waiter":
+        return min(self._waiters, key=lambda w: w.order(now, self.AGING_SEC))
+
+    def _notify(self) -> None:
+        """Wake blocked acquire() threads, and the first waiter in line if
+        it is a coroutine and a slot is free — the others stay parked."""
+        self._cond.notify_all()
+        if self._waiters and self._in_flight < int(self._limit):
+            head = self._head(time.monotonic())
+            if head.wake is not None:
+                wake, head.wake = head.wake, None
+                try:
+                    wake()
+                except RuntimeError:
+                    pass   # its event loop is closed; the coroutine is gone
+
+    def _take(self, waiter: "_Waiter") -> float | None:
+        """Give `waiter` a slot if one is free and it is first in line.
+        Returns None when taken (waiter dequeued), the remaining pause while
+        the provider is paused, or 0.0 while it must wait for a slot / its
+        turn."""
+        now = time.monotonic()
+        wait = self._blocked_until - now
+        if wait > 0:
+            return wait
+        if self._in_flight >= int(self._limit):
+            return 0.0
+        if self._head(now) is not waiter:
+            return 0.0
+        self._waiters.remove(waiter)
+        self._in_flight += 1
+        if self._waiters:
+            self._notify()   # more than one slot may be free
+        return None
+
+    def release(self, *, success: bool = True, rate_limited: bool = False,
+                retry_after: float | None = None,
+                output_tokens: int = 0) -> None:
+        """Return the slot and feed the outcome into AIMD."""
+        if output_tokens:
+            self._tpm.reserve(output_tokens)
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            if rate_limited:
+                self._rate_limited_total += 1
+                now = time.monotonic()
+                if now >= self._blocked_until:
+                    # A new congestion event; see the module docstring.
+                    self._consecutive_limited += 1
+                    self._limit = max(1.0, self._limit / 2)
+                    if retry_after is None:
+                        retry_after = min(self.BACKOFF_MAX_SEC, self.BACKOFF_BASE_SEC
+                                          * 2 ** (self._consecutive_limited - 1))
+                if retry_after is not None:
+                    self._blocked_until = max(self._blocked_until,
+                                              now + max(0.0, retry_after))
+            elif success:
+                self._consecutive_limited = 0
+                self._limit = min(float(self._max), self._limit + 1.0 / self._limit)
+            self._notify()
+
+    # ── Introspection ────────────────────────────────────────────────────────
+
+    @property
+    def safe_concurrency(self) -> int:
+        with self._cond:
+            return max(1, int(self._limit))
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "limit":           round(self._limit, 2),
+                "max_concurrency": self._max,
+                "in_flight":       self._in_flight,
+                "blocked_for_sec": round(max(0.0, self._blocked_until - time.monotonic()), 1),
+                "rate_limited":    self._rate_limited_total,
+                "waiting":         {p: sum(1 for w in self._waiters
+                                           if w.rank == _PRIORITY_RANK[p])
+                                    for p in PRIORITIES},
+                "rpm":             self._rpm.rate_per_min,
+                "tpm":             self._tpm.rate_per_min,
+            }
+
+
+class _Waiter:
+    """A request queued for a concurrency slot. `wake` is set while an
+    acquire_async() coroutine is parked on it."""
+    __slots__ = ("rank", "seq", "since", "wake")
+
+    def __init__(self, rank: int, seq: int, since: float):
+        self.rank = rank
+        self.seq = seq
+        self.since = since
+        self.wake = None
+
+    def order(self, now: float, aging_sec: float) -> tuple:
+        # Lower is served first: class rank minus classes gained by waiting.
+        return (self.rank - (now - self.since) / aging_sec, self.seq)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class RateLimiter:
+    """Registry of ProviderLimiter, one per provider name (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._limiters: dict[str, ProviderLimiter] = {}
+
+    def configure(self, name: str, *, rpm: float, tpm: float,
+                  max_concurrency: int) -> None:
+        with self._lock:
+            limiter = self._limiters.get(name)
+            if limiter is None:
+                self._limiters[name] = ProviderLimiter(
+                    name, rpm=rpm, tpm=tpm, max_concurrency=max_concurrency,
+                )
+                return
+        limiter.configure(rpm=rpm, tpm=tpm, max_concurrency=max_concurrency)
+
+    def get(self, name: str) -> ProviderLimiter:
+        with self._lock:
+            limiter = self._limiters.get(name)
+            if limiter is None:
+                limiter = self._limiters[name] = ProviderLimiter(name)
+            return limiter
+
+    def names(self) -> list:
+        with self._lock:
+            return list(self._limiters)
+
+    def drop(self, name: str) -> None:
+        """Forget a provider that was deleted from config."""
+        with self._lock:
+            self._limiters.pop(name, None)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {name: lim.snapshot() for name, lim in limiters.items()}
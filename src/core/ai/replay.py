@@ -0,0 +1,172 @@
+"""Record / replay of provider exchanges (offline benchmarks, regressions).
+
+In "record" mode every adapter call the router makes is executed for real
+and written to a fixture; in "replay" mode the adapter is never called —
+the fixture's value (or error) is returned after sleeping its recorded
+wall time × `latency_scale`. Replay runs inside the normal dispatch path,
+so rate limiter, stats, circuit breakers, hedging and fallback all behave
+as they did live, which is what makes the numbers reproducible.
+
+Layout (`config.fixtures_dir()`, i.e. `<repo>/user_data/ai_fixtures/`):
+
+    <key>.json   {"provider", "model", "task", "prompt", "schema",
+                  "value" | "error": {"kind", "message", "retry_after"},
+                  "wall_ms", "ttfb_ms"}
+
+The key is cache.make_key(provider, model, prompt, schema, task) — the same
+request identity as the response cache. Re-recording overwrites. A replay
+miss raises RuntimeError naming the request, so a benchmark never silently
+goes to the network.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+import time
+
+from core.ai.errors import AIError, Kind
+
+
+OFF    = "off"
+RECORD = "record"
+REPLAY = "replay"
+MODES  = (OFF, RECORD, REPLAY)
+
+
+class Fixtures:
+    """Mode + fixture directory. Thread-safe; writes are atomic."""
+
+    def __init__(self, root: str, mode: str = OFF, *, latency_scale: float = 1.0):
+        self.configure(mode, root, latency_scale=latency_scale)
+
+    def configure(self, mode: str, root: str, *, latency_scale: float = 1.0) -> None:
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got: {mode!r}")
+        self.mode = mode
+        self.root = root
+        self.latency_scale = max(0.0, float(latency_scale))
+
+    @property
+    def active(self) -> bool:
+        return self.mode != OFF
+
+    # ── Wrapping adapter calls ───────────────────────────────────────────────
+
+    def wrap(self, key: str, meta: dict, invoke):
+        """Return the callable _dispatch should run instead of `invoke`."""
+        if self.mode == REPLAY:
+            def replay():
+                entry = self._load(key, meta)
+                self._sleep(entry.get("wall_ms"))
+                return _result(entry)
+            return replay
+        if self.mode == RECORD:
+            def record():
+                started = time.perf_counter()
+                try:
+                    value = invoke()
+                except Exception as e:
+                    self.save(key, meta, error=e, wall_ms=_ms_since(started))
+                    raise
+                self.save(key, meta, value=value, wall_ms=_ms_since(started))
+                return value
+            return record
+        return invoke
+
+    def awrap(self, key: str, meta: dict, invoke):
+        """wrap() for async adapter calls."""
+        if self.mode == REPLAY:
+            async def replay():
+                entry = self._load(key, meta)
+                await asyncio.sleep(self._delay(entry.get("wall_ms")))
+                return _result(entry)
+            return replay
+        if self.mode == RECORD:
+            async def record():
+                started = time.perf_counter()
+                try:
+                    value = await invoke()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.save(key, meta, error=e, wall_ms=_ms_since(started))
+                    raise
+                self.save(key, meta, value=value, wall_ms=_ms_since(started))
+                return value
+            return record
+        return invoke
+
+    def replay_stream(self, key: str, meta: dict, *, as_json: bool):
+        """Deltas for a replayed streaming call: the whole recorded answer
+        as one delta after its recorded time to first byte, then the rest
+        of its wall time."""
+        entry = self._load(key, meta)
+        ttfb = entry.get("ttfb_ms") or entry.get("wall_ms") or 0
+        self._sleep(ttfb)
+        value = _result(entry)
+        yield json.dumps(value, ensure_ascii=False) if as_json else value
+        self._sleep((entry.get("wall_ms") or 0) - ttfb)
+
+    # ── Storage ──────────────────────────────────────────────────────────────
+
+    def save(self, key: str, meta: dict, *, value=None, error: Exception | None = None,
+             wall_ms: float | None = None, ttfb_ms: float | None = None) -> None:
+        if isinstance(error, AIError) and error.kind == Kind.CANCELLED:
+            return
+        entry = dict(meta, wall_ms=wall_ms, ttfb_ms=ttfb_ms)
+        if error is not None:
+            entry["error"] = {
+                "kind":        error.kind.value if isinstance(error, AIError) else None,
+                "message":     error.message if isinstance(error, AIError) else str(error),
+                "retry_after": getattr(error, "retry_after", None),
+            }
+        else:
+            entry["value"] = value
+        path = os.path.join(self.root, f"{key}.json")
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, path)
+        except OSError:
+            pass   # recording must never break the live call
+
+    def _load(self, key: str, meta: dict) -> dict:
+        path = os.path.join(self.root, f"{key}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise RuntimeError(
+                f"No replay fixture for provider={meta.get('provider')!r} "
+                f"model={meta.get('model')!r} task={meta.get('task')!r} "
+                f"({path})"
+            ) from None
+
+    def _delay(self, ms) -> float:
+        return max(0.0, float(ms or 0)) / 1000.0 * self.latency_scale
+
+    def _sleep(self, ms) -> None:
+        delay = self._delay(ms)
+        if delay:
+            time.sleep(delay)
+
+
+def _result(entry: dict):
+    """The recorded value, or the recorded error re-raised."""
+    error = entry.get("error")
+    if error is None:
+        return entry.get("value")
+    provider = entry.get("provider", "")
+    if error.get("kind"):
+        raise AIError(Kind(error["kind"]), provider, error.get("message", ""),
+                      retry_after=error.get("retry_after"))
+    raise RuntimeError(error.get("message", ""))
+
+
+def _ms_since(started: float) -> float:
+    return (time.perf_counter() - started) * 1000
@@ -4,6 +4,11 @@ Replaces the monolithic AIRouter in the old src/ai_router.py. Splits out:
   - configuration defaults + persistence -> core/ai/config.py
   - per-provider API calls              -> core/ai/providers/*.py
   - call statistics                     -> core/ai/stats.py
+  - client-side response cache          -> core/ai/cache.py
+  - per-provider rate / concurrency gate -> core/ai/ratelimit.py
+  - circuit breaker + health ranking     -> core/ai/health.py
+  - offline batch-job table              -> core/ai/batch.py
+  - translation memory (SQLite)          -> core/ai/memory.py
 
 Phase 1 preserves the full API surface of the old AIRouter so that existing
 callers (imported via the `src/ai_router.py` compatibility shim) behave
@@ -13,12 +18,31 @@ ASR/TTS HTTP/SDK calls into core.ai facade functions.
 
 from __future__ import annotations
 
+import asyncio
+import json
+import queue
+import threading
+import time
+from typing import Iterator
+
+from core.ai import batch as _batch
+from core.ai import cache as _cache
+from core.ai import memory as _memory
+from core.ai import replay as _replay
+from core.ai.singleflight import SingleFlight
 from core.ai import config as _cfg
+from core.ai import tokens as _tokens
+from core.ai.cancellation import CancellationToken, Deadline
+from core.ai.errors import AIError, Kind
+from core.ai.health import HealthMonitor
 from core.ai.providers import gemini as _gemini
 from core.ai.providers import openai_compat as _openai_compat
 from core.ai.providers import claude_code as _claude_code
 from core.ai.providers import lemonfox as _lemonfox
 from core.ai.providers import fish_audio as _fish_audio
+from core.ai.providers import _clients as _sdk_clients
+from core.ai.providers._json_utils import JSONArrayStreamParser, parse_json_response
+from core.ai.ratelimit import PRIORITIES, PRIORITY_NORMAL, RateLimiter
 from core.ai.stats import Stats
 from core.ai.tiers import (
     TIER_PREMIUM,
@@ -28,21 +52,96 @@ from core.ai.tiers import (
 )
 
 
+# Same-provider retries for RATE_LIMIT before falling through to the next
+# candidate, and the longest Retry-After we're willing to sit out (doc X1:
+# "按 Retry-After，上限 60s").
+_RATE_LIMIT_RETRIES  = 2
+_RETRY_AFTER_CAP_SEC = 60.0
+
+# A call with no other candidate to fall back to (explicit provider=) gets
+# this many more tries on the same provider after a transient failure — a
+# connection reset, timeout or 5xx — while its deadline has time left. The
+# SDK clients don't retry on their own (see providers/openai_compat.py).
+_TRANSIENT_RETRIES = 1
+
+# Minimal prompt for the circuit breaker's background half-open probe.
+_PROBE_PROMPT = "Reply with the single word: ok"
+
+# How often the config watcher stats providers.json + key files for changes.
+_CONFIG_WATCH_SEC = 2.0
+
+# Hedged requests (opt-in per task via task_routing[task]["hedge"]): fire
+# the next candidate once the primary has been silent for its recent p95.
+# Until the primary has this many latency samples, _HEDGE_DEFAULT_MS is used.
+_HEDGE_MIN_SAMPLES = 5
+_HEDGE_DEFAULT_MS  = 3000
+
+# Offline batch jobs (complete_json_batch): seconds between status polls,
+# and consecutive poll failures tolerated before giving up on the wait (the
+# job stays in the table either way).
+_BATCH_POLL_SEC    = 30.0
+_BATCH_POLL_ERRORS = 5
+
+# Remote batch states after which no more results will appear.
+_BATCH_FINISHED = ("completed", "failed", "expired", "cancelled")
+
+# Provider types whose adapters implement stream() / stream_json() (X5).
+_STREAM_TYPES = ("gemini", "openai_compatible", "claude_code")
+
+
 class AIRouter:
     """Process-wide singleton (exposed as `core.ai.router`).
 
     Thread-safe: multiple worker threads may call complete() concurrently.
-    Stats are protected by an internal lock inside the Stats object.
+    Stats are protected by an internal lock inside the Stats object; request
+    rate and in-flight concurrency per provider are coordinated by the
+    process-wide RateLimiter; provider health (circuit breakers) by the
+    HealthMonitor.
+
+    Config (providers, routing tables, API keys) lives in an immutable
+    ConfigSnapshot in `self._snap`. Request paths read it lock-free and
+    never touch the filesystem; writers (setters, reload_config, the mtime
+    watcher) serialize on `_config_lock`, persist, and swap in a new
+    snapshot.
     """
 
     def __init__(self):
-        self._providers:     dict = {}
-        self._asr_providers: dict = {}
-        self._tts_providers: dict = {}
-        self._tier_routing:  dict = {}
-        self._task_routing:  dict = {}
+        self._config_lock = threading.RLock()
+        self._snap: _cfg.ConfigSnapshot | None = None
         self._stats = Stats()
+        self._cache = _cache.ResponseCache(_cfg.cache_dir())
+        self._fixtures = _replay.Fixtures(_cfg.fixtures_dir())
+        self._flights = SingleFlight()
+        self._batches = _batch.BatchJobs(_cfg.batch_dir())
+        self._memory = _memory.TranslationMemory(_cfg.memory_path())
+        self._limiter = RateLimiter()
+        self._health = HealthMonitor(self._probe)
         self._load_config()
+        threading.Thread(target=self._watch_config, daemon=True,
+                         name="ai-config-watch").start()
+
+    # Read-only views of the current snapshot (frozen mappings). Hot paths
+    # that read several tables grab `snap = self._snap` once instead.
+
+    @property
+    def _providers(self):
+        return self._snap.providers
+
+    @property
+    def _asr_providers(self):
+        return self._snap.asr_providers
+
+    @property
+    def _tts_providers(self):
+        return self._snap.tts_providers
+
+    @property
+    def _tier_routing(self):
+        return self._snap.tier_routing
+
+    @property
+    def _task_routing(self):
+        return self._snap.task_routing
 
     # ── Core LLM API ─────────────────────────────────────────────────────────
 
@@ -50,7 +149,11 @@ class AIRouter:
                  task: str = "",
                  tier: str = TIER_STANDARD,
                  provider: str | None = None,
-                 model: str | None = None) -> str:
+                 model: str | None = None,
+                 use_cache: bool = True,
+                 cache_hint: str | None = None,
+                 priority: str | None = None,
+                 deadline: float | Deadline | None = None) -> str:
         """Plain text completion.
 
         Args:
@@ -64,30 +167,65 @@ class AIRouter:
                       only chooses the default model within that provider.
             provider: Optional explicit provider name (e.g. "Gemini").
             model:    Optional explicit model ID, overrides tier default.
+            use_cache: Consult / fill the on-disk response cache (X4). Pass
+                      False for liveness probes such as the console's
+                      Test button, which must actually hit the provider.
+            cache_hint: Optional stable leading part of `prompt` (e.g. the
+                      instruction preamble repeated by every batch). Adapters
+                      map it onto the provider's prefix cache (X4-A); ignored
+                      unless `prompt` starts with it.
+            priority: "interactive" | "normal" | "bulk" — the class the
+                      provider's concurrency slots are granted by (see
+                      core.ai.ratelimit). None = the task's default
+                      (task_routing[task]["priority"], else
+                      config.TASK_PRIORITY, else "normal").
+            deadline: Optional time budget — seconds from now, or a
+                      Deadline shared with other calls. Limiter waits,
+                      retries and fallbacks all spend it; the in-flight
+                      request is aborted when it runs out (the adapter's
+                      CancellationToken abort, plus a per-request timeout
+                      capped at what's left). Each adapter call is also
+                      capped by the provider's timeout_sec regardless.
 
         Returns:
             Plain-text completion.
 
         Raises:
-            RuntimeError: all candidate providers failed.
+            RuntimeError: all candidate providers failed, or the deadline
+                          ran out before one succeeded.
+            AIError:      explicit `provider` failed (Kind.NETWORK when the
+                          deadline / timeout was hit).
         """
         if tier not in TIERS:
             raise ValueError(f"tier must be one of {TIERS}, got: {tier!r}")
 
+        prefix = _prefix_hint(prompt, cache_hint)
+        priority = self._priority(task, priority)
+        deadline = Deadline.coerce(deadline)
         if provider:
             provider = _cfg.canonicalize_provider_name(provider)
-            return self._complete_explicit(provider, tier, model, prompt)
-        return self._complete_by_tier(task, tier, model, prompt)
+            return self._complete_explicit(provider, tier, model, prompt,
+                                           task=task, use_cache=use_cache,
+                                           prefix=prefix, priority=priority,
+                                           deadline=deadline)
+        return self._complete_by_tier(task, tier, model, prompt,
+                                      use_cache=use_cache, prefix=prefix,
+                                      priority=priority, deadline=deadline)
 
     def complete_json(self, prompt: str, *,
                       schema: dict,
                       task: str = "",
                       tier: str = TIER_STANDARD,
                       provider: str | None = None,
-                      model: str | None = None) -> dict:
+                      model: str | None = None,
+                      use_cache: bool = True,
+                      cache_hint: str | None = None,
+                      priority: str | None = None,
+                      deadline: float | Deadline | None = None) -> dict:
         """Structured JSON completion constrained by `schema`.
 
-        See complete() for `task` semantics.
+        See complete() for `task` / `use_cache` / `cache_hint` / `priority`
+        / `deadline` semantics.
 
         The schema is injected by the provider adapter (either as native
         response_schema, or as a system-prompt hint for OpenAI-compat).
@@ -103,81 +241,469 @@ class AIRouter:
                 f"schema must be dict, got: {type(schema).__name__}"
             )
 
+        prefix = _prefix_hint(prompt, cache_hint)
+        priority = self._priority(task, priority)
+        deadline = Deadline.coerce(deadline)
         if provider:
             provider = _cfg.canonicalize_provider_name(provider)
-            return self._complete_json_explicit(provider, tier, model, prompt, schema)
-        return self._complete_json_by_tier(task, tier, model, prompt, schema)
+            return self._complete_json_explicit(provider, tier, model, prompt, schema,
+                                                task=task, use_cache=use_cache,
+                                                prefix=prefix, priority=priority,
+                                                deadline=deadline)
+        return self._complete_json_by_tier(task, tier, model, prompt, schema,
+                                           use_cache=use_cache, prefix=prefix,
+                                           priority=priority, deadline=deadline)
+
+    def complete_stream(self, prompt: str, *,
+                        task: str = "",
+                        tier: str = TIER_STANDARD,
+                        provider: str | None = None,
+                        model: str | None = None,
+                        use_cache: bool = True,
+                        cache_hint: str | None = None,
+                        priority: str | None = None,
+                        deadline: float | Deadline | None = None) -> Iterator[str]:
+        """Streaming text completion (X5): returns an iterator of text deltas.
+
+        Routing / cache semantics match complete(). Fallback to the next
+        candidate only happens while nothing has been yielded yet — once the
+        caller has seen partial text, a mid-stream failure is raised. A cache
+        hit yields the whole stored text as a single delta. A `deadline`
+        covers the whole stream, including the consumer's time between
+        deltas.
+        """
+        if tier not in TIERS:
+            raise ValueError(f"tier must be one of {TIERS}, got: {tier!r}")
+        attempts = self._attempts(task, tier, provider, model)
+        return self._stream_text(prompt, attempts, task, use_cache,
+                                 _prefix_hint(prompt, cache_hint),
+                                 self._priority(task, priority),
+                                 Deadline.coerce(deadline))
+
+    def complete_json_stream(self, prompt: str, *,
+                             schema: dict,
+                             stream_key: str,
+                             task: str = "",
+                             tier: str = TIER_STANDARD,
+                             provider: str | None = None,
+                             model: str | None = None,
+                             use_cache: bool = True,
+                             cache_hint: str | None = None,
+                             priority: str | None = None,
+                             deadline: float | Deadline | None = None,
+                             route: dict | None = None) -> Iterator:
+        """Streaming complete_json(): yields each element of the top-level
+        array property `stream_key` (e.g. "translations") as soon as the
+        model has closed it.
+
+        The response is parsed incrementally; when the stream ends, the
+        full object is validated and any element the incremental parser
+        could not decode is yielded from it. Shares cache entries with
+        complete_json() for the same (prompt, schema). Fallback rules as
+        in complete_stream(). When `route` is a dict, its "provider" /
+        "model" are set to the candidate that answered (after a fallback,
+        not the routed one).
+        """
+        if tier not in TIERS:
+            raise ValueError(f"tier must be one of {TIERS}, got: {tier!r}")
+        if not isinstance(schema, dict):
+            raise ValueError(
+                f"schema must be dict, got: {type(schema).__name__}"
+            )
+        attempts = self._attempts(task, tier, provider, model)
+        return self._stream_json_items(prompt, schema, stream_key,
+                                       attempts, task, use_cache,
+                                       _prefix_hint(prompt, cache_hint),
+                                       self._priority(task, priority),
+                                       Deadline.coerce(deadline), route)
+
+    # ── Async LLM API ────────────────────────────────────────────────────────
+
+    async def acomplete(self, prompt: str, *,
+                        task: str = "",
+                        tier: str = TIER_STANDARD,
+                        provider: str | None = None,
+                        model: str | None = None,
+                        use_cache: bool = True,
+                        cache_hint: str | None = None,
+                        priority: str | None = None,
+                        deadline: float | Deadline | None = None) -> str:
+        """asyncio-native complete(). Same routing, fallback, hedging, cache,
+        rate limits, stats and circuit breakers as the sync call — the
+        limiter is shared, so sync threads and coroutines draw from the
+        same per-provider budget. Gemini / OpenAI-compat requests run on the
+        event loop through the SDKs' async clients; ClaudeCode (a
+        subprocess either way) runs on a worker thread. Cancelling the
+        awaiting task aborts the request, and so does the `deadline`
+        running out.
+        """
+        if tier not in TIERS:
+            raise ValueError(f"tier must be one of {TIERS}, got: {tier!r}")
+
+        prefix = _prefix_hint(prompt, cache_hint)
+        priority = self._priority(task, priority)
+        deadline = Deadline.coerce(deadline)
+
+        async def run(name, cfg, mid):
+            return await self._acall(name, cfg, mid, prompt, None,
+                                     task=task, use_cache=use_cache, prefix=prefix,
+                                     priority=priority, deadline=deadline)
+        return await self._afirst_success(
+            task, tier, self._attempts(task, tier, provider, model), run,
+            explicit=bool(provider), deadline=deadline)
+
+    async def acomplete_json(self, prompt: str, *,
+                             schema: dict,
+                             task: str = "",
+                             tier: str = TIER_STANDARD,
+                             provider: str | None = None,
+                             model: str | None = None,
+                             use_cache: bool = True,
+                             cache_hint: str | None = None,
+                             priority: str | None = None,
+                             deadline: float | Deadline | None = None) -> dict:
+        """asyncio-native complete_json(); see acomplete()."""
+        if tier not in TIERS:
+            raise ValueError(f"tier must be one of {TIERS}, got: {tier!r}")
+        if not isinstance(schema, dict):
+            raise ValueError(
+                f"schema must be dict, got: {type(schema).__name__}"
+            )
+
+        prefix = _prefix_hint(prompt, cache_hint)
+        priority = self._priority(task, priority)
+        deadline = Deadline.coerce(deadline)
+
+        async def run(name, cfg, mid):
+            return await self._acall(name, cfg, mid, prompt, schema,
+                                     task=task, use_cache=use_cache, prefix=prefix,
+                                     priority=priority, deadline=deadline)
+        return await self._afirst_success(
+            task, tier, self._attempts(task, tier, provider, model), run,
+            explicit=bool(provider), deadline=deadline)
+
+    async def aasr(self, audio_path: str, **kwargs) -> dict:
+        """asr() off the event loop. The Lemonfox upload (streamed multipart
+        with progress events) stays on `requests`, so this runs it on a
+        worker thread; `on_event` is called from that thread."""
+        return await asyncio.to_thread(self.asr, audio_path, **kwargs)
+
+    async def atts(self, text: str, output_path: str, **kwargs) -> None:
+        """tts() off the event loop (the Fish Audio SDK is sync-only), on a
+        worker thread. Cancelling the awaiting task flips `should_cancel`
+        so the stream stops at the next chunk."""
+        cancelled = False
+        user_cancel = kwargs.pop("should_cancel", None)
+
+        def should_cancel() -> bool:
+            return cancelled or bool(user_cancel and user_cancel())
+
+        try:
+            return await asyncio.to_thread(self.tts, text, output_path,
+                                           should_cancel=should_cancel, **kwargs)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+
+    # ── Offline batch jobs ───────────────────────────────────────────────────
+
+    def complete_json_batch(self, prompts: list, *,
+                            schema: dict,
+                            task: str = "",
+                            tier: str = TIER_STANDARD,
+                            provider: str | None = None,
+                            model: str | None = None,
+                            use_cache: bool = True,
+                            cache_hint: str | None = None,
+                            deadline: float | Deadline | None = None,
+                            poll_sec: float = _BATCH_POLL_SEC,
+                            progress_cb=None,
+                            route: dict | None = None) -> list:
+        """complete_json() for many prompts as one provider batch job.
+
+        For latency-tolerant bulk work (nightly translation of a whole
+        back-catalogue): the requests go out in a single submission billed
+        at the endpoint's batch rate, and this call polls every `poll_sec`
+        until the job finishes. The job is kept in a persistent table
+        (core.ai.batch), so if the process dies meanwhile, calling again
+        with the same prompts resumes the wait instead of resubmitting.
+
+        Only providers with "batch": true (openai_compatible endpoints that
+        offer the /batches API) qualify; the first one in the normal attempt
+        order is used, with no fallback mid-job. Prompts already in the
+        response cache are not submitted; collected answers are written to
+        it.
+
+        Args:
+            prompts:     Prompts to answer, each constrained by `schema`.
+            cache_hint:  Stable leading part shared by the prompts (see
+                         complete()); ignored for prompts not starting with it.
+            deadline:    Optional budget for the wait (seconds or Deadline).
+                         When it runs out AIError(NETWORK) is raised; the
+                         job keeps running remotely and a later call with
+                         the same prompts picks it up.
+            poll_sec:    Seconds between status polls.
+            progress_cb: Optional (completed, total) callback, fired from
+                         the calling thread after each poll.
+            route:       Optional dict; "provider" / "model" are set to the
+                         batch target answering the job.
+            Others as complete_json().
+
+        Returns:
+            A list parallel to `prompts`: each item the parsed dict, or the
+            Exception that request failed with — one bad request doesn't
+            lose the rest.
+
+        Raises:
+            RuntimeError: no batch-capable provider, or the job could not be
+                          submitted / polled.
+            AIError:      the deadline ran out while waiting.
+        """
+        if tier not in TIERS:
+            raise ValueError(f"tier must be one of {TIERS}, got: {tier!r}")
+        if not isinstance(schema, dict):
+            raise ValueError(
+                f"schema must be dict, got: {type(schema).__name__}"
+            )
+        deadline = Deadline.coerce(deadline)
+        name, cfg, model_id = self._batch_target(task, tier, provider, model)
+        if route is not None:
+            route.update(provider=name, model=model_id)
+
+        keys = [_cache.make_key(name, model_id, p, schema, task) for p in prompts]
+        answers: dict = {}
+        todo: dict = {}
+        for key, prompt in zip(keys, prompts):
+            if key in answers or key in todo:
+                continue
+            if use_cache and self._cache.enabled:
+                cached = self._cache.get(key)
+                self._stats.record_cache(name, hit=isinstance(cached, dict))
+                if isinstance(cached, dict):
+                    answers[key] = cached
+                    continue
+            todo[key] = prompt
+        if todo:
+            job = self._submit_batch(name, cfg, model_id, task, schema, todo, cache_hint)
+            self._await_batch(job, cfg, deadline, poll_sec, progress_cb)
+            for key in todo:
+                if key in job["results"]:
+                    answers[key] = job["results"][key]
+                else:
+                    answers[key] = _batch_error(
+                        name, job["errors"].get(key)
+                        or {"message": job.get("error") or "missing from the batch output"})
+        return [answers[key] for key in keys]
+
+    def get_batch_jobs(self) -> list:
+        """Summaries of the jobs in the batch table (oldest first): id,
+        provider, model, task, remote_id, status ("pending" | "completed" |
+        "failed"), progress {completed, failed, total}, error."""
+        return [_batch.summary(job) for job in self._batches.jobs()]
+
+    def resume_batch_jobs(self) -> list:
+        """Poll every pending batch job once, collecting the results of the
+        ones that finished into the job table and the response cache — e.g.
+        when a nightly run starts after a restart. Returns get_batch_jobs()."""
+        for job in self._batches.pending():
+            cfg = self._providers.get(job["provider"])
+            if cfg is None:
+                continue
+            try:
+                self._poll_batch(job, cfg)
+            except Exception:
+                pass   # still pending; the next resume / wait retries
+        return self.get_batch_jobs()
 
     def describe(self, task: str, tier: str = TIER_STANDARD) -> dict:
         """Return capability metadata for (task, tier).
 
-        Phase 1 stub: returns a placeholder dict so feature-layer code can
-        be written against the API shape. Phase 7 will fill real data
-        (max_input_tokens, supports_stream, supports_json, etc.).
+        Feature code sizes its work from this (batch sizes, worker pools,
+        map-reduce chunking) instead of hard-coding per-provider numbers.
 
-        Reserved fields (see docs/design/04-ai-router.md):
-            max_input_tokens:          int, default 0 (unknown)
+        Fields (see docs/design/04-ai-router.md):
+            max_input_tokens:          int, context window of the resolved
+                                       model (config.max_input_tokens);
+                                       0 = unknown
             supports_json:             bool
-            supports_stream:           bool, always False in Phase 1
-            supports_prefix_cache:     bool, always False in Phase 1 (X4)
-            supports_response_cache:   bool, always False in Phase 1 (X4)
-            safe_concurrency:          int, always 1 in Phase 1 (X6)
-            latency_p50_ms:            int, 0 = unknown
+            supports_stream:           bool, routed provider has a streaming
+                                       adapter (complete_stream)
+            supports_prefix_cache:     bool, routed provider honours
+                                       cache_hint= (Gemini with google-genai;
+                                       DeepSeek / OpenAI endpoints) (X4-A)
+            supports_response_cache:   bool, True while the disk cache is on (X4)
+            supports_batch:            bool, routed provider takes offline
+                                       batch jobs (complete_json_batch)
+            safe_concurrency:          int, live AIMD window of the provider's
+                                       rate limiter (X6)
+            latency_p50_ms:            int, median wall time of recent calls
+                                       for (provider, model, task), falling
+                                       back to the provider overall; 0 = no data
+            circuit_state:             str, "closed" | "open" | "half_open"
+                                       breaker state of the routed provider
             provider / model:          str, resolved target
         """
-        # Resolve the provider that would be used for (task, tier) today.
-        # Task is ignored in Phase 1 (no task->provider mapping yet); future
-        # versions will route by (task, tier) tuple.
-        _ = task  # suppress unused warning until Phase 7
-        routing = self._tier_routing.get(tier, {})
+        # Resolve the provider that would be used for (task, tier) today —
+        # same lookup as _complete_by_tier's first choice.
+        provider, model = self._resolve_task_tier(task, tier, None)
+        cfg = self._providers.get(provider) or {}
+        latency = self._stats.latency(provider, model, task)
+        if not latency["count"]:
+            latency = self._stats.latency(provider)
         return {
-            "max_input_tokens":        0,          # unknown in Phase 1
+            "max_input_tokens":        _cfg.max_input_tokens(cfg, model) if cfg else 0,
             "supports_json":           True,       # all current providers do
-            "supports_stream":         False,      # Phase 5 reserved
-            "supports_prefix_cache":   False,      # Phase 2 reserved (X4)
-            "supports_response_cache": False,      # Phase 2 reserved (X4)
-            "safe_concurrency":        1,          # Phase 2 reserved (X6)
-            "latency_p50_ms":          0,          # unknown
-            "provider":                routing.get("provider", ""),
-            "model":                   routing.get("model", ""),
+            "supports_stream":         cfg.get("type") in _STREAM_TYPES,
+            "supports_prefix_cache":   _supports_prefix_cache(cfg),
+            "supports_response_cache": self._cache.enabled,
+            "supports_batch":          _supports_batch(cfg),
+            "safe_concurrency":        self._limiter.get(provider).safe_concurrency if cfg else 1,
+            "latency_p50_ms":          latency["p50"],
+            "circuit_state":           self._health.get(provider).state if cfg else "closed",
+            "provider":                provider,
+            "model":                   model,
         }
 
     def get_stats(self) -> dict:
-        """Snapshot of per-provider call counters (deep-copied, thread-safe)."""
+        """Snapshot of per-provider call counters (deep-copied, thread-safe).
+
+        Each entry also carries latency_ms / ttfb_ms percentiles, char /
+        estimated-token / byte totals, and a `by_model_task` breakdown —
+        see core.ai.stats."""
         return self._stats.snapshot()
 
+    def get_limiter_stats(self) -> dict:
+        """Live limiter state per provider (window, in-flight, pause, 429s)."""
+        return self._limiter.snapshot()
+
+    def get_health(self) -> dict:
+        """Per-provider circuit-breaker snapshot (state, success rate, ...)."""
+        return self._health.snapshot()
+
+    def get_cache_info(self) -> dict:
+        """Size / entry count / limits of the on-disk response cache."""
+        return self._cache.info()
+
+    def clear_cache(self) -> None:
+        """Drop every cached response (e.g. after a provider-side model update)."""
+        self._cache.clear()
+
+    def lookup_translations(self, texts: list, *, source_lang: str, target_lang: str,
+                            task: str = "translate", tier: str = TIER_STANDARD) -> dict:
+        """Translation-memory lookup (core.ai.memory) for the provider and
+        model `task` is routed to: {index in `texts`: remembered
+        translation}. Hits and misses are counted per line in the routed
+        provider's Stats entry (`memory_hits` / `memory_misses`)."""
+        provider, model = self._resolve_task_tier(task, tier, None)
+        found = self._memory.lookup(texts, source_lang=source_lang,
+                                    target_lang=target_lang,
+                                    provider=provider, model=model)
+        looked_up = sum(1 for text in texts if _memory.normalize(text))
+        if provider and looked_up:
+            self._stats.record_memory(provider, hits=len(found),
+                                      misses=looked_up - len(found))
+        return found
+
+    def store_translations(self, pairs: list, *, source_lang: str, target_lang: str,
+                           provider: str, model: str) -> None:
+        """Remember (source text, translation) pairs under the provider and
+        model that produced them — the `route` a complete_json_stream() /
+        complete_json_batch() call reported, which after a fallback is not
+        the routed one."""
+        self._memory.store(pairs, source_lang=source_lang,
+                           target_lang=target_lang, provider=provider, model=model)
+
+    def get_memory_info(self) -> dict:
+        """Path / entry count / size of the translation memory."""
+        return self._memory.info()
+
+    def clear_memory(self) -> None:
+        """Forget every remembered translation."""
+        self._memory.clear()
+
+    def set_fixtures(self, mode: str, root: str | None = None, *,
+                     latency_scale: float = 1.0) -> None:
+        """Record / replay provider exchanges (core.ai.replay) — for offline
+        benchmarks and regression runs, not for normal use.
+
+        mode: "record" (call providers, save each exchange), "replay" (never
+        call providers; serve saved exchanges after their recorded latency ×
+        `latency_scale`) or "off". `root` defaults to
+        user_data/ai_fixtures/. The response cache is bypassed while a mode
+        is active, so every request reaches the fixture layer.
+        """
+        self._fixtures.configure(mode, root or _cfg.fixtures_dir(),
+                                 latency_scale=latency_scale)
+
     def get_tier_routing(self) -> dict:
         """Deep-copy of current tier routing config.
         Structure: {"premium": {"provider": "Gemini", "model": "..."}, ...}
         """
-        import copy
-        return copy.deepcopy(self._tier_routing)
+        return _cfg.thaw(self._tier_routing)
 
     def set_tier_routing(self, tier: str, provider: str, model: str) -> None:
         """Update (provider, model) for a tier and persist."""
         if tier not in TIERS:
             raise ValueError(f"tier must be one of {TIERS}")
-        self._tier_routing[tier] = {"provider": provider, "model": model}
-        self._persist()
+        with self._config_lock:
+            data = self._snap.data()
+            data["tier_routing"][tier] = {"provider": provider, "model": model}
+            self._persist(data)
 
     def get_task_routing(self) -> dict:
         """Deep-copy of the task routing map.
         Structure: {task_id: {"provider": str, "model": str}}
         """
-        import copy
-        return copy.deepcopy(self._task_routing)
+        return _cfg.thaw(self._task_routing)
 
     def set_task_routing(self, task: str, provider: str, model: str) -> None:
-        """Set the single routing entry for a task and persist."""
-        self._task_routing[task] = {"provider": provider, "model": model}
-        self._persist()
+        """Set the single routing entry for a task and persist. Per-task
+        options on the cell (e.g. "hedge") are kept."""
+        with self._config_lock:
+            data = self._snap.data()
+            cell = data["task_routing"].setdefault(task, {})
+            cell.update({"provider": provider, "model": model})
+            self._persist(data)
+
+    def set_task_hedge(self, task: str, enabled: bool, after_ms: int = 0) -> None:
+        """Opt a task in / out of hedged requests and persist.
+
+        With hedging on, an auto-routed complete() / complete_json() for the
+        task sends the same prompt to the next candidate when the primary
+        hasn't answered within `after_ms` (0 = the primary's recent p95
+        latency); the first reply wins and the other is cancelled.
+        """
+        with self._config_lock:
+            data = self._snap.data()
+            cell = data["task_routing"].setdefault(task, {"provider": "", "model": ""})
+            cell["hedge"] = bool(enabled)
+            if after_ms:
+                cell["hedge_after_ms"] = int(after_ms)
+            else:
+                cell.pop("hedge_after_ms", None)
+            self._persist(data)
+
+    def set_task_priority(self, task: str, priority: str | None) -> None:
+        """Set the task's default limiter priority class ("interactive" /
+        "normal" / "bulk") and persist. None restores the built-in default
+        (config.TASK_PRIORITY)."""
+        if priority is not None and priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {PRIORITIES}, got: {priority!r}")
+        with self._config_lock:
+            data = self._snap.data()
+            cell = data["task_routing"].setdefault(task, {"provider": "", "model": ""})
+            if priority is None:
+                cell.pop("priority", None)
+            else:
+                cell["priority"] = priority
+            self._persist(data)
 
     def get_provider_names(self) -> list:
         return list(self._providers.keys())
 
     def get_provider_models(self, provider: str) -> list:
         provider = _cfg.canonicalize_provider_name(provider)
-        return self._providers.get(provider, {}).get("models", [])
+        return list(self._providers.get(provider, {}).get("models", []))
 
     def list_models(self, provider: str) -> list[str]:
         """Fetch live model list from the provider's API.
@@ -193,7 +719,7 @@ class AIRouter:
         if cfg is None:
             raise RuntimeError(f"Unknown provider: {provider!r}")
         ptype = cfg.get("type")
-        api_key = _cfg.read_key(cfg)
+        api_key = self._snap.key(cfg)
         if ptype == "gemini":
             if not api_key:
                 raise RuntimeError(f"API key required to list Gemini models")
@@ -222,7 +748,7 @@ class AIRouter:
         for name, cfg in self._providers.items():
             if not cfg.get("enabled", True):
                 continue
-            if not _cfg.has_auth(cfg):
+            if not self._snap.has_auth(cfg):
                 continue
             model_id = cfg["tiers"].get(tier) if tier else None
             if tier and not model_id:
@@ -274,7 +800,7 @@ class AIRouter:
             raise RuntimeError(f"Unknown ASR provider: {provider!r}")
         if not cfg.get("enabled", True):
             raise RuntimeError(f"ASR provider {provider!r} is disabled")
-        api_key = _cfg.read_key(cfg)
+        api_key = self._snap.key(cfg)
         if api_key is None:
             raise RuntimeError(
                 f"ASR API key not configured for {provider!r} — "
@@ -313,12 +839,11 @@ class AIRouter:
         cfg = self._asr_providers.get(provider)
         if cfg is None:
             return None
-        return _cfg.read_key(cfg)
+        return self._snap.key(cfg)
 
     def get_asr_config(self, provider: str) -> dict | None:
-        import copy
         cfg = self._asr_providers.get(provider)
-        return copy.deepcopy(cfg) if cfg else None
+        return _cfg.thaw(cfg) if cfg else None
 
     def get_available_asr_providers(self) -> list:
         return [
@@ -326,17 +851,19 @@ class AIRouter:
                 "name":     name,
                 "display":  cfg.get("name", name),
                 "enabled":  cfg.get("enabled", True),
-                "has_key":  _cfg.read_key(cfg) is not None,
+                "has_key":  self._snap.key(cfg) is not None,
                 "base_url": cfg.get("base_url", ""),
             }
             for name, cfg in self._asr_providers.items()
         ]
 
     def update_asr_provider(self, provider: str, **kwargs) -> None:
-        if provider not in self._asr_providers:
-            raise RuntimeError(f"Unknown ASR provider: {provider!r}")
-        self._asr_providers[provider].update(kwargs)
-        self._persist()
+        with self._config_lock:
+            data = self._snap.data()
+            if provider not in data["asr_providers"]:
+                raise RuntimeError(f"Unknown ASR provider: {provider!r}")
+            data["asr_providers"][provider].update(kwargs)
+            self._persist(data)
 
     # ── TTS API ──────────────────────────────────────────────────────────────
 
@@ -371,7 +898,7 @@ class AIRouter:
             raise RuntimeError(f"Unknown TTS provider: {provider!r}")
         if not cfg.get("enabled", True):
             raise RuntimeError(f"TTS provider {provider!r} is disabled")
-        api_key = _cfg.read_key(cfg)
+        api_key = self._snap.key(cfg)
         if api_key is None:
             raise RuntimeError(
                 f"TTS API key not configured for {provider!r} — "
@@ -404,12 +931,11 @@ class AIRouter:
         cfg = self._tts_providers.get(provider)
         if cfg is None:
             return None
-        return _cfg.read_key(cfg)
+        return self._snap.key(cfg)
 
     def get_tts_config(self, provider: str) -> dict | None:
-        import copy
         cfg = self._tts_providers.get(provider)
-        return copy.deepcopy(cfg) if cfg else None
+        return _cfg.thaw(cfg) if cfg else None
 
     def get_available_tts_providers(self) -> list:
         return [
@@ -417,37 +943,55 @@ class AIRouter:
                 "name":    name,
                 "display": cfg.get("name", name),
                 "enabled": cfg.get("enabled", True),
-                "has_key": _cfg.read_key(cfg) is not None,
+                "has_key": self._snap.key(cfg) is not None,
             }
             for name, cfg in self._tts_providers.items()
         ]
 
     def update_tts_provider(self, provider: str, **kwargs) -> None:
-        if provider not in self._tts_providers:
-            raise RuntimeError(f"Unknown TTS provider: {provider!r}")
-        self._tts_providers[provider].update(kwargs)
-        self._persist()
+        with self._config_lock:
+            data = self._snap.data()
+            if provider not in data["tts_providers"]:
+                raise RuntimeError(f"Unknown TTS provider: {provider!r}")
+            data["tts_providers"][provider].update(kwargs)
+            self._persist(data)
 
     def set_provider_enabled(self, provider: str, enabled: bool) -> None:
         provider = _cfg.canonicalize_provider_name(provider)
-        if provider in self._providers:
-            self._providers[provider]["enabled"] = enabled
-            self._persist()
+        with self._config_lock:
+            data = self._snap.data()
+            if provider in data["providers"]:
+                data["providers"][provider]["enabled"] = enabled
+                self._persist(data)
 
     def update_provider(self, provider: str, **kwargs) -> None:
         """Update arbitrary fields on an LLM provider entry. Allows new fields."""
         provider = _cfg.canonicalize_provider_name(provider)
-        if provider not in self._providers:
-            raise RuntimeError(f"Unknown provider: {provider!r}")
-        cfg = self._providers[provider]
-        for k, v in kwargs.items():
-            cfg[k] = v
-        self._persist()
+        with self._config_lock:
+            data = self._snap.data()
+            if provider not in data["providers"]:
+                raise RuntimeError(f"Unknown provider: {provider!r}")
+            cfg = data["providers"][provider]
+            for k, v in kwargs.items():
+                cfg[k] = v
+            self._limiter.configure(provider, **_cfg.rate_limits(cfg))
+            # Key file / base_url may have changed — don't keep serving pooled
+            # SDK clients built from the old credentials, and give the provider
+            # a fresh breaker instead of judging it by the old endpoint.
+            _sdk_clients.invalidate_all()
+            _claude_code.shutdown_pool()
+            self._health.reset(provider)
+            # Also re-reads the key files, so a key the console just wrote
+            # is live immediately rather than on the watcher's next tick.
+            self._persist(data)
 
     # ── Internal routing ─────────────────────────────────────────────────────
 
     def _complete_explicit(self, provider: str, tier: str,
-                           model: str | None, prompt: str) -> str:
+                           model: str | None, prompt: str, *,
+                           task: str = "", use_cache: bool = True,
+                           prefix: str = "", priority: str = PRIORITY_NORMAL,
+                           deadline: Deadline | None = None) -> str:
         cfg = self._providers.get(provider)
         if cfg is None:
             raise RuntimeError(
@@ -458,7 +1002,11 @@ class AIRouter:
             raise RuntimeError(
                 f"provider {provider!r} has no model configured for tier={tier!r}"
             )
-        return self._call(provider, cfg, resolved_model, prompt)
+        return _retry_transient(
+            lambda: self._call(provider, cfg, resolved_model, prompt,
+                               task=task, use_cache=use_cache, prefix=prefix,
+                               priority=priority, deadline=deadline),
+            deadline)
 
     def _resolve_task_tier(self, task: str, tier: str,
                            model_override: str | None) -> tuple[str, str]:
@@ -484,36 +1032,26 @@ class AIRouter:
         return legacy.get("provider", ""), model_override or legacy.get("model", "")
 
     def _complete_by_tier(self, task: str, tier: str,
-                          model: str | None, prompt: str) -> str:
-        """Task/tier routing with explicit-config priority, auto-fallback on error."""
-        r_provider, r_model = self._resolve_task_tier(task, tier, model)
-
-        if r_provider and r_model:
-            cfg = self._providers.get(r_provider)
-            if cfg and cfg.get("enabled", True) and _cfg.read_key(cfg) is not None:
-                try:
-                    return self._call(r_provider, cfg, r_model, prompt)
-                except Exception:
-                    pass  # Explicitly configured failed -> fall through to auto
-
-        candidates = self._get_candidates(tier)
-        if not candidates:
-            raise RuntimeError(
-                f"No available provider for tier={tier!r}. "
-                "Configure an API Key in the AI Router manager."
-            )
-        last_err = None
-        for name, cfg, mid in candidates:
-            try:
-                return self._call(name, cfg, model or mid, prompt)
-            except Exception as e:
-                last_err = e
-        raise RuntimeError(
-            f"All providers for tier={tier!r} failed. Last error: {last_err}"
-        )
+                          model: str | None, prompt: str, *,
+                          use_cache: bool = True, prefix: str = "",
+                          priority: str = PRIORITY_NORMAL,
+                          deadline: Deadline | None = None) -> str:
+        """Task/tier routing with explicit-config priority, auto-fallback on
+        error. Candidate order and breaker skipping come from _attempts()."""
+        def run(name, cfg, mid, cancel=None):
+            return self._call(name, cfg, mid, prompt, task=task,
+                              use_cache=use_cache, cancel=cancel, prefix=prefix,
+                              priority=priority, deadline=deadline)
+        return self._first_success(task, tier,
+                                   self._attempts(task, tier, None, model), run,
+                                   deadline=deadline)
 
     def _complete_json_explicit(self, provider: str, tier: str, model: str | None,
-                                prompt: str, schema: dict) -> dict:
+                                prompt: str, schema: dict, *,
+                                task: str = "", use_cache: bool = True,
+                                prefix: str = "",
+                                priority: str = PRIORITY_NORMAL,
+                                deadline: Deadline | None = None) -> dict:
         cfg = self._providers.get(provider)
         if cfg is None:
             raise RuntimeError(
@@ -524,38 +1062,232 @@ class AIRouter:
             raise RuntimeError(
                 f"provider {provider!r} has no model configured for tier={tier!r}"
             )
-        return self._call_json(provider, cfg, resolved_model, prompt, schema)
+        return _retry_transient(
+            lambda: self._call_json(provider, cfg, resolved_model, prompt, schema,
+                                    task=task, use_cache=use_cache, prefix=prefix,
+                                    priority=priority, deadline=deadline),
+            deadline)
 
     def _complete_json_by_tier(self, task: str, tier: str, model: str | None,
-                               prompt: str, schema: dict) -> dict:
-        r_provider, r_model = self._resolve_task_tier(task, tier, model)
+                               prompt: str, schema: dict, *,
+                               use_cache: bool = True, prefix: str = "",
+                               priority: str = PRIORITY_NORMAL,
+                               deadline: Deadline | None = None) -> dict:
+        def run(name, cfg, mid, cancel=None):
+            return self._call_json(name, cfg, mid, prompt, schema, task=task,
+                                   use_cache=use_cache, cancel=cancel, prefix=prefix,
+                                   priority=priority, deadline=deadline)
+        return self._first_success(task, tier,
+                                   self._attempts(task, tier, None, model), run,
+                                   deadline=deadline)
+
+    def _first_success(self, task: str, tier: str, attempts: list, run, *,
+                       deadline: Deadline | None = None):
+        """Walk `attempts` in order, returning the first successful
+        run(name, cfg, model_id, cancel). When the task opted into hedging,
+        the first two candidates are raced by _hedged() before the rest are
+        tried sequentially. Fallbacks stop once `deadline` has run out."""
+        last_err = None
+        if self._hedge_enabled(task) and len(attempts) >= 2:
+            try:
+                return self._hedged(task, attempts[0], attempts[1], run)
+            except Exception as e:
+                last_err = e
+            attempts = attempts[2:]
+        for name, cfg, mid in attempts:
+            if deadline is not None and deadline.expired:
+                break
+            try:
+                return run(name, cfg, mid)
+            except Exception as e:
+                last_err = e
+        raise _all_failed(tier, last_err, deadline)
+
+    def _priority(self, task: str, priority: str | None) -> str:
+        """Limiter priority class for a request: the caller's `priority`, else
+        the task's task_routing "priority", else config.TASK_PRIORITY."""
+        if priority is not None:
+            if priority not in PRIORITIES:
+                raise ValueError(f"priority must be one of {PRIORITIES}, got: {priority!r}")
+            return priority
+        configured = self._task_routing.get(task, {}).get("priority") if task else None
+        if configured in PRIORITIES:
+            return configured
+        return _cfg.TASK_PRIORITY.get(task, PRIORITY_NORMAL)
+
+    def _hedge_enabled(self, task: str) -> bool:
+        return bool(task and self._task_routing.get(task, {}).get("hedge"))
+
+    def _hedge_delay_ms(self, task: str, name: str, model_id: str) -> float:
+        """How long the primary gets before the backup is fired: the task's
+        `hedge_after_ms` if set, else the primary's recent p95 for this
+        (model, task), else its provider-wide p95, else _HEDGE_DEFAULT_MS."""
+        fixed = self._task_routing.get(task, {}).get("hedge_after_ms")
+        if fixed:
+            return float(fixed)
+        for latency in (self._stats.latency(name, model_id, task),
+                        self._stats.latency(name)):
+            if latency["count"] >= _HEDGE_MIN_SAMPLES:
+                return float(latency["p95"])
+        return float(_HEDGE_DEFAULT_MS)
+
+    def _hedged(self, task: str, primary: tuple, backup: tuple, run):
+        """Race `primary` against `backup`, the latter started only once the
+        primary has been silent for _hedge_delay_ms() (or has failed).
+
+        Each racer runs on its own daemon thread with its own
+        CancellationToken; the first success wins and the other racer is
+        cancelled, which fires the adapter's registered abort (HTTP stream
+        close / subprocess kill). Raises the last error if both fail.
+        """
+        results: queue.Queue = queue.Queue()
+        racers: list[tuple[tuple, CancellationToken]] = []
 
-        if r_provider and r_model:
-            cfg = self._providers.get(r_provider)
-            if cfg and cfg.get("enabled", True) and _cfg.read_key(cfg) is not None:
+        def launch(attempt: tuple) -> None:
+            token = CancellationToken()
+            racers.append((attempt, token))
+
+            def work():
                 try:
-                    return self._call_json(r_provider, cfg, r_model, prompt, schema)
-                except Exception:
-                    pass
+                    results.put((attempt, True, run(*attempt, token)))
+                except Exception as e:
+                    results.put((attempt, False, e))
 
-        candidates = self._get_candidates(tier)
-        if not candidates:
-            raise RuntimeError(
-                f"No available provider for tier={tier!r}. "
-                "Configure an API Key in the AI Router manager."
-            )
+            threading.Thread(target=work, daemon=True,
+                             name=f"ai-hedge-{attempt[0]}").start()
+
+        launch(primary)
+        delay = self._hedge_delay_ms(task, primary[0], primary[2]) / 1000.0
+        pending = 1
+        last_err = None
+        while pending:
+            try:
+                attempt, ok, value = results.get(
+                    timeout=delay if len(racers) == 1 else None)
+            except queue.Empty:
+                launch(backup)
+                pending += 1
+                continue
+            pending -= 1
+            if ok:
+                for other, token in racers:
+                    if other is not attempt:
+                        token.cancel()
+                return value
+            last_err = value
+            if len(racers) == 1:
+                launch(backup)
+                pending += 1
+        raise last_err
+
+    async def _afirst_success(self, task: str, tier: str, attempts: list, run, *,
+                              explicit: bool = False,
+                              deadline: Deadline | None = None):
+        """Coroutine counterpart of _first_success(). An explicit provider
+        gets the sync explicit path's transient retry, and its error is
+        raised as-is."""
+        if explicit:
+            return await _aretry_transient(lambda: run(*attempts[0]), deadline)
         last_err = None
-        for name, cfg, mid in candidates:
+        if self._hedge_enabled(task) and len(attempts) >= 2:
             try:
-                return self._call_json(name, cfg, model or mid, prompt, schema)
+                return await self._ahedged(task, attempts[0], attempts[1], run)
             except Exception as e:
                 last_err = e
-        raise RuntimeError(
-            f"All providers for tier={tier!r} failed. Last error: {last_err}"
-        )
+            attempts = attempts[2:]
+        for name, cfg, mid in attempts:
+            if deadline is not None and deadline.expired:
+                break
+            try:
+                return await run(name, cfg, mid)
+            except Exception as e:
+                last_err = e
+        raise _all_failed(tier, last_err, deadline)
+
+    async def _ahedged(self, task: str, primary: tuple, backup: tuple, run):
+        """_hedged() on asyncio tasks: the loser is simply cancelled, which
+        aborts its in-flight HTTP request."""
+        delay = self._hedge_delay_ms(task, primary[0], primary[2]) / 1000.0
+        tasks = [asyncio.ensure_future(run(*primary))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done and tasks[0].exception() is None:
+                return tasks[0].result()
+            tasks.append(asyncio.ensure_future(run(*backup)))
+            pending = {t for t in tasks if not t.done()}
+            last_err = tasks[0].exception() if tasks[0].done() else None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        return t.result()
+                    last_err = t.exception()
+            raise last_err
+        finally:
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+
+    def _attempts(self, task: str, tier: str, provider: str | None,
+                  model: str | None) -> list:
+        """Ordered (name, cfg, model_id) list a call will try.
+
+        Explicit provider -> just that one, whatever its health. Otherwise
+        the task's routed provider first, then the tier's candidates
+        (deduplicated), reordered by _order_by_health().
+        """
+        if provider:
+            provider = _cfg.canonicalize_provider_name(provider)
+            cfg = self._providers.get(provider)
+            if cfg is None:
+                raise RuntimeError(
+                    f"Unknown provider: {provider!r}, check providers.json"
+                )
+            resolved = model or cfg["tiers"].get(tier) or cfg["tiers"].get(TIER_STANDARD)
+            if not resolved:
+                raise RuntimeError(
+                    f"provider {provider!r} has no model configured for tier={tier!r}"
+                )
+            return [(provider, cfg, resolved)]
+
+        routed = []
+        r_provider, r_model = self._resolve_task_tier(task, tier, model)
+        if r_provider and r_model:
+            cfg = self._providers.get(r_provider)
+            if cfg and cfg.get("enabled", True) and self._snap.has_auth(cfg):
+                routed.append((r_provider, cfg, r_model))
+        fallbacks = []
+        for name, cfg, mid in self._get_candidates(tier):
+            if (name, model or mid) not in [(n, m) for n, _c, m in routed + fallbacks]:
+                fallbacks.append((name, cfg, model or mid))
+        if not routed and not fallbacks:
+            raise RuntimeError(
+                f"No available provider for tier={tier!r}. "
+                "Configure an API Key in the AI Router manager."
+            )
+        return self._order_by_health(routed, fallbacks)
+
+    def _order_by_health(self, routed: list, fallbacks: list) -> list:
+        """Apply circuit breakers and recent health to the attempt order.
+
+        Providers whose breaker isn't closed are skipped (checking them may
+        start a background probe). The routed provider keeps first place
+        while healthy — it's the user's explicit choice; fallbacks are
+        sorted by recent success rate, then latency, then config priority
+        (stable sort). If every breaker is open the full list is returned
+        unchanged: trying a tripped provider beats failing outright.
+        """
+        usable_routed = [a for a in routed if self._health.allow(a[0])]
+        usable = [a for a in fallbacks if self._health.allow(a[0])]
+        usable.sort(key=lambda a: self._health.rank(a[0]))
+        ordered = usable_routed + usable
+        return ordered or routed + fallbacks
 
     def _get_candidates(self, tier: str) -> list:
-        """Return (name, cfg, model_id) sorted by priority, filtering unavailable."""
+        """Return (name, cfg, model_id) sorted by priority, filtering unavailable.
+
+        Config order only — health-based reordering is _order_by_health()."""
         result = []
         for name, cfg in self._providers.items():
             if not cfg.get("enabled", True):
@@ -563,92 +1295,878 @@ class AIRouter:
             model_id = cfg["tiers"].get(tier, "")
             if not model_id:
                 continue
-            if not _cfg.has_auth(cfg):
+            if not self._snap.has_auth(cfg):
                 continue
             result.append((name, cfg, model_id, cfg.get("priority", 99)))
         result.sort(key=lambda x: x[3])
         return [(n, c, m) for n, c, m, _ in result]
 
+    def _batch_target(self, task: str, tier: str, provider: str | None,
+                      model: str | None) -> tuple:
+        """First (name, cfg, model_id) in the attempt order that takes batch
+        jobs."""
+        for name, cfg, model_id in self._attempts(task, tier, provider, model):
+            if _supports_batch(cfg):
+                return name, cfg, model_id
+        raise RuntimeError(
+            f"No batch-capable provider for task={task!r} tier={tier!r}. "
+            'Set "batch": true on an openai_compatible provider whose '
+            "endpoint offers the /batches API."
+        )
+
+    def _submit_batch(self, name: str, cfg, model_id: str, task: str,
+                      schema: dict, todo: dict, cache_hint: str | None) -> dict:
+        """The table's job for exactly these requests (pending, or finished
+        within batch.KEEP_SEC), else a fresh submission. A failed job is
+        resubmitted."""
+        job_id = _batch.make_job_id(name, model_id, list(todo))
+        job = self._batches.get(job_id)
+        if job is not None and job.get("status") != _batch.FAILED:
+            return job
+        api_key, base_url = self._batch_endpoint(name, cfg)
+        requests = [(key, prompt, schema, _prefix_hint(prompt, cache_hint))
+                    for key, prompt in todo.items()]
+        remote_id = _openai_compat.batch_submit(api_key, base_url, model_id, requests,
+                                                timeout=_cfg.request_timeout(cfg))
+        return self._batches.create(job_id, provider=name, model=model_id, task=task,
+                                    remote_id=remote_id, requests=list(todo))
+
+    def _await_batch(self, job: dict, cfg, deadline: Deadline | None,
+                     poll_sec: float, progress_cb) -> None:
+        """Poll `job` until it leaves PENDING. Transient poll errors are
+        retried; _BATCH_POLL_ERRORS in a row end the wait (the job itself
+        stays pending in the table)."""
+        failures = 0
+        while job["status"] == _batch.PENDING:
+            try:
+                self._poll_batch(job, cfg)
+                failures = 0
+            except Exception:
+                failures += 1
+                if failures >= _BATCH_POLL_ERRORS:
+                    raise
+            if progress_cb:
+                progress = job["progress"]
+                progress_cb(progress["completed"] + progress["failed"], progress["total"])
+            if job["status"] != _batch.PENDING:
+                return
+            if deadline is not None and deadline.expired:
+                raise deadline.error(job["provider"])
+            time.sleep(poll_sec if deadline is None else min(poll_sec, deadline.remaining()))
+
+    def _poll_batch(self, job: dict, cfg) -> None:
+        """One status check; once the remote job has finished, collect its
+        results into the job (and the response cache) and close it."""
+        name = job["provider"]
+        api_key, base_url = self._batch_endpoint(name, cfg)
+        timeout = _cfg.request_timeout(cfg)
+        status = _openai_compat.batch_status(api_key, base_url, job["remote_id"],
+                                             timeout=timeout)
+        job["progress"] = {"completed": status["completed"], "failed": status["failed"],
+                           "total": status["total"] or len(job["requests"])}
+        if status["status"] not in _BATCH_FINISHED:
+            self._batches.save(job)
+            return
+        results = _openai_compat.batch_results(api_key, base_url, status["output_file_id"],
+                                               status["error_file_id"], timeout=timeout)
+        wanted = set(job["requests"])
+        for key, value in results.items():
+            if key not in wanted:
+                continue
+            if isinstance(value, Exception):
+                job["errors"][key] = _batch_error_entry(value)
+                self._stats.record(name, success=False, error=str(value),
+                                   model=job["model"], task=job["task"])
+                continue
+            job["results"][key] = value
+            self._cache.put(key, value)
+            self._stats.record(name, success=True, model=job["model"], task=job["task"],
+                               output_text=json.dumps(value, ensure_ascii=False))
+        if status["status"] == "completed":
+            job["status"] = _batch.COMPLETED
+        else:
+            job["status"] = _batch.FAILED
+            job["error"] = f"batch job {job['remote_id']} {status['status']}"
+        self._batches.save(job)
+
+    def _batch_endpoint(self, name: str, cfg) -> tuple:
+        api_key = self._snap.key(cfg)
+        if api_key is None:
+            raise RuntimeError(f"API Key not configured: {cfg.get('key_file', '?')}")
+        base_url = cfg.get("base_url", "")
+        if not base_url:
+            raise RuntimeError(f"provider {name!r} has no base_url configured")
+        return api_key, base_url
+
     # ── Provider dispatch ────────────────────────────────────────────────────
 
-    def _call(self, name: str, cfg: dict, model_id: str, prompt: str) -> str:
-        """Dispatch to the right provider adapter. Records stats; re-raises."""
+    def _call(self, name: str, cfg: dict, model_id: str, prompt: str, *,
+              task: str = "", use_cache: bool = True,
+              cancel: CancellationToken | None = None,
+              prefix: str = "", priority: str = PRIORITY_NORMAL,
+              deadline: Deadline | None = None) -> str:
+        """Dispatch to the right provider adapter. Records stats; re-raises.
+
+        Cache lookup happens here (not in complete()) because the key needs
+        the resolved provider + model — a fallback to another provider must
+        not be served the first provider's answer under the same key.
+
+        `cancel` is handed to the adapter, which registers its abort with it
+        (used by hedged requests to tear down the losing call). `prefix` is
+        the validated cache_hint; the adapter reports cached input tokens
+        back through `usage`. `priority` is the limiter class (_priority()).
+
+        Every adapter call gets a hard `timeout` — the provider's
+        timeout_sec, capped by what's left of `deadline`. Under a deadline
+        the adapter also gets a token that fires when it runs out (see
+        _deadline_token), so the request is torn down mid-flight.
+        """
+        cache_key = None
+        if use_cache and self._cache.enabled and not self._fixtures.active:
+            cache_key = _cache.make_key(name, model_id, prompt, None, task)
+            cached = self._cache.get(cache_key)
+            if isinstance(cached, str):
+                self._stats.record_cache(name, hit=True)
+                return cached
+            self._stats.record_cache(name, hit=False)
+
         ptype = cfg.get("type")
         api_key = None
         if ptype != "claude_code":
-            api_key = _cfg.read_key(cfg)
+            api_key = self._snap.key(cfg)
             if api_key is None:
                 raise RuntimeError(f"API Key not configured: {cfg.get('key_file', '?')}")
 
-        try:
+        usage: dict = {}
+        outer_cancel = cancel
+        cancel, disarm = _deadline_token(cancel, deadline)
+
+        def invoke() -> str:
+            timeout = _call_timeout(name, cfg, deadline)
             if ptype == "gemini":
-                result = _gemini.call(api_key, model_id, prompt)
-            elif ptype == "openai_compatible":
+                return _gemini.call(api_key, model_id, prompt, cancel,
+                                    prefix=prefix, usage=usage, timeout=timeout)
+            if ptype == "openai_compatible":
                 base_url = cfg.get("base_url", "")
                 if not base_url:
                     raise RuntimeError(f"provider {name!r} has no base_url configured")
-                result = _openai_compat.call(api_key, base_url, model_id, prompt)
-            elif ptype == "claude_code":
-                result = _claude_code.call(cfg, model_id, prompt)
-            else:
-                raise RuntimeError(f"Unsupported provider type: {ptype!r}")
-
-            self._stats.record(name, success=True)
-            return result
-
-        except Exception as e:
-            self._stats.record(name, success=False, error=str(e))
-            raise
+                return _openai_compat.call(api_key, base_url, model_id, prompt, cancel,
+                                           prefix=prefix, usage=usage, timeout=timeout)
+            if ptype == "claude_code":
+                return _claude_code.call(cfg, model_id, prompt, cancel, timeout=timeout)
+            raise RuntimeError(f"Unsupported provider type: {ptype!r}")
+
+        invoke = _under_deadline(invoke, name, deadline, outer_cancel)
+        invoke = self._with_fixtures(invoke, name, model_id, prompt, None, task)
+        try:
+            result, shared = self._single_flight(
+                name, model_id, prompt, None, task, cancel,
+                lambda: self._dispatch(name, prompt, invoke, model_id=model_id,
+                                       task=task, usage=usage, priority=priority,
+                                       deadline=deadline))
+        finally:
+            disarm()
+        if cache_key is not None and not shared:
+            self._cache.put(cache_key, result)
+        return result
 
     def _call_json(self, name: str, cfg: dict, model_id: str,
-                   prompt: str, schema: dict) -> dict:
+                   prompt: str, schema: dict, *,
+                   task: str = "", use_cache: bool = True,
+                   cancel: CancellationToken | None = None,
+                   prefix: str = "", priority: str = PRIORITY_NORMAL,
+                   deadline: Deadline | None = None) -> dict:
+        cache_key = None
+        if use_cache and self._cache.enabled and not self._fixtures.active:
+            cache_key = _cache.make_key(name, model_id, prompt, schema, task)
+            cached = self._cache.get(cache_key)
+            if isinstance(cached, dict):
+                self._stats.record_cache(name, hit=True)
+                return cached
+            self._stats.record_cache(name, hit=False)
+
         ptype = cfg.get("type")
         api_key = None
         if ptype != "claude_code":
-            api_key = _cfg.read_key(cfg)
+            api_key = self._snap.key(cfg)
             if api_key is None:
                 raise RuntimeError(f"API Key not configured: {cfg.get('key_file', '?')}")
 
+        usage: dict = {}
+        outer_cancel = cancel
+        cancel, disarm = _deadline_token(cancel, deadline)
+
+        def invoke() -> dict:
+            timeout = _call_timeout(name, cfg, deadline)
+            if ptype == "gemini":
+                return _gemini.call_json(api_key, model_id, prompt, schema, cancel,
+                                         prefix=prefix, usage=usage, timeout=timeout)
+            if ptype == "openai_compatible":
+                base_url = cfg.get("base_url", "")
+                if not base_url:
+                    raise RuntimeError(f"provider {name!r} has no base_url configured")
+                return _openai_compat.call_json(api_key, base_url, model_id, prompt,
+                                                schema, cancel, prefix=prefix, usage=usage,
+                                                timeout=timeout)
+            if ptype == "claude_code":
+                return _claude_code.call_json(cfg, model_id, prompt, schema, cancel,
+                                              timeout=timeout)
+            raise RuntimeError(f"Unsupported JSON provider type: {ptype!r}")
+
+        invoke = _under_deadline(invoke, name, deadline, outer_cancel)
+        invoke = self._with_fixtures(invoke, name, model_id, prompt, schema, task)
         try:
+            result, shared = self._single_flight(
+                name, model_id, prompt, schema, task, cancel,
+                lambda: self._dispatch(name, prompt, invoke, model_id=model_id,
+                                       task=task, usage=usage, priority=priority,
+                                       deadline=deadline))
+        finally:
+            disarm()
+        if cache_key is not None and not shared:
+            self._cache.put(cache_key, result)
+        return result
+
+    async def _acall(self, name: str, cfg, model_id: str, prompt: str,
+                     schema: dict | None, *, task: str = "",
+                     use_cache: bool = True, prefix: str = "",
+                     priority: str = PRIORITY_NORMAL,
+                     deadline: Deadline | None = None):
+        """Async _call() / _call_json() (JSON when `schema` is set). Shares
+        cache entries with the sync calls. A `deadline` is enforced by
+        _adispatch() cancelling the awaiting task."""
+        cache_key = None
+        if use_cache and self._cache.enabled and not self._fixtures.active:
+            cache_key = _cache.make_key(name, model_id, prompt, schema, task)
+            cached = self._cache.get(cache_key)
+            if isinstance(cached, str if schema is None else dict):
+                self._stats.record_cache(name, hit=True)
+                return cached
+            self._stats.record_cache(name, hit=False)
+
+        ptype = cfg.get("type")
+        api_key = None
+        if ptype != "claude_code":
+            api_key = self._snap.key(cfg)
+            if api_key is None:
+                raise RuntimeError(f"API Key not configured: {cfg.get('key_file', '?')}")
+
+        usage: dict = {}
+
+        async def invoke():
+            timeout = _call_timeout(name, cfg, deadline)
             if ptype == "gemini":
-                result = _gemini.call_json(api_key, model_id, prompt, schema)
-            elif ptype == "openai_compatible":
+                if schema is None:
+                    return await _gemini.acall(api_key, model_id, prompt,
+                                               prefix=prefix, usage=usage, timeout=timeout)
+                return await _gemini.acall_json(api_key, model_id, prompt, schema,
+                                                prefix=prefix, usage=usage, timeout=timeout)
+            if ptype == "openai_compatible":
                 base_url = cfg.get("base_url", "")
                 if not base_url:
                     raise RuntimeError(f"provider {name!r} has no base_url configured")
-                result = _openai_compat.call_json(api_key, base_url, model_id, prompt, schema)
-            elif ptype == "claude_code":
-                result = _claude_code.call_json(cfg, model_id, prompt, schema)
-            else:
-                raise RuntimeError(f"Unsupported JSON provider type: {ptype!r}")
+                if schema is None:
+                    return await _openai_compat.acall(api_key, base_url, model_id, prompt,
+                                                      prefix=prefix, usage=usage,
+                                                      timeout=timeout)
+                return await _openai_compat.acall_json(api_key, base_url, model_id,
+                                                       prompt, schema,
+                                                       prefix=prefix, usage=usage,
+                                                       timeout=timeout)
+            if ptype == "claude_code":
+                if schema is None:
+                    return await _claude_code.acall(cfg, model_id, prompt, timeout=timeout)
+                return await _claude_code.acall_json(cfg, model_id, prompt, schema,
+                                                     timeout=timeout)
+            raise RuntimeError(f"Unsupported provider type: {ptype!r}")
+
+        if self._fixtures.active:
+            invoke = self._fixtures.awrap(
+                _cache.make_key(name, model_id, prompt, schema, task),
+                _fixture_meta(name, model_id, prompt, schema, task), invoke)
+        def run():
+            return self._adispatch(name, prompt, invoke, model_id=model_id,
+                                   task=task, usage=usage, priority=priority,
+                                   deadline=deadline)
+        # A deadline is the caller's own budget — never hand it to followers.
+        if deadline is None:
+            result, shared = await self._flights.ado(
+                _cache.make_key(name, model_id, prompt, schema, task), run)
+        else:
+            result, shared = await run(), False
+        if shared:
+            self._stats.record_coalesced(name)
+        if cache_key is not None and not shared:
+            self._cache.put(cache_key, result)
+        return result
 
-            self._stats.record(name, success=True)
-            return result
+    def _stream_text(self, prompt: str, attempts: list, task: str,
+                     use_cache: bool, prefix: str = "",
+                     priority: str = PRIORITY_NORMAL,
+                     deadline: Deadline | None = None) -> Iterator[str]:
+        last_err = None
+        for name, cfg, model_id in _with_transient_retry(attempts):
+            if deadline is not None and deadline.expired:
+                break
+            emitted = False
+            try:
+                for delta in self._stream_call(name, cfg, model_id, prompt, None,
+                                               task=task, use_cache=use_cache,
+                                               prefix=prefix, priority=priority,
+                                               deadline=deadline):
+                    emitted = True
+                    yield delta
+                return
+            except Exception as e:
+                if emitted or (len(attempts) == 1 and not _transient(e, deadline)):
+                    raise
+                last_err = e
+        if len(attempts) == 1 and last_err is not None:
+            raise last_err
+        raise _all_failed(None, last_err, deadline)
+
+    def _stream_json_items(self, prompt: str, schema: dict, stream_key: str,
+                           attempts: list, task: str, use_cache: bool,
+                           prefix: str = "",
+                           priority: str = PRIORITY_NORMAL,
+                           deadline: Deadline | None = None,
+                           route: dict | None = None) -> Iterator:
+        last_err = None
+        for name, cfg, model_id in _with_transient_retry(attempts):
+            if deadline is not None and deadline.expired:
+                break
+            # No fallback once an item is out, so the last attempt started
+            # is the one that answered.
+            if route is not None:
+                route.update(provider=name, model=model_id)
+            parser = JSONArrayStreamParser(stream_key)
+            parts: list[str] = []
+            emitted = 0
+            try:
+                for delta in self._stream_call(name, cfg, model_id, prompt, schema,
+                                               task=task, use_cache=use_cache,
+                                               prefix=prefix, priority=priority,
+                                               deadline=deadline):
+                    parts.append(delta)
+                    for item in parser.feed(delta):
+                        emitted += 1
+                        yield item
+                # The incremental parser is lenient; the full object is
+                # authoritative for anything it skipped.
+                full = parse_json_response("".join(parts), provider_hint=name)
+                rest = full.get(stream_key)
+                if isinstance(rest, list):
+                    yield from rest[emitted:]
+                return
+            except Exception as e:
+                if emitted or (len(attempts) == 1 and not _transient(e, deadline)):
+                    raise
+                last_err = e
+        if len(attempts) == 1 and last_err is not None:
+            raise last_err
+        raise _all_failed(None, last_err, deadline)
+
+    def _stream_call(self, name: str, cfg: dict, model_id: str, prompt: str,
+                     schema: dict | None, *, task: str = "",
+                     use_cache: bool = True, prefix: str = "",
+                     priority: str = PRIORITY_NORMAL,
+                     deadline: Deadline | None = None) -> Iterator[str]:
+        """Streaming counterpart of _call / _call_json: yields text deltas
+        (raw JSON text when `schema` is set). Same cache key, limiter, stats
+        and timeout / deadline bookkeeping; a cache hit replays the stored
+        value as one delta.
+        """
+        cache_key = None
+        if use_cache and self._cache.enabled and not self._fixtures.active:
+            cache_key = _cache.make_key(name, model_id, prompt, schema, task)
+            cached = self._cache.get(cache_key)
+            if isinstance(cached, str if schema is None else dict):
+                self._stats.record_cache(name, hit=True)
+                yield cached if schema is None else json.dumps(cached, ensure_ascii=False)
+                return
+            self._stats.record_cache(name, hit=False)
+
+        ptype = cfg.get("type")
+        api_key = None
+        if ptype != "claude_code":
+            api_key = self._snap.key(cfg)
+            if api_key is None:
+                raise RuntimeError(f"API Key not configured: {cfg.get('key_file', '?')}")
 
+        usage: dict = {}
+        base_url = cfg.get("base_url", "")
+        if ptype == "openai_compatible" and not base_url:
+            raise RuntimeError(f"provider {name!r} has no base_url configured")
+        if ptype not in _STREAM_TYPES:
+            raise RuntimeError(f"Unsupported streaming provider type: {ptype!r}")
+        cancel, disarm = _deadline_token(None, deadline)
+
+        def open_stream():
+            # Opened once a limiter slot is held, so the timeout is what's
+            # left of the deadline at that point.
+            timeout = _call_timeout(name, cfg, deadline)
+            if ptype == "gemini":
+                return (_gemini.stream(api_key, model_id, prompt, cancel,
+                                       prefix=prefix, usage=usage, timeout=timeout)
+                        if schema is None else
+                        _gemini.stream_json(api_key, model_id, prompt, schema, cancel,
+                                            prefix=prefix, usage=usage, timeout=timeout))
+            if ptype == "openai_compatible":
+                return (_openai_compat.stream(api_key, base_url, model_id, prompt, cancel,
+                                              prefix=prefix, usage=usage, timeout=timeout)
+                        if schema is None else
+                        _openai_compat.stream_json(api_key, base_url, model_id, prompt,
+                                                   schema, cancel, prefix=prefix,
+                                                   usage=usage, timeout=timeout))
+            return (_claude_code.stream(cfg, model_id, prompt, cancel, timeout=timeout)
+                    if schema is None else
+                    _claude_code.stream_json(cfg, model_id, prompt, schema, cancel,
+                                             timeout=timeout))
+
+        deltas = None
+        fixtures = self._fixtures
+        recording = fixtures.mode == _replay.RECORD
+        if fixtures.active:
+            fixture_key = _cache.make_key(name, model_id, prompt, schema, task)
+            fixture_meta = _fixture_meta(name, model_id, prompt, schema, task)
+            if fixtures.mode == _replay.REPLAY:
+                deltas = fixtures.replay_stream(fixture_key, fixture_meta,
+                                                as_json=schema is not None)
+
+        limiter = self._limiter.get(name)
+        try:
+            limiter.acquire(_tokens.estimate_tokens(prompt), priority,
+                            timeout=deadline.remaining() if deadline is not None else None)
+        except TimeoutError as e:
+            disarm()
+            raise deadline.error(name) from e
+        parts: list[str] = []
+        error = None
+        ok = False
+        started = time.perf_counter()
+        ttfb_ms = None
+        try:
+            if deltas is None:
+                deltas = open_stream()
+            for delta in deltas:
+                if ttfb_ms is None:
+                    ttfb_ms = (time.perf_counter() - started) * 1000
+                parts.append(delta)
+                yield delta
+            full = "".join(parts)
+            value = (full.strip() if schema is None
+                     else parse_json_response(full, provider_hint=name))
+            ok = True
         except Exception as e:
-            self._stats.record(name, success=False, error=str(e))
+            error = _deadline_error(e, name, deadline, None)
+            if error is not e:
+                raise error from e
             raise
+        finally:
+            # Also reached when the consumer stops iterating early
+            # (GeneratorExit): release the slot without an AIMD verdict.
+            disarm()
+            close = getattr(deltas, "close", None)
+            if close is not None:
+                close()
+            limiter.release(
+                success=ok,
+                rate_limited=isinstance(error, AIError) and error.kind == Kind.RATE_LIMIT,
+                retry_after=getattr(error, "retry_after", None),
+                output_tokens=_tokens.estimate_tokens("".join(parts)),
+            )
+            if recording and (ok or error is not None):
+                fixtures.save(fixture_key, fixture_meta,
+                              value=value if ok else None, error=error,
+                              wall_ms=(time.perf_counter() - started) * 1000,
+                              ttfb_ms=ttfb_ms)
+            if ok or (error is not None and (deadline is None or not deadline.expired)):
+                self._health.record(name, success=ok, error=error,
+                                    wall_ms=(time.perf_counter() - started) * 1000)
+            if ok or error is not None:
+                self._stats.record(
+                    name, success=ok, error=None if ok else str(error),
+                    model=model_id, task=task,
+                    wall_ms=(time.perf_counter() - started) * 1000,
+                    ttfb_ms=ttfb_ms,
+                    input_text=prompt, output_text="".join(parts),
+                    cached_tokens=usage.get("cached_tokens", 0),
+                )
+
+        if cache_key is not None:
+            self._cache.put(cache_key, value)
+
+    def _single_flight(self, name: str, model_id: str, prompt: str,
+                       schema: dict | None, task: str,
+                       cancel: CancellationToken | None, run) -> tuple:
+        """run() de-duplicated against identical in-flight requests
+        (core.ai.singleflight). Returns (result, shared). Cancellable calls
+        (hedge legs) run on their own — a follower must not inherit another
+        caller's cancellation."""
+        if cancel is not None:
+            return run(), False
+        result, shared = self._flights.do(
+            _cache.make_key(name, model_id, prompt, schema, task), run)
+        if shared:
+            self._stats.record_coalesced(name)
+        return result, shared
+
+    def _with_fixtures(self, invoke, name: str, model_id: str, prompt: str,
+                       schema: dict | None, task: str):
+        """Route `invoke` through the record / replay layer when active."""
+        if not self._fixtures.active:
+            return invoke
+        return self._fixtures.wrap(
+            _cache.make_key(name, model_id, prompt, schema, task),
+            _fixture_meta(name, model_id, prompt, schema, task), invoke)
+
+    def _dispatch(self, name: str, prompt: str, invoke, *,
+                  model_id: str = "", task: str = "", usage: dict | None = None,
+                  priority: str = PRIORITY_NORMAL, deadline: Deadline | None = None):
+        """Run one adapter call under the provider's rate limiter.
+
+        Records stats for every attempt. A RATE_LIMIT error pauses the
+        provider in the limiter (Retry-After, or exponential backoff) and is
+        retried on the same provider while the suggested wait is short;
+        otherwise it propagates so the caller can fall through to the next
+        candidate. Wall time (== time to first byte for a blocking call) and
+        payload sizes go to Stats per (provider, model, task). Concurrency
+        slots are granted by `priority` class (core.ai.ratelimit); waiting
+        for one spends the `deadline` too.
+        """
+        limiter = self._limiter.get(name)
+        input_tokens = _tokens.estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            self._acquire(limiter, name, input_tokens, priority, deadline)
+            started = time.perf_counter()
+            try:
+                result = invoke()
+            except Exception as e:
+                if self._dispatch_failed(name, e, limiter, attempt,
+                                         model_id=model_id, task=task, prompt=prompt,
+                                         deadline=deadline):
+                    attempt += 1
+                    continue
+                raise
+            self._dispatch_succeeded(name, result, limiter, started,
+                                     model_id=model_id, task=task, prompt=prompt,
+                                     usage=usage)
+            return result
+
+    async def _adispatch(self, name: str, prompt: str, invoke, *,
+                         model_id: str = "", task: str = "",
+                         usage: dict | None = None,
+                         priority: str = PRIORITY_NORMAL,
+                         deadline: Deadline | None = None):
+        """_dispatch() for coroutines: `invoke` is an async callable. Same
+        limiter (acquired without blocking the loop), stats, breaker and
+        RATE_LIMIT retry rules. Task cancellation releases the slot; so does
+        the `deadline` running out, which cancels the adapter call."""
+        limiter = self._limiter.get(name)
+        input_tokens = _tokens.estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            try:
+                await limiter.acquire_async(
+                    input_tokens, priority,
+                    timeout=deadline.remaining() if deadline is not None else None)
+            except TimeoutError as e:
+                raise deadline.error(name) from e
+            started = time.perf_counter()
+            try:
+                if deadline is None:
+                    result = await invoke()
+                else:
+                    result = await asyncio.wait_for(invoke(), deadline.remaining())
+            except asyncio.CancelledError:
+                limiter.release(success=False)
+                raise
+            except Exception as e:
+                mapped = _deadline_error(e, name, deadline, None)
+                if self._dispatch_failed(name, mapped, limiter, attempt,
+                                         model_id=model_id, task=task, prompt=prompt,
+                                         deadline=deadline):
+                    attempt += 1
+                    continue
+                if mapped is e:
+                    raise
+                raise mapped from e
+            self._dispatch_succeeded(name, result, limiter, started,
+                                     model_id=model_id, task=task, prompt=prompt,
+                                     usage=usage)
+            return result
+
+    def _acquire(self, limiter, name: str, tokens: int, priority: str,
+                 deadline: Deadline | None) -> None:
+        """limiter.acquire() bounded by `deadline` (raises its error)."""
+        if deadline is None:
+            limiter.acquire(tokens, priority)
+            return
+        try:
+            limiter.acquire(tokens, priority, timeout=deadline.remaining())
+        except TimeoutError as e:
+            raise deadline.error(name) from e
+
+    def _dispatch_failed(self, name: str, e: Exception, limiter, attempt: int, *,
+                         model_id: str, task: str, prompt: str,
+                         deadline: Deadline | None = None) -> bool:
+        """Bookkeeping for a failed adapter call. Returns True if the caller
+        should retry on the same provider (short RATE_LIMIT pause that fits
+        in the deadline). A call cut off by the caller's deadline counts in
+        Stats but not against the provider's health — the budget was the
+        caller's, not a provider fault."""
+        rate_limited = isinstance(e, AIError) and e.kind == Kind.RATE_LIMIT
+        limiter.release(
+            success=False,
+            rate_limited=rate_limited,
+            retry_after=getattr(e, "retry_after", None),
+        )
+        if isinstance(e, AIError) and e.kind == Kind.CANCELLED:
+            return False   # cancelled on purpose (e.g. hedge loser) — not a failure
+        self._stats.record(name, success=False, error=str(e),
+                           model=model_id, task=task, input_text=prompt)
+        if (rate_limited and attempt < _RATE_LIMIT_RETRIES
+                and (e.retry_after or 0) <= _RETRY_AFTER_CAP_SEC
+                and (deadline is None or (e.retry_after or 0) < deadline.remaining())):
+            return True
+        if deadline is None or not deadline.expired:
+            self._health.record(name, success=False, error=e)
+        return False
+
+    def _dispatch_succeeded(self, name: str, result, limiter, started: float, *,
+                            model_id: str, task: str, prompt: str,
+                            usage: dict | None = None) -> None:
+        wall_ms = (time.perf_counter() - started) * 1000
+        output = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+        limiter.release(success=True, output_tokens=_tokens.estimate_tokens(output))
+        self._stats.record(name, success=True, model=model_id, task=task,
+                           wall_ms=wall_ms, input_text=prompt, output_text=output,
+                           cached_tokens=(usage or {}).get("cached_tokens", 0))
+        self._health.record(name, success=True, wall_ms=wall_ms)
+
+    def _probe(self, name: str) -> None:
+        """Half-open probe for the circuit breaker: one tiny uncached call
+        through the normal dispatch path, which records the outcome."""
+        cfg = self._providers.get(name)
+        if cfg is None:
+            return
+        tiers = cfg.get("tiers", {})
+        model_id = tiers.get(TIER_ECONOMY) or tiers.get(TIER_STANDARD) or next(
+            (m for m in tiers.values() if m), "")
+        if model_id:
+            self._call(name, cfg, model_id, _PROBE_PROMPT, use_cache=False)
 
     # ── Config load / persist ────────────────────────────────────────────────
 
     def _load_config(self) -> None:
-        """Load (or initialize) configuration; reseed stats."""
-        data = _cfg.load_config()
-        self._providers     = data["providers"]
-        self._asr_providers = data["asr_providers"]
-        self._tts_providers = data["tts_providers"]
-        self._tier_routing  = data["tier_routing"]
-        self._task_routing  = data["task_routing"]
-        self._stats.init_providers(list(self._providers.keys()))
-
-    def _persist(self) -> None:
-        _cfg.save_config({
-            "providers":     self._providers,
-            "asr_providers": self._asr_providers,
-            "tts_providers": self._tts_providers,
-            "tier_routing":  self._tier_routing,
-            "task_routing":  self._task_routing,
-        })
+        """Load (or initialize) configuration, publish it as the current
+        snapshot, and reseed stats, limiters and circuit breakers. Providers
+        that were removed from the config lose their stats and limiter."""
+        with self._config_lock:
+            data = _cfg.load_config()
+            self._snap = _cfg.build_snapshot(data)
+            for name in self._limiter.names():
+                if name not in data["providers"]:
+                    self._limiter.drop(name)
+                    self._stats.drop(name)
+            self._stats.init_providers(list(data["providers"].keys()))
+            for name, cfg in data["providers"].items():
+                self._limiter.configure(name, **_cfg.rate_limits(cfg))
+            _sdk_clients.invalidate_all()
+            _claude_code.shutdown_pool()
+            self._health.reset()
+
+    def _persist(self, data: dict) -> None:
+        """Write `data` to providers.json and publish it as the new snapshot.
+        Caller holds _config_lock."""
+        _cfg.save_config(data)
+        self._snap = _cfg.build_snapshot(data)
+
+    def _watch_config(self) -> None:
+        """Background poller: reload when providers.json or a key file was
+        changed behind our back (hand edit, console key save, another
+        process). A file that fails to load is retried only once it changes
+        again; the old snapshot stays live meanwhile."""
+        failed_stamps = None
+        while True:
+            time.sleep(_CONFIG_WATCH_SEC)
+            snap = self._snap
+            stamps = None
+            try:
+                if not _cfg.snapshot_stale(snap):
+                    continue
+                stamps = _cfg.file_stamps([path for path, _ in snap.stamps])
+                if stamps == failed_stamps:
+                    continue
+                with self._config_lock:
+                    if self._snap is snap:
+                        self._load_config()
+                failed_stamps = None
+            except Exception:
+                failed_stamps = stamps
+
+
+def _fixture_meta(name: str, model_id: str, prompt: str,
+                  schema: dict | None, task: str) -> dict:
+    return {"provider": name, "model": model_id, "task": task,
+            "prompt": prompt, "schema": schema}
+
+
+def _prefix_hint(prompt: str, cache_hint: str | None) -> str:
+    """The cache_hint= a caller passed, if it is a proper prefix of
+    `prompt`; else "" (hint ignored)."""
+    if cache_hint and len(cache_hint) < len(prompt) and prompt.startswith(cache_hint):
+        return cache_hint
+    return ""
+
+
+def _call_timeout(name: str, cfg, deadline: Deadline | None) -> float:
+    """Hard timeout for one adapter call: the provider's timeout_sec, capped
+    by what's left of `deadline`. Raises once the deadline has passed."""
+    timeout = _cfg.request_timeout(cfg)
+    if deadline is not None:
+        deadline.throw_if_expired(name)
+        timeout = min(timeout, deadline.remaining())
+    return timeout
+
+
+def _deadline_token(cancel: CancellationToken | None, deadline: Deadline | None):
+    """(token, disarm) for an adapter call under `deadline`: a token that is
+    cancelled when the deadline passes — or when `cancel` (a hedge leg's
+    token) is — so the adapter's registered abort (HTTP stream close /
+    subprocess kill) fires. Without a deadline `cancel` is returned as-is.
+    Call disarm() when the request is over."""
+    if deadline is None:
+        return cancel, lambda: None
+    token = CancellationToken()
+    if cancel is not None:
+        cancel.register_abort(token.cancel)
+    return token, deadline.arm(token)
+
+
+def _deadline_error(e: Exception, name: str, deadline: Deadline | None,
+                    cancel: CancellationToken | None) -> Exception:
+    """The error to report for `e`: a deadline abort surfaces as the
+    adapter's CANCELLED (or a timeout) — report it as the deadline instead,
+    unless the caller's own `cancel` fired."""
+    if deadline is None or not deadline.expired:
+        return e
+    if cancel is not None and cancel.cancelled:
+        return e
+    if isinstance(e, TimeoutError) or (
+            isinstance(e, AIError) and e.kind in (Kind.CANCELLED, Kind.NETWORK)):
+        return deadline.error(name)
+    return e
+
+
+def _under_deadline(invoke, name: str, deadline: Deadline | None,
+                    cancel: CancellationToken | None):
+    """Wrap a sync adapter call so a deadline abort raises the deadline
+    error (see _deadline_error)."""
+    if deadline is None:
+        return invoke
+
+    def run():
+        try:
+            return invoke()
+        except Exception as e:
+            mapped = _deadline_error(e, name, deadline, cancel)
+            if mapped is e:
+                raise
+            raise mapped from e
+    return run
+
+
+def _transient(e: Exception, deadline: Deadline | None) -> bool:
+    """True if `e` is worth another try on the same provider: a connection
+    error, timeout or 5xx, with time left on `deadline`. Rate limits have
+    their own retry in _dispatch; cancellation is final."""
+    if deadline is not None and deadline.expired:
+        return False
+    if isinstance(e, AIError):
+        return e.kind == Kind.NETWORK
+    status = getattr(e, "status_code", None)
+    if not isinstance(status, int):
+        status = getattr(e, "code", None)    # google-genai APIError
+    if isinstance(status, int):
+        return status >= 500
+    # openai.APIConnectionError, httpx.TransportError, requests' and the
+    # builtin ConnectionError / TimeoutError.
+    return any(cls.__name__ in ("APIConnectionError", "TransportError",
+                                "ConnectionError", "TimeoutError")
+               for cls in type(e).__mro__)
+
+
+def _retry_transient(run, deadline: Deadline | None):
+    """run(), tried up to _TRANSIENT_RETRIES more times while it fails
+    transiently (_transient). For calls with nothing to fall back to."""
+    retries = 0
+    while True:
+        try:
+            return run()
+        except Exception as e:
+            if retries >= _TRANSIENT_RETRIES or not _transient(e, deadline):
+                raise
+            retries += 1
+
+
+async def _aretry_transient(run, deadline: Deadline | None):
+    """_retry_transient() for a coroutine function `run`."""
+    retries = 0
+    while True:
+        try:
+            return await run()
+        except Exception as e:
+            if retries >= _TRANSIENT_RETRIES or not _transient(e, deadline):
+                raise
+            retries += 1
+
+
+def _with_transient_retry(attempts: list) -> list:
+    """The attempt list a stream walks: a lone candidate (nothing to fall
+    back to) is repeated _TRANSIENT_RETRIES times, and the stream loops try
+    the repeats only after a transient failure (_transient)."""
+    if len(attempts) == 1:
+        return attempts * (1 + _TRANSIENT_RETRIES)
+    return attempts
+
+
+def _all_failed(tier: str | None, last_err, deadline: Deadline | None) -> RuntimeError:
+    """The RuntimeError a routed call raises when no candidate succeeded."""
+    scope = f" for tier={tier!r}" if tier is not None else ""
+    if deadline is not None and deadline.expired:
+        return RuntimeError(f"Deadline exceeded{scope}. Last error: {last_err}")
+    return RuntimeError(f"All providers{scope} failed. Last error: {last_err}")
+
+
+def _supports_prefix_cache(cfg) -> bool:
+    """True if the provider's adapter can act on cache_hint=."""
+    ptype = cfg.get("type")
+    if ptype == "gemini":
+        return _gemini.supports_prefix_cache()
+    if ptype == "openai_compatible":
+        return _openai_compat.supports_prefix_cache(cfg.get("base_url", ""))
+    return False
+
+
+def _supports_batch(cfg) -> bool:
+    """True if the provider takes offline batch jobs (complete_json_batch)."""
+    return cfg.get("type") == "openai_compatible" and bool(cfg.get("batch"))
+
+
+def _batch_error_entry(e: Exception) -> dict:
+    """JSON form of a failed batch request, for the job table."""
+    if isinstance(e, AIError):
+        return {"kind": e.kind.value, "message": e.message}
+    return {"kind": None, "message": str(e)}
+
+
+def _batch_error(name: str, entry: dict) -> Exception:
+    """Exception for a failed batch request (inverse of _batch_error_entry)."""
+    if entry.get("kind"):
+        return AIError(Kind(entry["kind"]), name, entry.get("message", ""))
+    return RuntimeError(f"{name}: {entry.get('message', '')}")
 
 
 # Module-level singleton. Exposed via `core.ai.router` and the legacy
@@ -0,0 +1,87 @@
+"""Single-flight de-duplication of identical in-flight requests.
+
+Two Hub tabs (or a retry loop) sending the same request while the first
+one is still pending would otherwise pay for two provider calls. The router
+runs each non-cancellable adapter call through `SingleFlight.do(key, fn)`:
+the first caller for a key executes `fn`; callers arriving before it
+finishes block and receive the same result — or the same exception.
+
+`ado()` is the asyncio counterpart. The shared call runs as its own task,
+so one waiter being cancelled doesn't cancel the others; the task itself is
+cancelled only when every waiter has gone.
+
+Nothing is remembered after a call completes — that is the response
+cache's job (core.ai.cache).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: dict[str, _Flight] = {}
+        # (id(loop), key) -> [task, waiter count]; only touched from the
+        # owning loop's thread, so it needs no lock.
+        self._tasks: dict[tuple, list] = {}
+
+    def do(self, key: str, fn) -> tuple:
+        """Run `fn()` once per key among concurrent callers. Returns
+        (result, shared) — shared is True for callers that joined another
+        caller's flight."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    async def ado(self, key: str, fn) -> tuple:
+        """Async do(): `fn` is an async callable."""
+        loop = asyncio.get_running_loop()
+        slot = (id(loop), key)
+        entry = self._tasks.get(slot)
+        if entry is None:
+            task = loop.create_task(fn())
+            entry = self._tasks[slot] = [task, 0]
+
+            def forget(_task, entry=entry):
+                if self._tasks.get(slot) is entry:
+                    del self._tasks[slot]
+            task.add_done_callback(forget)
+        entry[1] += 1
+        shared = entry[1] > 1
+        task = entry[0]
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                task.cancel()
+            raise
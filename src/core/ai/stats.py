@@ -2,17 +2,44 @@
 
 Mirrors the old AIRouter._stats dict + _record() method, extracted so the
 router doesn't own lock handling directly.
+
+Besides the flat per-provider counters the AI console has always shown,
+each provider entry carries:
+  - latency_ms / ttfb_ms: p50 / p95 / p99 over a sliding window of the
+    most recent successful calls (wall time, and time to first byte —
+    equal to wall time for non-streaming calls),
+  - input / output characters, estimated tokens (core.ai.tokens) and
+    payload bytes,
+  - cached_input_tokens: input tokens the provider reported as served
+    from its prefix cache (exact provider counts, not estimates),
+  - by_model_task: the same numbers broken down per "<model> | <task>".
+
+`coalesced` counts requests that were answered by joining an identical
+in-flight call (core.ai.singleflight); like cache hits they never reached
+the provider, so they don't bump `calls`. `memory_hits` / `memory_misses`
+count translation-memory lookups (core.ai.memory) per line, filed under the
+provider the task is routed to.
 """
 
 import copy
+import math
 import threading
+from collections import deque
 from datetime import datetime
 
+from core.ai.tokens import estimate_tokens
+
+
+LATENCY_WINDOW = 256        # samples kept per (provider, model, task)
+
 
 class Stats:
     def __init__(self):
         self._lock = threading.Lock()
         self._data: dict = {}
+        # (provider, model, task) -> {"wall": deque, "ttfb": deque}; also
+        # (provider, None, None) for the provider-wide window.
+        self._windows: dict[tuple, dict] = {}
 
     def init_providers(self, names: list[str]) -> None:
         """Seed empty entries for the given provider names (idempotent)."""
@@ -20,25 +47,146 @@ class Stats:
             for name in names:
                 self._data.setdefault(name, self._empty_entry())
 
-    def record(self, provider: str, *, success: bool, error: str | None = None) -> None:
+    def record(self, provider: str, *, success: bool, error: str | None = None,
+               model: str = "", task: str = "",
+               wall_ms: float | None = None, ttfb_ms: float | None = None,
+               input_text: str = "", output_text: str = "",
+               cached_tokens: int = 0) -> None:
+        """Count one provider call.
+
+        Timing / payload arguments are optional so ASR / TTS keep using the
+        plain counter form; LLM dispatch passes all of them.
+        """
+        sample = _payload_counters(input_text, output_text)
+        sample["cached_input_tokens"] = int(cached_tokens or 0)
         with self._lock:
             entry = self._data.setdefault(provider, self._empty_entry())
-            entry["calls"] += 1
+            targets = [entry]
+            if model or task:
+                targets.append(entry["by_model_task"].setdefault(
+                    _detail_key(model, task), self._empty_detail()))
+            for target in targets:
+                target["calls"] += 1
+                if not success:
+                    target["errors"] += 1
+                for field, value in sample.items():
+                    target[field] += value
             entry["last_used"] = datetime.now().isoformat(timespec="seconds")
             if not success:
-                entry["errors"] += 1
                 entry["last_error"] = error
+            if success and wall_ms is not None:
+                keys = [(provider, None, None)]
+                if model or task:
+                    keys.append((provider, model, task))
+                for key in keys:
+                    window = self._windows.setdefault(key, {
+                        "wall": deque(maxlen=LATENCY_WINDOW),
+                        "ttfb": deque(maxlen=LATENCY_WINDOW),
+                    })
+                    window["wall"].append(wall_ms)
+                    window["ttfb"].append(ttfb_ms if ttfb_ms is not None else wall_ms)
+
+    def record_cache(self, provider: str, *, hit: bool) -> None:
+        """Count a response-cache lookup. Hits never reach the provider, so
+        they don't bump `calls`."""
+        with self._lock:
+            entry = self._data.setdefault(provider, self._empty_entry())
+            entry["cache_hits" if hit else "cache_misses"] += 1
+            if hit:
+                entry["last_used"] = datetime.now().isoformat(timespec="seconds")
+
+    def record_coalesced(self, provider: str) -> None:
+        """Count a request served by another caller's in-flight call."""
+        with self._lock:
+            entry = self._data.setdefault(provider, self._empty_entry())
+            entry["coalesced"] += 1
+            entry["last_used"] = datetime.now().isoformat(timespec="seconds")
+
+    def record_memory(self, provider: str, *, hits: int, misses: int) -> None:
+        """Count translation-memory lookups (per source line)."""
+        with self._lock:
+            entry = self._data.setdefault(provider, self._empty_entry())
+            entry["memory_hits"] += hits
+            entry["memory_misses"] += misses
+            if hits:
+                entry["last_used"] = datetime.now().isoformat(timespec="seconds")
+
+    def latency(self, provider: str, model: str | None = None,
+                task: str | None = None, *, kind: str = "wall") -> dict:
+        """Percentiles {"p50", "p95", "p99", "count"} in ms for a provider,
+        optionally narrowed to (model, task). kind: "wall" | "ttfb"."""
+        with self._lock:
+            window = self._windows.get((provider, model, task))
+            samples = list(window[kind]) if window else []
+        return _percentiles(samples)
 
     def snapshot(self) -> dict:
         """Return a deep copy of current stats (safe to iterate outside lock)."""
         with self._lock:
-            return copy.deepcopy(self._data)
+            data = copy.deepcopy(self._data)
+            windows = {k: {kind: list(v) for kind, v in w.items()}
+                       for k, w in self._windows.items()}
+        for name, entry in data.items():
+            w = windows.get((name, None, None), {})
+            entry["latency_ms"] = _percentiles(w.get("wall", []))
+            entry["ttfb_ms"]    = _percentiles(w.get("ttfb", []))
+        for (name, model, task), w in windows.items():
+            if model is None or name not in data:
+                continue
+            detail = data[name]["by_model_task"].get(_detail_key(model, task))
+            if detail is not None:
+                detail["latency_ms"] = _percentiles(w["wall"])
+                detail["ttfb_ms"]    = _percentiles(w["ttfb"])
+        return data
 
     def drop(self, provider: str) -> None:
         """Remove stats for a provider that was deleted from config."""
         with self._lock:
             self._data.pop(provider, None)
+            for key in [k for k in self._windows if k[0] == provider]:
+                del self._windows[key]
 
     @staticmethod
     def _empty_entry() -> dict:
-        return {"calls": 0, "errors": 0, "last_error": None, "last_used": None}
+        entry = {"last_error": None, "last_used": None,
+                 "cache_hits": 0, "cache_misses": 0, "coalesced": 0,
+                 "memory_hits": 0, "memory_misses": 0,
+                 "by_model_task": {}}
+        entry.update(Stats._empty_detail())
+        return entry
+
+    @staticmethod
+    def _empty_detail() -> dict:
+        return {"calls": 0, "errors": 0,
+                "input_chars": 0, "output_chars": 0,
+                "input_tokens": 0, "output_tokens": 0,
+                "cached_input_tokens": 0,
+                "bytes_out": 0, "bytes_in": 0}
+
+
+def _detail_key(model: str, task: str) -> str:
+    return f"{model or '—'} | {task or '—'}"
+
+
+def _payload_counters(input_text: str, output_text: str) -> dict:
+    return {
+        "input_chars":   len(input_text),
+        "output_chars":  len(output_text),
+        "input_tokens":  estimate_tokens(input_text),
+        "output_tokens": estimate_tokens(output_text),
+        "bytes_out":     len(input_text.encode("utf-8")),
+        "bytes_in":      len(output_text.encode("utf-8")),
+    }
+
+
+def _percentiles(samples: list) -> dict:
+    """Nearest-rank p50 / p95 / p99 (ints, ms); zeros when empty."""
+    if not samples:
+        return {"p50": 0, "p95": 0, "p99": 0, "count": 0}
+    ordered = sorted(samples)
+    n = len(ordered)
+
+    def rank(p: float) -> int:
+        return int(round(ordered[min(n - 1, max(0, math.ceil(p * n) - 1))]))
+
+    return {"p50": rank(0.50), "p95": rank(0.95), "p99": rank(0.99), "count": n}
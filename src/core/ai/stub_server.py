@@ -0,0 +1,444 @@
+"""Local OpenAI-compatible stub server for offline benchmarking.
+
+Speaks just enough of the chat.completions protocol (plain, JSON mode,
+SSE streaming, GET /models) and of the batch protocol (POST /files,
+/batches, GET /batches/<id>, /files/<id>/content) for the openai_compatible
+adapter, with knobs for the things a benchmark needs to control:
+
+  latency      time to first byte (+ uniform jitter); streamed answers
+               spread a further `stream_ms` over their chunks
+  errors       per-request probabilities of a 429 (with Retry-After), a
+               500, or a hang-then-disconnect "timeout"
+  responses    canned answers: a JSON list of {"contains": str, "content":
+               str | object}; the first entry whose `contains` occurs in
+               the prompt wins
+  batches      a batch job completes `batch_sec` after submission; each of
+               its requests fails (into the error file) with `rate_500`
+
+Without a canned match the stub answers from the request itself: in JSON
+mode it builds an object from the JSON Schema the adapter put in the system
+message, with one array element per 【n】 marker in the prompt (so
+translate batches come back complete — strings echo the marked text); in
+text mode it echoes the last prompt line.
+
+Point a provider at it from keys/providers.json, e.g.
+
+    "Stub": {"type": "openai_compatible", "enabled": true, "priority": 9,
+             "base_url": "http://127.0.0.1:8765/v1", "key_file": "Stub.key",
+             "models": ["stub"], "tiers": {"premium": "stub",
+             "standard": "stub", "economy": "stub"}}
+
+(any non-empty keys/Stub.key; add "batch": true to exercise batch jobs),
+and run it from src/:
+
+    python -m core.ai.stub_server --port 8765 --latency-ms 800 --rate-429 0.05
+
+Benchmarks can also embed it: `StubServer(...).start()` returns the server
+with `.base_url` set; `.requests` counts what it served per outcome.
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+_MARKER_RE = re.compile(r"【(\d+)】([^\n]*)")
+_SCHEMA_RE = re.compile(r"JSON Schema:\n(.*)\nReturn only the JSON object", re.S)
+
+
+class StubServer:
+    """Threaded stub; one instance per port."""
+
+    def __init__(self, *, host: str = "127.0.0.1", port: int = 0,
+                 latency_ms: float = 0, jitter_ms: float = 0,
+                 stream_ms: float = 0, rate_429: float = 0,
+                 rate_500: float = 0, rate_timeout: float = 0,
+                 hang_sec: float = 30, retry_after: float = 1,
+                 batch_sec: float = 2,
+                 responses: list | None = None, seed: int | None = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.stream_ms = stream_ms
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.rate_timeout = rate_timeout
+        self.hang_sec = hang_sec
+        self.retry_after = retry_after
+        self.batch_sec = batch_sec
+        self.responses = list(responses or [])
+        self.requests = {"ok": 0, "429": 0, "500": 0, "timeout": 0, "batch": 0}
+        self._files: dict[str, bytes] = {}
+        self._batches: dict[str, dict] = {}
+        self._ids = itertools.count(1)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _handler_for(self))
+        self._httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubServer":
+        threading.Thread(target=self._httpd.serve_forever, daemon=True,
+                         name="ai-stub-server").start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    # ── Request behaviour ────────────────────────────────────────────────────
+
+    def _outcome(self) -> str:
+        with self._lock:
+            roll = self._rng.random()
+            jitter = self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+        outcome = "ok"
+        for name, rate in (("429", self.rate_429), ("500", self.rate_500),
+                           ("timeout", self.rate_timeout)):
+            if roll < rate:
+                outcome = name
+                break
+            roll -= rate
+        self._count(outcome)
+        time.sleep((self.latency_ms + jitter) / 1000.0)
+        return outcome
+
+    def _count(self, outcome: str) -> None:
+        with self._lock:
+            self.requests[outcome] += 1
+
+    # ── Batch jobs ───────────────────────────────────────────────────────────
+
+    def _add_file(self, data: bytes) -> str:
+        with self._lock:
+            file_id = f"file-{next(self._ids)}"
+            self._files[file_id] = data
+        return file_id
+
+    def _create_batch(self, body: dict) -> dict | None:
+        if body.get("input_file_id") not in self._files:
+            return None
+        with self._lock:
+            batch_id = f"batch-{next(self._ids)}"
+            self.requests["batch"] += 1
+            lines = self._files[body["input_file_id"]].decode("utf-8").splitlines()
+            total = len([line for line in lines if line.strip()])
+            batch = self._batches[batch_id] = {
+                "id": batch_id, "object": "batch",
+                "endpoint": body.get("endpoint", "/v1/chat/completions"),
+                "input_file_id": body["input_file_id"],
+                "completion_window": body.get("completion_window", "24h"),
+                "status": "in_progress", "created_at": int(time.time()),
+                "output_file_id": None, "error_file_id": None,
+                "request_counts": {"total": total, "completed": 0, "failed": 0},
+            }
+        return batch
+
+    def _batch(self, batch_id: str) -> dict | None:
+        """The batch, finished on first look after `batch_sec`."""
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if batch is None:
+                return None
+            if (batch["status"] == "in_progress"
+                    and time.time() - batch["created_at"] >= self.batch_sec):
+                self._finish_batch(batch)
+            return dict(batch)
+
+    def _finish_batch(self, batch: dict) -> None:
+        # caller holds self._lock
+        output, errors = [], []
+        for line in self._files[batch["input_file_id"]].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            body = request.get("body") or {}
+            if self._rng.random() < self.rate_500:
+                errors.append({"id": f"req-{next(self._ids)}",
+                               "custom_id": request.get("custom_id"),
+                               "response": {"status_code": 500, "body": {
+                                   "error": {"message": "stub: internal error"}}},
+                               "error": None})
+                continue
+            content = self._answer(body)
+            output.append({"id": f"req-{next(self._ids)}",
+                           "custom_id": request.get("custom_id"),
+                           "response": {"status_code": 200, "body": {
+                               "id": "stub", "object": "chat.completion",
+                               "model": body.get("model") or "stub",
+                               "choices": [{"index": 0, "finish_reason": "stop",
+                                            "message": {"role": "assistant",
+                                                        "content": content}}]}},
+                           "error": None})
+        for lines, field in ((output, "output_file_id"), (errors, "error_file_id")):
+            if lines:
+                data = "".join(json.dumps(x, ensure_ascii=False) + "\n" for x in lines)
+                file_id = f"file-{next(self._ids)}"
+                self._files[file_id] = data.encode("utf-8")
+                batch[field] = file_id
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+        batch["request_counts"].update(completed=len(output), failed=len(errors))
+
+    def _cancel_batch(self, batch_id: str) -> dict | None:
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if batch is not None and batch["status"] == "in_progress":
+                batch["status"] = "cancelled"
+            return dict(batch) if batch is not None else None
+
+    def _answer(self, body: dict) -> str:
+        messages = body.get("messages") or []
+        prompt = "\n".join(m.get("content") or "" for m in messages
+                           if m.get("role") != "system" or not _SCHEMA_RE.search(m.get("content") or ""))
+        for entry in self.responses:
+            if entry.get("contains", "") in prompt:
+                content = entry.get("content", "")
+                return content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            schema = {}
+            for m in messages:
+                found = _SCHEMA_RE.search(m.get("content") or "")
+                if found:
+                    try:
+                        schema = json.loads(found.group(1))
+                    except ValueError:
+                        pass
+            markers = _MARKER_RE.findall(prompt)
+            return json.dumps(_from_schema(schema, markers, 0, ""), ensure_ascii=False)
+        lines = [line for line in prompt.splitlines() if line.strip()]
+        return lines[-1] if lines else "ok"
+
+
+def _from_schema(schema: dict, markers: list, index: int, text: str):
+    """Minimal instance of `schema`. Arrays get one element per marker;
+    integers take the marker number and strings its text."""
+    kind = schema.get("type")
+    if kind == "object":
+        return {key: _from_schema(sub, markers, index, text)
+                for key, sub in (schema.get("properties") or {}).items()}
+    if kind == "array":
+        items = schema.get("items") or {}
+        pairs = markers or [("1", text or "ok")]
+        return [_from_schema(items, [], int(n), t) for n, t in pairs]
+    if kind == "integer":
+        return index
+    if kind == "number":
+        return float(index)
+    if kind == "boolean":
+        return True
+    return text or "ok"
+
+
+def _handler_for(stub: StubServer):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            path = self.path.split("?")[0].rstrip("/")
+            parts = path.split("/")
+            if path.endswith("/models"):
+                self._json(200, {"object": "list",
+                                 "data": [{"id": "stub", "object": "model"}]})
+            elif path.endswith("/content") and len(parts) >= 3 and parts[-3] == "files":
+                data = stub._files.get(parts[-2])
+                if data is None:
+                    self._json(404, {"error": {"message": "no such file"}})
+                else:
+                    self._raw(200, data, "application/jsonl")
+            elif len(parts) >= 2 and parts[-2] == "batches":
+                batch = stub._batch(parts[-1])
+                if batch is None:
+                    self._json(404, {"error": {"message": "no such batch"}})
+                else:
+                    self._json(200, batch)
+            else:
+                self._json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length)
+            path = self.path.split("?")[0].rstrip("/")
+            if path.endswith("/files"):
+                self._upload(raw)
+                return
+            try:
+                body = json.loads(raw or b"{}")
+            except ValueError:
+                self._json(400, {"error": {"message": "invalid JSON body"}})
+                return
+            if path.endswith("/batches"):
+                batch = stub._create_batch(body)
+                if batch is None:
+                    self._json(400, {"error": {"message": "unknown input_file_id"}})
+                else:
+                    self._json(200, batch)
+                return
+            if path.endswith("/cancel"):
+                batch = stub._cancel_batch(path.split("/")[-2])
+                if batch is None:
+                    self._json(404, {"error": {"message": "no such batch"}})
+                else:
+                    self._json(200, batch)
+                return
+            if not path.endswith("/chat/completions"):
+                self._json(404, {"error": {"message": "not found"}})
+                return
+            outcome = stub._outcome()
+            if outcome == "429":
+                self._json(429, {"error": {"message": "stub: rate limited",
+                                           "type": "rate_limit_error",
+                                           "code": "rate_limit_exceeded"}},
+                           {"Retry-After": str(stub.retry_after)})
+                return
+            if outcome == "500":
+                self._json(500, {"error": {"message": "stub: internal error",
+                                           "type": "server_error"}})
+                return
+            if outcome == "timeout":
+                time.sleep(stub.hang_sec)
+                self.close_connection = True
+                return
+            content = stub._answer(body)
+            model = body.get("model") or "stub"
+            usage = {"prompt_tokens": length // 4, "completion_tokens": len(content) // 4,
+                     "total_tokens": (length + len(content)) // 4}
+            if body.get("stream"):
+                self._stream(model, content, usage,
+                             bool((body.get("stream_options") or {}).get("include_usage")))
+                return
+            self._json(200, {
+                "id": "stub", "object": "chat.completion", "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            })
+
+        def _upload(self, raw: bytes):
+            """POST /files (multipart/form-data with a `file` part)."""
+            message = BytesParser(policy=HTTP).parsebytes(
+                b"Content-Type: " + (self.headers.get("Content-Type") or "").encode()
+                + b"\r\n\r\n" + raw)
+            data = None
+            for part in message.iter_parts() if message.is_multipart() else ():
+                if part.get_param("name", header="content-disposition") == "file":
+                    data = part.get_payload(decode=True)
+            if data is None:
+                self._json(400, {"error": {"message": "missing file part"}})
+                return
+            file_id = stub._add_file(data)
+            self._json(200, {"id": file_id, "object": "file", "bytes": len(data),
+                             "created_at": int(time.time()), "filename": "batch.jsonl",
+                             "purpose": "batch", "status": "processed"})
+
+        def _raw(self, status: int, data: bytes, content_type: str):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _json(self, status: int, payload: dict, headers: dict | None = None):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            try:
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True   # client gave up (deadline / cancel)
+
+        def _stream(self, model: str, content: str, usage: dict, include_usage: bool):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            pieces = [content[i:i + 16] for i in range(0, len(content), 16)] or [""]
+            pause = stub.stream_ms / 1000.0 / len(pieces)
+            try:
+                for piece in pieces:
+                    self._event({"id": "stub", "object": "chat.completion.chunk",
+                                 "created": int(time.time()), "model": model,
+                                 "choices": [{"index": 0, "finish_reason": None,
+                                              "delta": {"content": piece}}]})
+                    if pause:
+                        time.sleep(pause)
+                if include_usage:
+                    self._event({"id": "stub", "object": "chat.completion.chunk",
+                                 "created": int(time.time()), "model": model,
+                                 "choices": [], "usage": usage})
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            self.close_connection = True
+
+        def _event(self, payload: dict):
+            self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+    return Handler
+
+
+def main(argv: list | None = None) -> None:
+    parser = argparse.ArgumentParser(description="VideoCraft OpenAI-compatible stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--stream-ms", type=float, default=0,
+                        help="extra time spread over a streamed answer's chunks")
+    parser.add_argument("--rate-429", type=float, default=0)
+    parser.add_argument("--rate-500", type=float, default=0)
+    parser.add_argument("--rate-timeout", type=float, default=0)
+    parser.add_argument("--hang-sec", type=float, default=30,
+                        help="how long a 'timeout' request hangs before disconnecting")
+    parser.add_argument("--retry-after", type=float, default=1)
+    parser.add_argument("--batch-sec", type=float, default=2,
+                        help="how long a batch job takes to complete")
+    parser.add_argument("--responses", help="JSON file of canned responses")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    responses = []
+    if args.responses:
+        with open(args.responses, "r", encoding="utf-8") as f:
+            responses = json.load(f)
+    stub = StubServer(host=args.host, port=args.port, latency_ms=args.latency_ms,
+                      jitter_ms=args.jitter_ms, stream_ms=args.stream_ms,
+                      rate_429=args.rate_429, rate_500=args.rate_500,
+                      rate_timeout=args.rate_timeout, hang_sec=args.hang_sec,
+                      retry_after=args.retry_after, batch_sec=args.batch_sec,
+                      responses=responses,
+                      seed=args.seed)
+    print(f"stub server on {stub.base_url}")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
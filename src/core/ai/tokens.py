@@ -0,0 +1,34 @@
+"""Local token estimator.
+
+Rate limiting (tokens-per-minute buckets) and context-window checks need a
+token count *before* the request goes out, and must not depend on a network
+tokenizer or a provider SDK being installed. This is a deliberately cheap
+heuristic tuned for the text VideoCraft sends (subtitles in CJK + Latin
+scripts):
+
+  - CJK ideographs / kana / hangul: ~1 token per character
+  - everything else:                ~1 token per 4 characters
+
+Errs slightly on the high side so budgets derived from it stay safe.
+"""
+
+import re
+
+
+# CJK Unified Ideographs (+ Ext A), CJK punctuation, Hiragana/Katakana,
+# Hangul syllables, full-width forms.
+_WIDE_RE = re.compile(
+    r"[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff"
+    r"\uac00-\ud7af\uff00-\uffef]"
+)
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count for `text` (0 for empty input)."""
+    if not text:
+        return 0
+    wide = len(_WIDE_RE.findall(text))
+    narrow = len(text) - wide
+    return wide + (narrow + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
@@ -51,19 +51,23 @@ DEFAULTS: dict[str, str] = {
         "You are a professional SRT subtitle translator. Translate the "
         "following subtitles from {source_lang_name} to {target_lang_name}.\n"
         "\n"
-        "The input is a batch of {batch_size} subtitles, each prefixed "
-        "with a 【number】 marker to identify its position. Use the marker's "
-        "number as the `index` in your response.\n"
+        "Each input subtitle is prefixed with a 【number】 marker to "
+        "identify its position. Use the marker's number as the `index` in "
+        "your response.\n"
         "\n"
         "Rules:\n"
         "1. Translate each subtitle independently. Do NOT merge, split, "
-        "add, or remove subtitles — return exactly {batch_size} items.\n"
+        "add, or remove subtitles — return exactly one item per input "
+        "subtitle.\n"
         "2. Preserve line breaks and punctuation within each subtitle.\n"
         "3. Do not wrap translations in quotation marks unless quotes are "
         "part of the original meaning.\n"
         "4. Ensure natural, fluent {target_lang_name}.\n"
         "\n"
-        "Input subtitles (batch size = {batch_size}):\n"
+        # Per-batch placeholders stay at the end so everything above is a
+        # provider-cacheable prefix (see template_prefix).
+        "Input subtitles (batch size = {batch_size}; return exactly "
+        "{batch_size} items):\n"
         "{numbered_input}\n"
     ),
 
@@ -96,6 +100,32 @@ DEFAULTS: dict[str, str] = {
         "格式为：时:分:秒 标题"
     ),
 
+    "subtitle.segments.merge": (
+        "# 合并分段\n"
+        "\n"
+        "【\n"
+        "\n"
+        "以下是同一个视频按时间顺序切成若干块后，分别生成的YouTube分段候选"
+        "（每块一组，时间戳都是整个视频中的时间）。\n"
+        "\n"
+        "请合并为一份完整的YouTube分段描述（中文）：\n"
+        "\n"
+        "1、按时间先后排列，保留原有时间戳，不要改动\n"
+        "\n"
+        "2、相邻块交界处重复或过于细碎的分段请合并为一个\n"
+        "\n"
+        "3、时:分:秒，这是时间戳的基本格式，不要弄错了\n"
+        "\n"
+        "】\n"
+        "\n"
+        "以下是各块的分段候选：\n"
+        "\n"
+        "{segment_candidates}\n"
+        "\n"
+        "请输出合并后的分段描述，格式为每行一个分段，"
+        "格式为：时:分:秒 标题"
+    ),
+
     "subtitle.refine": (
         "## 精炼全部分段\n"
         "\n"
@@ -132,6 +162,7 @@ PLACEHOLDERS: dict[str, list[str]] = {
     "translate": ["{source_lang_name}", "{target_lang_name}",
                   "{batch_size}", "{numbered_input}"],
     "subtitle.segments": ["{subtitle_content}"],
+    "subtitle.segments.merge": ["{segment_candidates}"],
     "subtitle.refine":   ["{all_segments_content}"],
     "subtitle.titles":   [],
 }
@@ -191,6 +222,33 @@ def placeholders(task_id: str) -> list[str]:
     return list(PLACEHOLDERS.get(task_id, []))
 
 
+def stable_prefix(prompt: str, variable: str) -> str:
+    """The part of a filled-in `prompt` before the first occurrence of its
+    per-call `variable` content — what repeats verbatim across calls and
+    can be passed as `cache_hint=` to core.ai. Empty if `variable` is
+    empty or not found."""
+    if not variable:
+        return ""
+    at = prompt.find(variable)
+    return prompt[:at] if at > 0 else ""
+
+
+def template_prefix(template: str, per_call: list, **fixed: str) -> str:
+    """Cache hint for a prompt built from `template`: the template up to
+    the first of its `per_call` placeholders (e.g. "{numbered_input}"),
+    with the `fixed` placeholders (name -> value, constant for the run)
+    filled in. Unlike stable_prefix() this stops before every per-call
+    value, not just the first one found in the filled-in prompt. Empty
+    if no per-call placeholder occurs."""
+    cuts = [at for at in (template.find(p) for p in per_call) if at >= 0]
+    if not cuts:
+        return ""
+    prefix = template[:min(cuts)]
+    for name, value in fixed.items():
+        prefix = prefix.replace("{" + name + "}", value)
+    return prefix
+
+
 def ensure_files_exist() -> None:
     """First-run helper: write any missing prompts/<task>.md from defaults
     so the prompts/ folder is fully seeded for the user to browse / edit."""
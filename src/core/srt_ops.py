@@ -9,12 +9,23 @@ replace these with file-backed templates without changing the public API.
 
 import os
 import re
-import srt
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
 from core import ai
 from core import prompts as _prompts
 from core.ai.tiers import TIER_PREMIUM
-from core.subtitle_ops import read_srt
+from core.ai.tokens import estimate_tokens
+from core.subtitle_ops import load_srt, read_srt
+
+
+# generate_youtube_segments map-reduce: a prompt above this many (estimated)
+# tokens is split into time windows even when the model's context would
+# take it — one huge call is what makes 3-hour streams take minutes.
+SEGMENTS_CHUNK_MAX_TOKENS = 24_000
+# Share of the model's context window a single prompt may use; the rest is
+# left for the answer and for the estimator's error.
+SEGMENTS_CONTEXT_SHARE = 0.5
 
 
 # ── Subtitle → plain text helpers ────────────────────────────────────────────
@@ -64,14 +75,13 @@ def extract_text(srt_path: str, output_path: str = None,
 def extract_all_subtitles(srt_path: str) -> str:
     """Collapse each subtitle entry into a single line of plain text.
 
-    Differs from extract_text(): this one uses srt.parse() so multi-line
-    subtitle content is joined with a space; outputs one-subtitle-per-line.
-    Used by SrtExtractSubtitlesApp.
+    Differs from extract_text(): this one parses the cues (load_srt) so
+    multi-line subtitle content is joined with a space; outputs
+    one-subtitle-per-line. Used by SrtExtractSubtitlesApp.
     """
-    subs = list(srt.parse(read_srt(srt_path)))
     lines = []
-    for sub in subs:
-        content = sub.content.replace('\n', ' ').strip()
+    for text in load_srt(srt_path).texts:
+        content = text.replace('\n', ' ').strip()
         if content:
             lines.append(content)
     return "\n".join(lines)
@@ -108,9 +118,16 @@ def get_stats(srt_path: str) -> dict:
 
 # ── AI-powered SRT post-processing ───────────────────────────────────────────
 
-def generate_youtube_segments(srt_path, prompt=None, tier=None):
+def generate_youtube_segments(srt_path, prompt=None, tier=None, *,
+                              max_prompt_tokens=None, log_cb=None):
     """Generate YouTube timestamp-segment description from an SRT.
 
+    Short SRTs go out as one prompt. When the filled-in prompt would exceed
+    the token budget, the subtitles are split into consecutive time windows
+    that each fit (map: the same segments prompt per window, in parallel up
+    to the provider's safe_concurrency), and the per-window candidates are
+    merged by one `subtitle.segments.merge` call (reduce).
+
     Args:
         srt_path: Path to source .srt.
         prompt:   Optional custom prompt template. Must contain
@@ -119,6 +136,10 @@ def generate_youtube_segments(srt_path, prompt=None, tier=None):
                   compatibility; Phase 2 with Prompt hub (L16) will ignore
                   it and load by task key.
         tier:     AI tier string. Defaults to TIER_PREMIUM.
+        max_prompt_tokens: Per-call token budget. Defaults to
+                  SEGMENTS_CONTEXT_SHARE of describe()["max_input_tokens"],
+                  capped at SEGMENTS_CHUNK_MAX_TOKENS.
+        log_cb:   Optional verbose line logger.
 
     Returns:
         AI-generated segment description text.
@@ -131,32 +152,97 @@ def generate_youtube_segments(srt_path, prompt=None, tier=None):
     if not os.path.exists(srt_path):
         raise FileNotFoundError(f"SRT文件 '{srt_path}' 不存在")
 
-    subs = list(srt.parse(read_srt(srt_path)))
-    if not subs:
+    store = load_srt(srt_path)
+    if not len(store):
         raise ValueError("SRT文件为空或格式错误")
 
-    subtitle_content = ''
-    for sub in subs:
-        time_str = str(sub.start)[:8]
-        content = sub.content.replace('\n', ' ')
-        subtitle_content += f'[{time_str}] {content}\n'
+    lines = []
+    for start_ms, _end_ms, text in store:
+        time_str = str(timedelta(milliseconds=start_ms))[:8]
+        content = text.replace('\n', ' ')
+        lines.append(f'[{time_str}] {content}\n')
+    subtitle_content = ''.join(lines)
 
     template = prompt if prompt is not None else _prompts.get("subtitle.segments")
+    _tier = tier or TIER_PREMIUM
+    info = ai.describe("subtitle.segments", _tier)
+    budget = max_prompt_tokens or _segments_token_budget(info)
+
     final_prompt = template.replace("{subtitle_content}", subtitle_content)
+    if estimate_tokens(final_prompt) <= budget:
+        try:
+            return _segments_call(final_prompt, subtitle_content, _tier)
+        except Exception as e:
+            raise RuntimeError(f"调用AI生成失败 (tier={_tier}): {e}")
+
+    overhead = estimate_tokens(template.replace("{subtitle_content}", ""))
+    chunks = _chunk_lines(lines, max(1, budget - overhead))
+    if log_cb:
+        log_cb(f"字幕过长，按时间切成 {len(chunks)} 块分别生成分段后合并")
+    workers = max(1, min(len(chunks), int(info.get("safe_concurrency") or 1)))
+
+    def map_chunk(chunk: str) -> str:
+        return _segments_call(template.replace("{subtitle_content}", chunk),
+                              chunk, _tier)
 
-    _tier = tier or TIER_PREMIUM
     try:
-        return ai.complete(final_prompt, task="subtitle.segments", tier=_tier)
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix="segments") as pool:
+            candidates = list(pool.map(map_chunk, chunks))
     except Exception as e:
         raise RuntimeError(f"调用AI生成失败 (tier={_tier}): {e}")
 
+    blocks = '\n\n'.join(f"[第{i}块]\n{c.strip()}"
+                          for i, c in enumerate(candidates, start=1))
+    merge_prompt = _prompts.get("subtitle.segments.merge").replace(
+        "{segment_candidates}", blocks)
+    if estimate_tokens(merge_prompt) > budget:
+        # Candidates alone overflow the budget (extremely long input):
+        # hand back the per-window results in order rather than failing.
+        if log_cb:
+            log_cb("分段候选过长，跳过合并，直接按时间顺序拼接")
+        return '\n'.join(c.strip() for c in candidates)
+    try:
+        return _segments_call(merge_prompt, blocks, _tier)
+    except Exception as e:
+        raise RuntimeError(f"调用AI合并分段失败 (tier={_tier}): {e}")
+
+
+def _segments_token_budget(info: dict) -> int:
+    """Per-call prompt budget from the routed model's context window."""
+    context = int(info.get("max_input_tokens") or 0)
+    if context <= 0:
+        return SEGMENTS_CHUNK_MAX_TOKENS
+    return max(1, min(SEGMENTS_CHUNK_MAX_TOKENS, int(context * SEGMENTS_CONTEXT_SHARE)))
+
+
+def _chunk_lines(lines: list, budget: int) -> list:
+    """Group consecutive subtitle lines into chunks of at most `budget`
+    estimated tokens (a single oversized line still gets its own chunk)."""
+    chunks, current, used = [], [], 0
+    for line in lines:
+        cost = estimate_tokens(line)
+        if current and used + cost > budget:
+            chunks.append(''.join(current))
+            current, used = [], 0
+        current.append(line)
+        used += cost
+    if current:
+        chunks.append(''.join(current))
+    return chunks
+
+
+def _segments_call(full_prompt: str, content: str, tier: str) -> str:
+    return ai.complete(full_prompt, task="subtitle.segments", tier=tier,
+                       cache_hint=_prompts.stable_prefix(full_prompt, content))
+
 
 def extract_paragraphs_from_segments(srt_path, segments_path):
     """Split SRT content into segments per the timestamps in segments_path.
 
     No AI involved — pure slice-by-time on the SRT entries.
     """
-    subs = list(srt.parse(read_srt(srt_path)))
+    store = load_srt(srt_path)
 
     segments_lines = read_srt(segments_path).splitlines(keepends=True)
 
@@ -184,9 +270,9 @@ def extract_paragraphs_from_segments(srt_path, segments_path):
         raise ValueError("时间戳分割文件中没有找到有效的时间戳")
 
     current_segment_idx = 0
-    for sub in subs:
-        sub_start = sub.start.total_seconds()
-        content = sub.content.replace('\n', ' ')
+    for start_ms, _end_ms, text in store:
+        sub_start = start_ms / 1000
+        content = text.replace('\n', ' ')
         while current_segment_idx < len(segments) - 1:
             if sub_start < segments[current_segment_idx + 1]['timestamp']:
                 break
@@ -230,7 +316,8 @@ def generate_video_titles(subs_path, prompt=None, tier=None):
 
     _tier = tier or TIER_PREMIUM
     try:
-        return ai.complete(full_prompt, task="subtitle.titles", tier=_tier)
+        return ai.complete(full_prompt, task="subtitle.titles", tier=_tier,
+                           cache_hint=_prompts.stable_prefix(full_prompt, subs_content))
     except Exception as e:
         raise RuntimeError(f"调用AI生成失败 (tier={_tier}): {e}")
 
@@ -315,7 +402,10 @@ def refine_segment_descriptions(paragraphs_path, prompt=None, tier=None):
         full_prompt = f"{full_prompt}\n\n以下是全部分段内容：\n{all_segments_content}"
 
     _tier = tier or TIER_PREMIUM
-    refined_text = ai.complete(full_prompt, task="subtitle.refine", tier=_tier)
+    refined_text = ai.complete(
+        full_prompt, task="subtitle.refine", tier=_tier,
+        cache_hint=_prompts.stable_prefix(full_prompt, all_segments_content),
+    )
     if not refined_text:
         raise RuntimeError("AI返回为空，未生成精炼结果")
     return refined_text
@@ -4,9 +4,12 @@ core/subtitle_ops.py - 字幕分割与样式工具函数
 无任何 UI 依赖，供 SubtitleTool、text2Video 等模块共用。
 """
 
+import codecs
 import os
 import re
 import srt
+import threading
+from collections import OrderedDict
 from datetime import timedelta
 
 # ── 布局默认参数（16:9 / 9:16）──────────────────────────────────────────────
@@ -27,19 +30,125 @@ LAYOUT_DEFAULTS = {
 }
 
 
-# ── 编码自动检测 ──────────────────────────────────────────────────────────────
+# ── 编码自动检测 + 解析缓存 ──────────────────────────────────────────────────
+# 同一个 SRT 常被翻译、分段、段落提取、烧录先后打开。文件只读一次：按 BOM
+# 定编码，没有 BOM 时只用开头 _SNIFF_BYTES 字节试编码，再整体解码一次；解码
+# 文本和解析结果（SubtitleStore）按 (mtime, size) 缓存在进程内，LRU，按总
+# cue 数限额。
 
-_ENCODINGS = ['utf-8-sig', 'utf-8', 'gbk', 'gb2312', 'big5', 'latin-1']
+_ENCODINGS = ['utf-8-sig', 'gbk', 'big5', 'latin-1']   # gb2312 ⊂ gbk，utf-8 由 utf-8-sig 覆盖
+_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+_SNIFF_BYTES = 64 * 1024
+
+SUBTITLE_CACHE_MAX_CUES = 500_000     # 所有缓存文件的 cue 总数上限
+
+
+class _CacheEntry:
+    __slots__ = ("stamp", "text", "store", "cues")
+
+    def __init__(self, stamp: tuple, text: str):
+        self.stamp = stamp
+        self.text = text
+        self.store = None             # SubtitleStore，首次 load_srt 时解析
+        self.cues = max(1, text.count("-->"))
+
+
+_cache: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+_cache_cues = 0
+_cache_lock = threading.Lock()
 
 
 def read_srt(path: str) -> str:
-    """自动检测编码读取 SRT 文件，依次尝试常见编码，失败则 raise。"""
-    for enc in _ENCODINGS:
+    """自动检测编码读取 SRT 文件（换行统一为 \n），无法解码则 raise ValueError。
+
+    结果按 (mtime, size) 缓存，文件改动后自动重新读取。
+    """
+    return _cache_entry(path).text
+
+
+def load_srt(path: str):
+    """读取并解析 SRT，返回 SubtitleStore 副本（可随意修改，不影响缓存）。
+
+    Raises:
+        ValueError: 编码无法识别或内容无法解析（srt.SRTParseError 转为
+                    ValueError，原异常保留在 __cause__）。
+    """
+    from core.subtitle_store import SubtitleStore   # subtitle_store 依赖本模块
+
+    entry = _cache_entry(path)
+    store = entry.store
+    if store is None:
+        try:
+            store = SubtitleStore.parse(entry.text)
+        except srt.SRTParseError as e:
+            raise ValueError(f"无法解析 SRT 文件：{path}") from e
+        with _cache_lock:
+            entry.store = store
+            if _cache.get(os.path.abspath(path)) is entry:
+                _resize(entry, max(1, len(store)))
+    return store.copy()
+
+
+def clear_srt_cache() -> None:
+    global _cache_cues
+    with _cache_lock:
+        _cache.clear()
+        _cache_cues = 0
+
+
+def _cache_entry(path: str) -> _CacheEntry:
+    key = os.path.abspath(path)
+    st = os.stat(key)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and entry.stamp == stamp:
+            _cache.move_to_end(key)
+            return entry
+    with open(key, 'rb') as f:
+        data = f.read()
+    entry = _CacheEntry(stamp, _decode(data, path))
+    with _cache_lock:
+        old = _cache.pop(key, None)
+        if old is not None:
+            _resize(old, 0)
+        _cache[key] = entry
+        _resize(entry, entry.cues, new=True)
+    return entry
+
+
+def _resize(entry: _CacheEntry, cues: int, new: bool = False) -> None:
+    """调整 entry 计入的 cue 数并按 LRU 淘汰超额的旧文件（最新一个总保留）。
+    调用方持有 _cache_lock。"""
+    global _cache_cues
+    _cache_cues += cues - (0 if new else entry.cues)
+    entry.cues = cues
+    while _cache_cues > SUBTITLE_CACHE_MAX_CUES and len(_cache) > 1:
+        _key, evicted = _cache.popitem(last=False)
+        _cache_cues -= evicted.cues
+
+
+def _decode(data: bytes, path: str) -> str:
+    encodings = list(_ENCODINGS)
+    for bom, enc in _BOMS:
+        if data.startswith(bom):
+            encodings.insert(0, enc)
+            break
+    prefix = data[:_SNIFF_BYTES]
+    for enc in encodings:
         try:
-            with open(path, 'r', encoding=enc) as f:
-                return f.read()
-        except (UnicodeDecodeError, UnicodeError):
-            continue
+            # 前缀末尾可能截断多字节字符，final=False 容忍
+            codecs.getincrementaldecoder(enc)().decode(prefix, final=len(data) <= _SNIFF_BYTES)
+            text = data.decode(enc)
+        except UnicodeError:
+            continue          # 前缀之后才出现的坏字节也会落到这里，换下一个编码
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text
     raise ValueError(f"无法识别文件编码：{path}")
 
 
@@ -112,7 +221,7 @@ def process_srt_split(input_path: str, max_chars: int,
     """
     读取 SRT 文件，对每条字幕执行分割，重新编号后返回字幕列表。
     """
-    subs = list(srt.parse(read_srt(input_path)))
+    subs = load_srt(input_path).to_subtitles()
     result = []
     for sub in subs:
         result.extend(split_subtitle(sub, max_chars, is_chinese))
@@ -0,0 +1,241 @@
+"""Compact array-backed subtitle store.
+
+`srt.parse` builds one `srt.Subtitle` per cue with two `timedelta`s and a
+proprietary field — for a multi-hour transcript that is hundreds of
+thousands of objects, and most of the parse time goes into creating them.
+SubtitleStore keeps a file as three parallel columns instead:
+
+    starts  array('q')  start time, integer milliseconds
+    ends    array('q')  end time, integer milliseconds
+    texts   list[str]   cue text ("\\n" between lines)
+
+Parsing tokenizes cue headers (optional index line + timing line) with one
+compiled regex over the whole file; the text between two headers is the
+earlier cue's content. It accepts what srt.parse accepts in practice
+(a leading BOM, missing indices, "." / ":" / full-width millisecond
+delimiters, CRLF, blank lines inside a cue, timing-line position tags,
+which are dropped) and raises srt.SRTParseError where it does.
+compose() writes what srt.compose writes: cues sorted by time, renumbered
+from 1, empty / negative / zero-length cues skipped, blank lines inside a
+cue removed.
+
+Callers migrate gradually: from_subtitles() / to_subtitles() convert to and
+from `srt.Subtitle` lists. core.translate works on the store directly.
+
+Benchmark (from src/):
+
+    python -m core.subtitle_store --cues 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import time
+import tracemalloc
+from array import array
+from datetime import timedelta
+
+import srt
+
+from core.subtitle_ops import read_srt
+
+
+_DELIM = r"[,.:，．。：]"
+_TS = rf"(\d+){_DELIM}(\d+){_DELIM}(\d+)(?:{_DELIM}(\d*))?"
+# Optional index line, then the timing line (anything after the end time,
+# e.g. "X1:... Y1:..." position tags, is ignored).
+_HEADER_RE = re.compile(
+    rf"^[ \t]*(?:-?\d+(?:\.\d*)?[ \t]*\n[ \t]*)?{_TS} *-[ -] *> *{_TS}[^\n]*(?:\n|\Z)",
+    re.M,
+)
+_BLANK_LINES_RE = re.compile(r"\n\n+")
+_ONE_MS = timedelta(milliseconds=1)
+
+
+class SubtitleStore:
+    """Subtitles as parallel start / end / text columns (see module doc).
+    Cue i is (starts[i], ends[i], texts[i]); edit the columns in place."""
+
+    __slots__ = ("starts", "ends", "texts")
+
+    def __init__(self, starts=(), ends=(), texts=()):
+        self.starts = array("q", starts)
+        self.ends = array("q", ends)
+        self.texts = list(texts)
+        if not len(self.starts) == len(self.ends) == len(self.texts):
+            raise ValueError("starts, ends and texts must have the same length")
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __iter__(self):
+        """(start_ms, end_ms, text) per cue."""
+        return zip(self.starts, self.ends, self.texts)
+
+    def append(self, start_ms: int, end_ms: int, text: str) -> None:
+        self.starts.append(start_ms)
+        self.ends.append(end_ms)
+        self.texts.append(text)
+
+    def copy(self) -> "SubtitleStore":
+        store = SubtitleStore.__new__(SubtitleStore)
+        store.starts = array("q", self.starts)
+        store.ends = array("q", self.ends)
+        store.texts = list(self.texts)
+        return store
+
+    # ── SRT text ─────────────────────────────────────────────────────────────
+
+    @classmethod
+    def parse(cls, text: str) -> "SubtitleStore":
+        """Parse SRT text.
+
+        Raises:
+            srt.SRTParseError: non-blank text before the first cue, or no
+                               cue at all in non-blank text.
+        """
+        if text[:1] == "\ufeff":
+            text = text[1:]
+        if "\r" in text:
+            text = text.replace("\r\n", "\n")
+        starts, ends, texts = array("q"), array("q"), []
+        append_text = texts.append
+        content_from = None
+        for match in _HEADER_RE.finditer(text):
+            if content_from is None:
+                if text[:match.start()].strip():
+                    raise srt.SRTParseError(0, match.start(), text[:match.start()])
+            else:
+                append_text(text[content_from:match.start()].strip("\n"))
+            h1, m1, s1, ms1, h2, m2, s2, ms2 = match.groups()
+            starts.append(((int(h1) * 60 + int(m1)) * 60 + int(s1)) * 1000 + int(ms1 or 0))
+            ends.append(((int(h2) * 60 + int(m2)) * 60 + int(s2)) * 1000 + int(ms2 or 0))
+            content_from = match.end()
+        if content_from is None:
+            if text.strip():
+                raise srt.SRTParseError(0, len(text), text)
+        else:
+            append_text(text[content_from:].strip("\n"))
+        store = cls.__new__(cls)
+        store.starts, store.ends, store.texts = starts, ends, texts
+        return store
+
+    @classmethod
+    def read(cls, path: str) -> "SubtitleStore":
+        """Parse an SRT file (encoding detected by read_srt)."""
+        return cls.parse(read_srt(path))
+
+    def compose(self) -> str:
+        """SRT text, srt.compose-compatible (see module doc)."""
+        starts, ends, texts = self.starts, self.ends, self.texts
+        order = range(len(texts))
+        if any(starts[i] > starts[i + 1] for i in range(len(texts) - 1)):
+            order = sorted(order, key=lambda i: (starts[i], ends[i]))
+        parts = []
+        index = 0
+        for i in order:
+            start, end, content = starts[i], ends[i], texts[i]
+            if start < 0 or start >= end or not content.strip():
+                continue
+            if content[0] == "\n" or "\n\n" in content:
+                content = _BLANK_LINES_RE.sub("\n", content.strip("\n"))
+            index += 1
+            parts.append(f"{index}\n{_timestamp(start)} --> {_timestamp(end)}\n{content}\n\n")
+        return "".join(parts)
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.compose())
+
+    # ── srt.Subtitle adapters ────────────────────────────────────────────────
+
+    @classmethod
+    def from_subtitles(cls, subs) -> "SubtitleStore":
+        """Build from `srt.Subtitle` objects (indices are not kept)."""
+        store = cls()
+        for sub in subs:
+            store.append(sub.start // _ONE_MS, sub.end // _ONE_MS, sub.content)
+        return store
+
+    def subtitle(self, i: int) -> srt.Subtitle:
+        """Cue i as an `srt.Subtitle`, numbered i + 1."""
+        return srt.Subtitle(index=i + 1,
+                            start=timedelta(milliseconds=self.starts[i]),
+                            end=timedelta(milliseconds=self.ends[i]),
+                            content=self.texts[i])
+
+    def to_subtitles(self) -> list:
+        return [self.subtitle(i) for i in range(len(self))]
+
+
+def _timestamp(ms: int) -> str:
+    seconds, ms = divmod(ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+def _sample_srt(cues: int) -> str:
+    """Synthetic transcript: 2.5 s cues, every third one two lines long."""
+    blocks = []
+    for i in range(cues):
+        start = i * 2500
+        text = f"Line {i} of the transcript, roughly one spoken sentence."
+        if i % 3 == 0:
+            text += "\n第二行字幕，中英混排。"
+        blocks.append(f"{i + 1}\n{_timestamp(start)} --> {_timestamp(start + 2400)}\n{text}\n\n")
+    return "".join(blocks)
+
+
+def _best_of(repeat: int, fn) -> tuple:
+    """(best wall seconds, last result) over `repeat` runs."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def _retained_mb(fn) -> float:
+    """MB still allocated by fn()'s result."""
+    tracemalloc.start()
+    try:
+        result = fn()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return size / 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Parse / compose throughput: SubtitleStore vs srt")
+    parser.add_argument("--cues", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = _sample_srt(args.cues)
+    print(f"{args.cues} cues, {len(text) / 1e6:.1f} MB, best of {args.repeat}")
+    rows = []
+    t, subs = _best_of(args.repeat, lambda: list(srt.parse(text)))
+    rows.append(("srt.parse", t))
+    t, composed = _best_of(args.repeat, lambda: srt.compose(subs))
+    rows.append(("srt.compose", t))
+    t, store = _best_of(args.repeat, lambda: SubtitleStore.parse(text))
+    rows.append(("SubtitleStore.parse", t))
+    t, store_composed = _best_of(args.repeat, store.compose)
+    rows.append(("SubtitleStore.compose", t))
+    for name, seconds in rows:
+        print(f"  {name:<24}{seconds * 1000:9.1f} ms{args.cues / seconds:12,.0f} cues/s")
+    print(f"  retained after parse: srt {_retained_mb(lambda: list(srt.parse(text))):.1f} MB, "
+          f"SubtitleStore {_retained_mb(lambda: SubtitleStore.parse(text)):.1f} MB")
+    print(f"  output identical to srt.compose: {store_composed == composed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,17 +11,39 @@ classification via AIError.Kind so feature + UI can give targeted recovery
 hints.
 """
 
+import hashlib
+import json
 import os
-import re
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Callable
 
-import srt
-
 from core import ai
 from core import prompts as _prompts
 from core.ai.tiers import TIER_STANDARD
-from core.subtitle_ops import read_srt
+from core.ai.tokens import estimate_tokens
+from core.subtitle_ops import load_srt, read_srt
+from core.subtitle_store import SubtitleStore
+
+
+# Batch packing: a batch closes at `batch_size` lines or at whichever of
+# these budgets (estimated over the subtitle text) it would cross first.
+# The answer is about as long as the input, so the token cap is what keeps
+# the reply inside typical 8k output limits.
+TRANSLATE_BATCH_MAX_TOKENS = 6_000
+TRANSLATE_BATCH_MAX_CHARS = 20_000
+# Share of the model's context window one batch's subtitle text may use:
+# prompt and answer both have to fit, with room for the estimator's error.
+TRANSLATE_CONTEXT_SHARE = 0.25
+# A batch slower than this shrinks the following ones.
+TRANSLATE_SLOW_BATCH_MS = 90_000
+# 【N】 marker plus the blank line between subtitles.
+_LINE_OVERHEAD_TOKENS = 4
+# Repair pass: lines the model skipped or answered blank are re-sent in
+# batches of at most this many.
+REPAIR_BATCH_SIZE = 10
 
 
 # ── Language catalog ─────────────────────────────────────────────────────────
@@ -212,6 +234,9 @@ def translate_srt_file(
     tier: str = TIER_STANDARD,
     progress_cb: Callable[[int, int, str], None] | None = None,
     log_cb: Callable[[str], None] | None = None,
+    batch_job: bool = False,
+    use_memory: bool = True,
+    repair_rounds: int = 2,
 ) -> str:
     """Batch-translate an SRT file, writing output next to the source.
 
@@ -224,14 +249,67 @@ def translate_srt_file(
                        the Prompt hub. Placeholders the template must
                        contain: {source_lang_name}, {target_lang_name},
                        {batch_size}, {numbered_input}.
-        batch_size:    Subtitles per AI call. Defaults to 100.
+        batch_size:    Upper bound on subtitles per AI call. Defaults to
+                       100; batches are packed by estimated size below it
+                       (see "Batch sizing").
         tier:          "premium" | "standard" | "economy".
         progress_cb:   Optional (done_batches, total_batches, status_msg)
-                       callback fired between batches. Per architecture X5,
-                       the semantics is "partial result ready" — Phase 1
+                       callback fired as batches complete. Per architecture
+                       X5, the semantics is "partial result ready" — Phase 1
                        fires per-batch, future streaming might fire more
                        granularly without callback shape change.
         log_cb:        Optional verbose line logger (printed to Hub log).
+        batch_job:     Submit all batches as one offline provider batch job
+                       (ai.complete_json_batch) instead of streaming them —
+                       for nightly bulk runs: much slower, cheaper. Blocks
+                       until the job finishes; re-running after a restart
+                       resumes the pending job. Falls back to the normal
+                       path when the routed provider has no batch API.
+        use_memory:    Consult / fill the translation memory (see below).
+                       Pass False to force a fresh translation, e.g. after
+                       changing the prompt.
+        repair_rounds: Retry budget of the repair pass (see below); 0
+                       disables it.
+
+    Translation memory: before batching, every line is looked up in the
+    persistent memory (ai.lookup_translations — keyed on normalized source
+    text, languages and the routed model) and only unseen lines go to the
+    AI; each successful batch's lines are stored back. The hit rate is
+    logged, and counted in ai.get_stats() (memory_hits / memory_misses).
+
+    Crash / failure safety: the lines of every batch that completes are
+    appended to a journal next to the output (<target>.srt.journal), keyed
+    by the input SRT's hash, the prompt template and the languages. A rerun
+    with the same key restores them and translates only the missing lines;
+    a key mismatch discards the journal. Lines of failed batches are not
+    journaled (their originals still go to the output), so the rerun
+    retries exactly those; the journal is deleted once every line has been
+    translated.
+
+    Repair pass: a batch that comes back short (the model skipped or
+    blanked some of its lines) or fails leaves those lines untranslated.
+    After the main pass they are collected across all batches and re-sent
+    as small streamed batches (REPAIR_BATCH_SIZE lines) on the same route
+    as the main pass — short batches are what makes the model stop skipping
+    lines. It stops once every line is
+    translated, after `repair_rounds` rounds, or when a round recovers
+    nothing. Lines still missing keep their original text.
+
+    Batch sizing: lines are packed into batches against an estimated-token
+    budget (TRANSLATE_CONTEXT_SHARE of describe()["max_input_tokens"],
+    capped at TRANSLATE_BATCH_MAX_TOKENS) and TRANSLATE_BATCH_MAX_CHARS, so
+    long lines make short batches and short lines fill up to `batch_size`.
+    The budgets are scaled by a factor learned per (provider, model) for
+    the life of the process: batches that often come back with fewer items
+    than sent, take longer than TRANSLATE_SLOW_BATCH_MS, or fail as
+    overflow / malformed shrink it; clean batches grow it back. Lines not
+    yet sent are re-packed as soon as it changes.
+
+    Batches are dispatched on a bounded worker pool sized by the routed
+    provider's `safe_concurrency` (see ai.describe). Each batch streams
+    (ai.complete_json_stream), so translated items land in the result as
+    the model emits them and progress_cb fires per item, not per batch.
+    Both callbacks are still invoked from the calling thread only.
 
     Returns:
         Absolute path to the written output .srt (named
@@ -239,113 +317,255 @@ def translate_srt_file(
 
     Raises:
         FileNotFoundError: source SRT missing or unreadable.
-        RuntimeError:      SRT parse failed / no batches produced / output
-                           could not be written. AI per-batch failures fall
+        ValueError:        SRT undecodable / unparseable (see load_srt).
+        RuntimeError:      no batches produced / output could not be
+                           written. AI per-batch failures fall
                            back to original text so the overall task
                            completes with a partial translation.
     """
-    subs = list(srt.parse(read_srt(srt_path)))
-
-    template = custom_prompt if custom_prompt is not None else _prompts.get("translate")
+    srt_text = read_srt(srt_path)
+    return _translate_store(
+        srt_path, srt_text, load_srt(srt_path),
+        source_lang=source_lang, target_lang=target_lang,
+        custom_prompt=custom_prompt, batch_size=batch_size, tier=tier,
+        progress_cb=progress_cb, log_cb=log_cb, batch_job=batch_job,
+        use_memory=use_memory, repair_rounds=repair_rounds,
+    )
 
-    source_lang_name = SUPPORTED_LANGUAGES.get(source_lang, ('Unknown', '未知'))[0]
-    target_lang_name = SUPPORTED_LANGUAGES.get(target_lang, ('Unknown', '未知'))[0]
 
-    if log_cb:
-        log_cb(f"准备翻译 {len(subs)} 条字幕")
-
-    # Number markers are batch-local (1..cur_batch_size) so the model's
-    # returned `index` maps directly to a slot inside the current batch.
-    # Using a global numbering here would break batches after the first,
-    # because the matcher below treats `index` as batch-local.
-    raw_contents = [sub.content for sub in subs]
-    batches = []
-    for i in range(0, len(raw_contents), batch_size):
-        slice_ = raw_contents[i:i + batch_size]
-        numbered = [f"【{j+1}】{text}" for j, text in enumerate(slice_)]
-        batches.append({'start_idx': i, 'contents': numbered})
-    total = len(batches)
-
-    if log_cb:
-        log_cb(f"分成 {total} 个批次进行翻译")
+def translate_srt_multi(
+    srt_path: str,
+    *,
+    source_lang: str,
+    targets: list,
+    custom_prompt: str | None = None,
+    batch_size: int = 100,
+    tier: str = TIER_STANDARD,
+    progress_cb: Callable[[int, int, str], None] | None = None,
+    log_cb: Callable[[str], None] | None = None,
+    batch_job: bool = False,
+    use_memory: bool = True,
+    repair_rounds: int = 2,
+) -> dict:
+    """Translate one SRT into several target languages in one run.
+
+    The SRT is read and parsed once; every language then runs
+    translate_srt_file()'s pipeline (journal, memory, batching, repair) on
+    its own copy, all languages concurrently. Their calls share the
+    router's per-provider rate limits and concurrency window, so N
+    languages don't mean N× the provider load — the limiter queues them.
 
-    translated_subs: dict[int, str] = {}
+    Args:
+        targets:     ISO codes of the target languages; duplicates are
+                     dropped. Outputs are named after the language (as
+                     translate_srt_file() names them), so codes sharing a
+                     name — jw / jv are both Javanese, unknown codes are
+                     all "Unknown" — can't go in the same run.
+        progress_cb: Optional (done_batches, total_batches, status_msg)
+                     callback, aggregated over all languages.
+        log_cb:      Optional line logger; each language's lines are
+                     prefixed with its name.
+        Others:      As translate_srt_file(), applied to every language.
+
+    Both callbacks are invoked from the calling thread only.
 
-    for batch_idx, batch in enumerate(batches):
-        if progress_cb:
-            progress_cb(
-                batch_idx, total,
-                f"正在翻译 ({source_lang.upper()} → {target_lang.upper()}) "
-                f"- 批次 {batch_idx+1}/{total}",
-            )
+    Returns:
+        {target_lang: absolute path of its output .srt}, in `targets` order.
 
-        batch_start_idx = batch['start_idx']
-        batch_contents  = batch['contents']
-        cur_batch_size  = len(batch_contents)
-        numbered_input  = '\n\n'.join(batch_contents)
+    Raises:
+        FileNotFoundError: source SRT missing or unreadable.
+        ValueError:        `targets` is empty or two of them share an output
+                           name / SRT undecodable or unparseable (see
+                           load_srt).
+        RuntimeError:      one or more languages failed; the others'
+                           outputs have been written.
+    """
+    targets = list(dict.fromkeys(targets))
+    if not targets:
+        raise ValueError("至少需要一个目标语言")
+    names = {lang: SUPPORTED_LANGUAGES.get(lang, ('Unknown', '未知'))[0] for lang in targets}
+    by_name: dict[str, list] = {}
+    for lang, name in names.items():
+        by_name.setdefault(name, []).append(lang)
+    clashes = [f"{name} ({'/'.join(langs)})" for name, langs in by_name.items() if len(langs) > 1]
+    if clashes:
+        raise ValueError(f"目标语言的输出文件名重复，不能在同一次运行中翻译: {', '.join(clashes)}")
+    srt_text = read_srt(srt_path)
+    store = load_srt(srt_path)
+    if log_cb:
+        log_cb(f"同时翻译 {len(targets)} 种语言: {', '.join(names.values())}")
 
-        prompt = (template
-                  .replace("{source_lang_name}", source_lang_name)
-                  .replace("{target_lang_name}", target_lang_name)
-                  .replace("{batch_size}", str(cur_batch_size))
-                  .replace("{numbered_input}", numbered_input))
+    # Languages run on worker threads and post here; this thread drives the
+    # callbacks (same contract as translate_srt_file).
+    events: queue.Queue = queue.Queue()
 
+    def run(lang: str) -> None:
+        def lang_log(msg: str) -> None:
+            events.put(("log", lang, f"[{names[lang]}] {msg}"))
         try:
-            parsed = ai.complete_json(
-                prompt,
-                schema=_TRANSLATE_SCHEMA,
-                task="translate",
-                tier=tier,
+            output = _translate_store(
+                srt_path, srt_text, store.copy(),
+                source_lang=source_lang, target_lang=lang,
+                custom_prompt=custom_prompt, batch_size=batch_size, tier=tier,
+                progress_cb=lambda done, total, _msg: events.put(
+                    ("progress", lang, (done, total))),
+                log_cb=lang_log if log_cb else None, batch_job=batch_job,
+                use_memory=use_memory, repair_rounds=repair_rounds,
             )
         except Exception as e:
-            if log_cb:
-                log_cb(f"❌ 批次 {batch_idx+1} AI 调用失败: {e}")
-            # Fall back to original text so the overall task keeps going.
-            for i, line in enumerate(batch_contents):
-                text_only = re.sub(r'^【\d+】\s*', '', line)
-                translated_subs[batch_start_idx + i] = text_only
-            if batch_idx < total - 1:
-                time.sleep(0.5)
-            continue
-
-        items = parsed.get("translations", []) if isinstance(parsed, dict) else []
-        if len(items) != cur_batch_size and log_cb:
-            log_cb(f"⚠️ 批次 {batch_idx+1} 字幕数量不匹配: "
-                   f"期望 {cur_batch_size}, 实际 {len(items)}")
-
-        matched = 0
-        for item in items:
-            if not isinstance(item, dict):
-                continue
-            try:
-                local_idx = int(item.get("index", 0)) - 1
-            except (TypeError, ValueError):
+            events.put(("done", lang, (None, e)))
+            return
+        events.put(("done", lang, (output, None)))
+
+    progress = {lang: (0, 0) for lang in targets}
+    outputs: dict[str, str] = {}
+    errors: dict[str, Exception] = {}
+    with ThreadPoolExecutor(max_workers=len(targets),
+                            thread_name_prefix="translate-multi") as pool:
+        for lang in targets:
+            pool.submit(run, lang)
+        while len(outputs) + len(errors) < len(targets):
+            kind, lang, payload = events.get()
+            if kind == "log":
+                log_cb(payload)
                 continue
-            text = item.get("text", "")
-            if not isinstance(text, str):
-                continue
-            if 0 <= local_idx < cur_batch_size:
-                translated_subs[batch_start_idx + local_idx] = text
-                matched += 1
+            if kind == "progress":
+                progress[lang] = payload
+            else:
+                output, error = payload
+                if error is None:
+                    outputs[lang] = output
+                else:
+                    errors[lang] = error
+                    if log_cb:
+                        log_cb(f"❌ [{names[lang]}] 翻译失败: {error}")
+                total = max(progress[lang][1], 1)
+                progress[lang] = (total, total)
+            if progress_cb:
+                done = sum(d for d, _t in progress.values())
+                total = sum(t for _d, t in progress.values())
+                progress_cb(done, total,
+                            f"正在翻译 {len(targets)} 种语言 - 已完成 "
+                            f"{len(outputs) + len(errors)}/{len(targets)} 种, "
+                            f"{done}/{total} 批")
+
+    if errors:
+        failed = ", ".join(f"{names[lang]}: {e}" for lang, e in errors.items())
+        raise RuntimeError(f"{len(errors)}/{len(targets)} 种语言翻译失败 ({failed})")
+    return {lang: outputs[lang] for lang in targets}
+
+
+def _translate_store(srt_path: str, srt_text: str, store: SubtitleStore, *,
+                     source_lang: str, target_lang: str, custom_prompt: str | None,
+                     batch_size: int, tier: str, progress_cb, log_cb,
+                     batch_job: bool, use_memory: bool, repair_rounds: int) -> str:
+    """translate_srt_file() on an already parsed SRT; rewrites
+    `store.texts` in place."""
+    template = custom_prompt if custom_prompt is not None else _prompts.get("translate")
 
-        # Fill any holes with originals so output stays dense.
-        for i in range(cur_batch_size):
-            global_idx = batch_start_idx + i
-            if global_idx not in translated_subs:
-                text_only = re.sub(r'^【\d+】\s*', '', batch_contents[i])
-                translated_subs[global_idx] = text_only
+    source_lang_name = SUPPORTED_LANGUAGES.get(source_lang, ('Unknown', '未知'))[0]
+    target_lang_name = SUPPORTED_LANGUAGES.get(target_lang, ('Unknown', '未知'))[0]
 
-        if log_cb:
-            log_cb(f"📍 批次 {batch_idx+1} 完成 (匹配 {matched}/{cur_batch_size})")
+    if log_cb:
+        log_cb(f"准备翻译 {len(store)} 条字幕")
+
+    # Restore lines a previous, interrupted run already translated, then
+    # the ones the translation memory knows; only the rest is batched.
+    raw_contents = list(store.texts)
+    translated_subs: dict[int, str] = {}
+
+    output_dir  = os.path.dirname(srt_path)
+    output_file = os.path.join(output_dir, f"{target_lang_name}.srt")
+    journal = _Journal(
+        f"{output_file}.journal",
+        _journal_key(srt_text, template, source_lang, target_lang),
+    )
+    for idx, text in journal.load().items():
+        if 0 <= idx < len(store):
+            translated_subs[idx] = text
+            journal.done.add(idx)
+    if log_cb and journal.done:
+        log_cb(f"♻️ 断点续译: 已恢复 {len(journal.done)}/{len(store)} 条字幕")
+
+    remembered: dict[int, str] = {}
+    if use_memory:
+        pending = [i for i in range(len(store)) if i not in translated_subs]
+        found = ai.lookup_translations([raw_contents[i] for i in pending],
+                                       source_lang=source_lang, target_lang=target_lang,
+                                       task="translate", tier=tier)
+        remembered = {pending[j]: text for j, text in found.items()}
+        translated_subs.update(remembered)
+        if log_cb and pending:
+            log_cb(f"🧠 翻译记忆命中 {len(remembered)}/{len(pending)} 条 "
+                   f"({len(remembered) / len(pending):.0%})")
+
+    todo = [i for i in range(len(store)) if i not in translated_subs]
+    info = ai.describe("translate", tier)
+    packer = _BatchPacker(raw_contents, info, template, batch_size)
+    batches = packer.pack(todo)
+    total = len(batches)
 
-        if batch_idx < total - 1:
-            time.sleep(0.5)
+    if log_cb:
+        log_cb(f"分成 {total} 个批次进行翻译 ({packer.describe()})")
+
+    def batch_ok(batch: dict, route: dict) -> None:
+        """A batch came back: journal and remember the lines the model
+        actually translated (skipped slots go to the repair pass), filed
+        under the provider / model that answered (`route`)."""
+        pairs = [(idx, src) for idx, src in zip(batch['indices'], batch['sources'])
+                 if idx in translated_subs]
+        journal.record({idx: translated_subs[idx] for idx, _src in pairs})
+        if use_memory:
+            ai.store_translations([(src, translated_subs[idx]) for idx, src in pairs],
+                                  source_lang=source_lang, target_lang=target_lang,
+                                  provider=route.get("provider", ""),
+                                  model=route.get("model", ""))
+
+    cached_before = _prefix_cache_tokens(info.get("provider", ""))
+    if batch_job and total and not info.get("supports_batch"):
+        if log_cb:
+            log_cb("⚠️ 当前翻译 provider 不支持批处理任务，改用实时翻译")
+        batch_job = False
+    direction = f"{source_lang.upper()} → {target_lang.upper()}"
+    if total and batch_job:
+        _translate_offline(batches, template, source_lang_name, target_lang_name,
+                           tier, translated_subs, batch_ok, packer, direction,
+                           progress_cb, log_cb)
+    elif total:
+        total = _translate_streaming(batches, len(store), template, source_lang_name,
+                                     target_lang_name, tier, translated_subs, batch_ok,
+                                     packer, direction, progress_cb, log_cb)
+
+    # Nothing came back at all (provider down, bad key): retrying line by
+    # line would only repeat the failure.
+    missing_before = len(todo)
+    for attempt in range(repair_rounds):
+        missing = [i for i in todo if i not in translated_subs]
+        if not missing or len(missing) >= missing_before:
+            break
+        missing_before = len(missing)
+        repair_packer = _BatchPacker(raw_contents, info, template, REPAIR_BATCH_SIZE)
+        repairs = repair_packer.pack(missing)
+        if log_cb:
+            log_cb(f"🩹 补译第 {attempt+1} 轮: {len(missing)} 条缺失字幕，"
+                   f"分 {len(repairs)} 个小批次")
+        total += _translate_streaming(repairs, len(store), template, source_lang_name,
+                                      target_lang_name, tier, translated_subs,
+                                      batch_ok, repair_packer, f"{direction} 补译",
+                                      progress_cb, log_cb)
+
+    if log_cb and total:
+        cached, sent = (after - before for after, before in zip(
+            _prefix_cache_tokens(info.get("provider", "")), cached_before))
+        if sent > 0:
+            log_cb(f"🗄️ 前缀缓存命中 {cached}/~{sent} 输入 tokens "
+                   f"({info.get('provider')}，含同时段其它调用)")
 
     # Apply translated content (originals kept for any subtitle still missing).
     untranslated_count = 0
-    for i, sub in enumerate(subs):
+    for i in range(len(store)):
         if i in translated_subs:
-            sub.content = translated_subs[i]
+            store.texts[i] = translated_subs[i]
         else:
             untranslated_count += 1
 
@@ -353,15 +573,443 @@ def translate_srt_file(
         if untranslated_count:
             log_cb(f"共 {untranslated_count} 条字幕未翻译，保持原文")
         else:
-            log_cb(f"成功: 所有 {len(subs)} 条字幕都已翻译")
+            log_cb(f"成功: 所有 {len(store)} 条字幕都已翻译")
 
     # Write output SRT named after the target language
-    output_dir  = os.path.dirname(srt_path)
-    output_file = os.path.join(output_dir, f"{target_lang_name}.srt")
     with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(srt.compose(subs))
+        f.write(store.compose())
+    missing = sum(1 for i in todo if i not in translated_subs)
+    if not missing:
+        journal.remove()
+    elif log_cb:
+        log_cb(f"有 {missing} 条字幕未能翻译（已填原文），已保留进度，重新运行将只翻译这些字幕")
 
     if progress_cb:
-        progress_cb(total, total, "翻译完成")
+        progress_cb(max(total, 1), max(total, 1), "翻译完成")
 
     return output_file
+
+
+# ── Batch helpers ────────────────────────────────────────────────────────────
+
+def _translate_streaming(batches: list, sub_count: int, template: str,
+                         source_lang_name: str, target_lang_name: str,
+                         tier: str, translated_subs: dict[int, str],
+                         batch_ok, packer: "_BatchPacker", direction: str,
+                         progress_cb, log_cb) -> int:
+    """Normal path: batches streamed concurrently on a worker pool sized by
+    the routed provider's safe_concurrency. `batch_ok(batch, route)` runs
+    for each batch whose call succeeded, `route` naming the provider /
+    model that answered it.
+
+    `batches` is the initial plan. Only `workers` batches are in flight at a
+    time; each finished batch feeds `packer`, and when its scale changes the
+    batches not yet sent are re-packed. Returns the number of batches sent.
+    """
+    queued = list(batches)
+    sent: list[dict] = []
+    concurrency = ai.describe("translate", tier).get("safe_concurrency") or 1
+    workers = max(1, min(len(queued), int(concurrency)))
+    if log_cb and workers > 1:
+        log_cb(f"并发批次数: {workers}")
+
+    done = 0
+    # Lines restored from the journal / translation memory count as done.
+    streamed = sub_count - sum(len(batch['contents']) for batch in queued)
+    if progress_cb:
+        progress_cb(0, len(queued), f"正在翻译 ({direction}) - 0/{len(queued)}")
+
+    # Workers stream items into `events`; this thread applies them and
+    # drives the callbacks so UI code never sees a worker thread.
+    events: queue.Queue = queue.Queue()
+    with ThreadPoolExecutor(max_workers=workers,
+                            thread_name_prefix="translate") as pool:
+
+        def submit() -> None:
+            batch = queued.pop(0)
+            sent.append(batch)
+            pool.submit(_translate_batch, len(sent) - 1, batch, template,
+                        source_lang_name, target_lang_name, tier, events)
+
+        for _ in range(workers):
+            submit()
+        matched_by_batch: dict[int, int] = {}
+        while done < len(sent):
+            kind, batch_idx, payload = events.get()
+            batch = sent[batch_idx]
+            cur_batch_size = len(batch['contents'])
+
+            if kind == "item":
+                if _apply_item(batch, payload, translated_subs):
+                    matched_by_batch[batch_idx] = matched_by_batch.get(batch_idx, 0) + 1
+                    streamed += 1
+                    if progress_cb:
+                        total = len(sent) + len(queued)
+                        progress_cb(
+                            done, total,
+                            f"正在翻译 ({direction}) "
+                            f"- {done}/{total} 批, {streamed}/{sub_count} 条",
+                        )
+                continue
+
+            # kind == "done": payload = (item_count, error, wall_ms, route)
+            item_count, error, wall_ms, route = payload
+            done += 1
+            if error is not None:
+                if log_cb:
+                    log_cb(f"❌ 批次 {batch_idx+1} AI 调用失败: {error}")
+            elif item_count != cur_batch_size and log_cb:
+                log_cb(f"⚠️ 批次 {batch_idx+1} 字幕数量不匹配: "
+                       f"期望 {cur_batch_size}, 实际 {item_count}")
+
+            if error is None:
+                batch_ok(batch, route)
+            if error is None and log_cb:
+                log_cb(f"📍 批次 {batch_idx+1} 完成 "
+                       f"(匹配 {matched_by_batch.get(batch_idx, 0)}/{cur_batch_size})")
+
+            if packer.observe(expected=cur_batch_size, returned=item_count,
+                              wall_ms=wall_ms, error=error) and queued:
+                queued = packer.pack([idx for b in queued for idx in b['indices']])
+                if log_cb:
+                    log_cb(f"🔧 调整批次大小: {packer.describe()}，"
+                           f"剩余 {len(queued)} 个批次")
+            if queued:
+                submit()
+
+            if progress_cb:
+                total = len(sent) + len(queued)
+                progress_cb(
+                    done, total,
+                    f"正在翻译 ({direction}) "
+                    f"- {done}/{total} 批, {streamed}/{sub_count} 条",
+                )
+    return len(sent)
+
+
+def _translate_offline(batches: list, template: str,
+                       source_lang_name: str, target_lang_name: str,
+                       tier: str, translated_subs: dict[int, str],
+                       batch_ok, packer: "_BatchPacker", direction: str,
+                       progress_cb, log_cb) -> None:
+    """batch_job path: every batch in one provider batch job, applied once
+    the job has finished. A failed request falls back to the original text
+    like a failed streamed batch. The job is packed up front, so `packer`
+    only learns for the next run."""
+    total = len(batches)
+    prompts = [_batch_prompt(batch, template, source_lang_name, target_lang_name)
+               for batch in batches]
+    if log_cb:
+        log_cb(f"提交批处理任务: {total} 个批次（完成前会一直等待，可中断后重跑续上）")
+    if progress_cb:
+        progress_cb(0, total, f"等待批处理任务 ({direction}) - 0/{total}")
+
+    def on_progress(completed: int, requested: int) -> None:
+        if progress_cb:
+            progress_cb(0, total, f"等待批处理任务 ({direction}) - {completed}/{requested}")
+
+    route: dict = {}
+    results = ai.complete_json_batch(
+        prompts,
+        schema=_TRANSLATE_SCHEMA,
+        task="translate",
+        tier=tier,
+        cache_hint=_cache_hint(template, source_lang_name, target_lang_name),
+        progress_cb=on_progress,
+        route=route,
+    )
+    for batch_idx, (batch, result) in enumerate(zip(batches, results)):
+        cur_batch_size = len(batch['contents'])
+        matched = 0
+        if isinstance(result, Exception):
+            if log_cb:
+                log_cb(f"❌ 批次 {batch_idx+1} AI 调用失败: {result}")
+        else:
+            items = result.get("translations") if isinstance(result, dict) else None
+            items = items if isinstance(items, list) else []
+            for item in items:
+                if _apply_item(batch, item, translated_subs):
+                    matched += 1
+            batch_ok(batch, route)
+            if log_cb:
+                log_cb(f"📍 批次 {batch_idx+1} 完成 (匹配 {matched}/{cur_batch_size})")
+        packer.observe(expected=cur_batch_size,
+                       returned=0 if isinstance(result, Exception) else len(items),
+                       error=result if isinstance(result, Exception) else None)
+        if progress_cb:
+            progress_cb(batch_idx + 1, total,
+                        f"正在应用译文 ({direction}) - {batch_idx+1}/{total}")
+
+
+def _batch_prompt(batch: dict, template: str,
+                  source_lang_name: str, target_lang_name: str) -> str:
+    return (template
+            .replace("{source_lang_name}", source_lang_name)
+            .replace("{target_lang_name}", target_lang_name)
+            .replace("{batch_size}", str(len(batch['contents'])))
+            .replace("{numbered_input}", '\n\n'.join(batch['contents'])))
+
+
+def _prefix_cache_tokens(provider: str) -> tuple[int, int]:
+    """(cached_input_tokens, input_tokens) counted for `provider` so far."""
+    entry = ai.get_stats().get(provider) or {}
+    return entry.get("cached_input_tokens", 0), entry.get("input_tokens", 0)
+
+
+def _cache_hint(template: str, source_lang_name: str, target_lang_name: str) -> str:
+    """The instruction preamble: identical for every batch of a run because
+    it stops before the first per-batch placeholder ({batch_size} varies
+    with adaptive batch sizing)."""
+    return _prompts.template_prefix(template, ["{batch_size}", "{numbered_input}"],
+                                    source_lang_name=source_lang_name,
+                                    target_lang_name=target_lang_name)
+
+
+def _translate_batch(batch_idx: int, batch: dict, template: str,
+                     source_lang_name: str, target_lang_name: str,
+                     tier: str, events: queue.Queue) -> None:
+    """Worker-thread body: one streamed AI call for one batch.
+
+    Posts ("item", batch_idx, item) for each translation as it arrives and
+    a final ("done", batch_idx, (item_count, error, wall_ms, route)), `route`
+    being the provider / model that answered. Never raises — the
+    coordinating thread decides how to log and what to retry, so a single
+    failed batch can't tear down the pool. Items already streamed before a
+    mid-stream failure are kept.
+    """
+    prompt = _batch_prompt(batch, template, source_lang_name, target_lang_name)
+    count = 0
+    route: dict = {}
+    started = time.monotonic()
+    try:
+        for item in ai.complete_json_stream(
+            prompt,
+            schema=_TRANSLATE_SCHEMA,
+            stream_key="translations",
+            task="translate",
+            tier=tier,
+            cache_hint=_cache_hint(template, source_lang_name, target_lang_name),
+            route=route,
+        ):
+            count += 1
+            events.put(("item", batch_idx, item))
+    except Exception as e:
+        events.put(("done", batch_idx, (count, e, _ms_since(started), route)))
+        return
+    events.put(("done", batch_idx, (count, None, _ms_since(started), route)))
+
+
+def _ms_since(started: float) -> float:
+    return (time.monotonic() - started) * 1000
+
+
+def _apply_item(batch: dict, item, translated_subs: dict[int, str]) -> bool:
+    """Write one model item into `translated_subs` by global index.
+    Returns False for malformed / out-of-range items and for blank text
+    given for a non-blank line (left for the repair pass)."""
+    if not isinstance(item, dict):
+        return False
+    try:
+        local_idx = int(item.get("index", 0)) - 1
+    except (TypeError, ValueError):
+        return False
+    text = item.get("text", "")
+    if not isinstance(text, str):
+        return False
+    if not 0 <= local_idx < len(batch['contents']):
+        return False
+    if not text.strip() and batch['sources'][local_idx].strip():
+        return False
+    translated_subs[batch['indices'][local_idx]] = text
+    return True
+
+
+# ── Adaptive batch sizing ────────────────────────────────────────────────────
+
+class _BatchSizer:
+    """Learned budget scale for one (provider, model), AIMD like the rate
+    limiter's concurrency window: ×0.7 when batches come back short too
+    often (EWMA of the mismatch rate), run slower than
+    TRANSLATE_SLOW_BATCH_MS or fail as overflow / malformed; +0.1 per clean
+    batch, up to 1.0. Other failures (network, rate limit, ...) say nothing
+    about batch size and are ignored."""
+
+    MIN_SCALE     = 0.1
+    DECREASE      = 0.7
+    INCREASE      = 0.1
+    MISMATCH_EWMA = 0.2      # weight of the newest batch
+    MISMATCH_MAX  = 0.3      # shrink once the rate crosses this
+
+    def __init__(self, scale: float = 1.0):
+        self.scale = scale
+        self.mismatch_rate = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, *, expected: int, returned: int, wall_ms: float = 0,
+                error: Exception | None = None) -> bool:
+        """Feed one finished batch; True when the scale changed."""
+        if error is not None and not (isinstance(error, ai.AIError) and error.kind
+                                      in (ai.Kind.OVERFLOW, ai.Kind.MALFORMED)):
+            return False
+        with self._lock:
+            before = self.scale
+            mismatch = error is not None or returned != expected
+            self.mismatch_rate += self.MISMATCH_EWMA * (mismatch - self.mismatch_rate)
+            if (error is not None or wall_ms > TRANSLATE_SLOW_BATCH_MS
+                    or (mismatch and self.mismatch_rate > self.MISMATCH_MAX)):
+                self.scale = max(self.MIN_SCALE, self.scale * self.DECREASE)
+            elif not mismatch:
+                self.scale = min(1.0, self.scale + self.INCREASE)
+            return self.scale != before
+
+
+_sizers: dict[tuple, _BatchSizer] = {}
+_sizers_lock = threading.Lock()
+
+
+def _sizer_for(provider: str, model: str, latency_p50_ms: float) -> _BatchSizer:
+    """Shared sizer for (provider, model). A new one starts at half size
+    when the router's median translate latency is already slow."""
+    with _sizers_lock:
+        sizer = _sizers.get((provider, model))
+        if sizer is None:
+            slow = latency_p50_ms > TRANSLATE_SLOW_BATCH_MS
+            sizer = _sizers[(provider, model)] = _BatchSizer(0.5 if slow else 1.0)
+        return sizer
+
+
+class _BatchPacker:
+    """Packs subtitle indices into batches against the routed model's
+    limits (see translate_srt_file, "Batch sizing")."""
+
+    def __init__(self, raw_contents: list, info: dict, template: str, batch_size: int):
+        self.raw_contents = raw_contents
+        self.batch_size = max(1, int(batch_size))
+        # Everything in the prompt but the subtitles themselves.
+        overhead = estimate_tokens(template.replace("{numbered_input}", ""))
+        context = int(info.get("max_input_tokens") or 0)
+        self.max_tokens = TRANSLATE_BATCH_MAX_TOKENS
+        if context > 0:
+            self.max_tokens = max(1, min(self.max_tokens,
+                                         int(context * TRANSLATE_CONTEXT_SHARE) - overhead))
+        self.sizer = _sizer_for(info.get("provider", ""), info.get("model", ""),
+                                info.get("latency_p50_ms") or 0)
+
+    def limits(self) -> tuple[int, int, int]:
+        """(lines, tokens, chars) per batch at the current scale."""
+        scale = self.sizer.scale
+        return (max(1, int(self.batch_size * scale)),
+                max(1, int(self.max_tokens * scale)),
+                max(1, int(TRANSLATE_BATCH_MAX_CHARS * scale)))
+
+    def describe(self) -> str:
+        lines, tokens, chars = self.limits()
+        return f"每批最多 {lines} 条 / ~{tokens} tokens / {chars} 字符"
+
+    def observe(self, **outcome) -> bool:
+        return self.sizer.observe(**outcome)
+
+    def pack(self, indices: list) -> list:
+        """Consecutive batches in `indices` order; a single oversized line
+        still gets a batch of its own."""
+        max_lines, max_tokens, max_chars = self.limits()
+        batches, current, tokens, chars = [], [], 0, 0
+        for idx in indices:
+            text = self.raw_contents[idx]
+            cost = estimate_tokens(text) + _LINE_OVERHEAD_TOKENS
+            if current and (len(current) >= max_lines or tokens + cost > max_tokens
+                            or chars + len(text) > max_chars):
+                batches.append(self._batch(current))
+                current, tokens, chars = [], 0, 0
+            current.append(idx)
+            tokens += cost
+            chars += len(text)
+        if current:
+            batches.append(self._batch(current))
+        return batches
+
+    def _batch(self, indices: list) -> dict:
+        # Number markers are batch-local (1..cur_batch_size) so the model's
+        # returned `index` maps directly to a slot inside the batch;
+        # `indices` maps each slot back to its subtitle.
+        sources = [self.raw_contents[idx] for idx in indices]
+        numbered = [f"【{j+1}】{text}" for j, text in enumerate(sources)]
+        return {'indices': list(indices), 'sources': sources, 'contents': numbered}
+
+
+# ── Resume journal ───────────────────────────────────────────────────────────
+# JSON lines: a {"key": ...} header, then {"lines": {index: text}} per
+# completed batch. Appended and fsynced batch by batch, so a crash loses at
+# most the batch being written; a torn last line is ignored on load.
+
+def _journal_key(srt_text: str, template: str, source_lang: str,
+                 target_lang: str) -> str:
+    payload = json.dumps([srt_text, template, source_lang, target_lang],
+                         ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Journal:
+    """Per-output record of translated lines (see translate_srt_file)."""
+
+    def __init__(self, path: str, key: str):
+        self.path = path
+        self.key = key
+        self.done: set[int] = set()
+        self._started = False
+
+    def load(self) -> dict[int, str]:
+        """Journaled lines (subtitle index -> translation) if the journal on
+        disk was written for the same key, else {}. Lines that aren't JSON
+        objects (a torn write, hand edits) are skipped."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except (OSError, UnicodeDecodeError):
+            return {}
+        entries = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(entry, dict):
+                entries.append(entry)
+        if not entries or entries[0].get("key") != self.key:
+            return {}
+        self._started = True
+        restored: dict[int, str] = {}
+        for entry in entries[1:]:
+            batch = entry.get("lines")
+            if not isinstance(batch, dict):
+                continue
+            for idx, text in batch.items():
+                if isinstance(text, str) and idx.isdigit():
+                    restored[int(idx)] = text
+        return restored
+
+    def record(self, lines: dict[int, str]) -> None:
+        """Append one completed batch's lines. Journal write errors never
+        fail the translation — they only cost resumability."""
+        if not lines:
+            return
+        out = []
+        if not self._started:
+            out.append(json.dumps({"key": self.key}))
+        out.append(json.dumps({"lines": {str(i): t for i, t in lines.items()}},
+                              ensure_ascii=False))
+        try:
+            with open(self.path, "a" if self._started else "w", encoding="utf-8") as f:
+                f.write("".join(line + "\n" for line in out))
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError:
+            return
+        self._started = True
+        self.done.update(lines)
+
+    def remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
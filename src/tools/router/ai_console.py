@@ -46,6 +46,22 @@ def _task_short_label(task_id: str) -> str:
     return tr(f"tool.router.task_header.{task_id}")
 
 
+def _stats_row(s: dict, last: str) -> tuple:
+    """Stats tab column values for one provider / model|task entry."""
+    calls  = s["calls"]
+    errors = s["errors"]
+    rate   = f"{errors / calls * 100:.0f}%" if calls > 0 else "—"
+    wall   = s.get("latency_ms") or {}
+    ttfb   = s.get("ttfb_ms") or {}
+
+    def ms(d: dict, key: str) -> str:
+        return f"{d[key]} ms" if d.get("count") else "—"
+
+    tokens = f"{s.get('input_tokens', 0)} / {s.get('output_tokens', 0)}"
+    return (calls, errors, rate, ms(wall, "p50"), ms(wall, "p95"),
+            ms(ttfb, "p50"), tokens, s.get("cached_input_tokens", 0), last)
+
+
 def _row_value(provider: str, model: str) -> str:
     """Encode a (provider, model) pair as a single radio value string."""
     return f"{provider}::{model}"
@@ -425,7 +441,7 @@ class AIConsoleApp(ToolBase):
     def _open_claude_code_dialog(self, name: str, cfg: dict):
         dlg = tk.Toplevel(self.master)
         dlg.title(tr("tool.router.edit_dialog_title", name=name))
-        dlg.geometry("500x340")
+        dlg.geometry("500x420")
         dlg.resizable(False, False)
         dlg.grab_set()
 
@@ -444,6 +460,20 @@ class AIConsoleApp(ToolBase):
             row=r, column=1, pady=6, sticky="w")
         r += 1
 
+        tk.Label(dlg, text=tr("tool.router.label_pool_size"), anchor="e", width=14).grid(
+            row=r, column=0, padx=10, pady=6, sticky="e")
+        pool_var = tk.StringVar(value=str(cfg.get("pool_size", 0)))
+        tk.Entry(dlg, textvariable=pool_var, width=14).grid(
+            row=r, column=1, pady=6, sticky="w")
+        r += 1
+
+        tk.Label(dlg, text=tr("tool.router.label_pool_max_requests"), anchor="e", width=14).grid(
+            row=r, column=0, padx=10, pady=6, sticky="e")
+        pool_requests_var = tk.StringVar(value=str(cfg.get("pool_max_requests", 1)))
+        tk.Entry(dlg, textvariable=pool_requests_var, width=14).grid(
+            row=r, column=1, pady=6, sticky="w")
+        r += 1
+
         tk.Label(dlg, text=tr("tool.router.label_models"), anchor="ne", width=14).grid(
             row=r, column=0, padx=10, pady=6, sticky="ne")
         models_text = tk.Text(dlg, height=4, width=42, wrap="word")
@@ -464,6 +494,14 @@ class AIConsoleApp(ToolBase):
                     timeout_var.get(), minimum=10, maximum=3600,
                     field_label=tr("tool.router.label_timeout_sec"),
                 )
+                pool_size = _parse_int_range(
+                    pool_var.get(), minimum=0, maximum=8,
+                    field_label=tr("tool.router.label_pool_size"),
+                )
+                pool_max_requests = _parse_int_range(
+                    pool_requests_var.get(), minimum=1, maximum=50,
+                    field_label=tr("tool.router.label_pool_max_requests"),
+                )
             except ValueError as e:
                 messagebox.showerror(tr("dialog.common.error"), str(e), parent=dlg)
                 return
@@ -473,6 +511,8 @@ class AIConsoleApp(ToolBase):
                 name,
                 executable=executable,
                 timeout_sec=timeout_sec,
+                pool_size=pool_size,
+                pool_max_requests=pool_max_requests,
                 models=models,
             )
             messagebox.showinfo(tr("tool.router.saved_title"),
@@ -592,6 +632,8 @@ class AIConsoleApp(ToolBase):
                 txt = ai.complete(
                     "Please reply with the single word OK and nothing else.",
                     provider=name,
+                    use_cache=False,
+                    priority=ai.PRIORITY_INTERACTIVE,
                 )
                 self.master.after(0,
                     lambda t=(txt or "").strip(): self._show_test_result(name, "ok", t))
@@ -786,16 +828,24 @@ class AIConsoleApp(ToolBase):
     def _build_stats_tab(self):
         tab = self.tab_stats
 
-        cols   = ("provider", "calls", "errors", "error_rate", "last_used")
-        labels = (tr("tool.router.col_provider"),
-                  tr("tool.router.col_calls"),
+        # Provider rows expand into one child row per "<model> | <task>".
+        cols   = ("calls", "errors", "error_rate", "p50", "p95",
+                  "ttfb_p50", "tokens", "cached", "last_used")
+        labels = (tr("tool.router.col_calls"),
                   tr("tool.router.col_errors"),
                   tr("tool.router.col_error_rate"),
+                  tr("tool.router.col_latency_p50"),
+                  tr("tool.router.col_latency_p95"),
+                  tr("tool.router.col_ttfb_p50"),
+                  tr("tool.router.col_tokens"),
+                  tr("tool.router.col_cached_tokens"),
                   tr("tool.router.col_last_used"))
-        widths = (100, 80, 80, 70, 180)
+        widths = (70, 70, 70, 80, 80, 80, 120, 90, 160)
 
         self.stats_tree = ttk.Treeview(tab, columns=cols,
-                                       show="headings", height=10)
+                                       show="tree headings", height=10)
+        self.stats_tree.heading("#0", text=tr("tool.router.col_provider"))
+        self.stats_tree.column("#0", width=260, anchor="w")
         for col, label, w in zip(cols, labels, widths):
             self.stats_tree.heading(col, text=label)
             self.stats_tree.column(col, width=w, anchor="center")
@@ -819,8 +869,9 @@ class AIConsoleApp(ToolBase):
         for item in self.stats_tree.get_children():
             self.stats_tree.delete(item)
         for name, s in router.get_stats().items():
-            calls  = s["calls"]
-            errors = s["errors"]
-            rate   = f"{errors / calls * 100:.0f}%" if calls > 0 else "—"
-            last   = s["last_used"] or tr("tool.router.never_used")
-            self.stats_tree.insert("", "end", values=(name, calls, errors, rate, last))
+            last = s["last_used"] or tr("tool.router.never_used")
+            parent = self.stats_tree.insert("", "end", text=name,
+                                            values=_stats_row(s, last))
+            for key, detail in sorted(s.get("by_model_task", {}).items()):
+                self.stats_tree.insert(parent, "end", text=key,
+                                       values=_stats_row(detail, ""))
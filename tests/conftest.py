@@ -0,0 +1,89 @@
+"""Shared fixtures: an isolated AIRouter wired to local stub servers.
+
+Nothing here talks to a real provider. Every router built by `make_router`
+reads its config, keys, cache, translation memory and batch table from the
+test's tmp_path, and `core.ai.router` is swapped for it, so the
+module-level facade (`core.ai.complete(...)`, translate) goes through it too.
+"""
+
+from __future__ import annotations
+
+import importlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import core.ai as ai                                  # noqa: E402
+from core.ai.stub_server import StubServer            # noqa: E402
+
+# `core.ai.router` the attribute is the singleton; these are the modules.
+_cfg = importlib.import_module("core.ai.config")
+_router_mod = importlib.import_module("core.ai.router")
+
+KEY_FILE = "stub.key"
+
+
+def provider(base_url: str, *, model: str = "stub", priority: int = 1,
+             batch: bool = False, max_concurrency: int = 2) -> dict:
+    """An openai_compatible provider entry pointing at a stub server."""
+    return {
+        "type": "openai_compatible", "enabled": True, "priority": priority,
+        "key_file": KEY_FILE, "base_url": base_url, "models": [model],
+        "tiers": {"premium": model, "standard": model, "economy": model},
+        "rpm": 0, "tpm": 0, "max_concurrency": max_concurrency,
+        "max_input_tokens": 0, "timeout_sec": 30, "batch": batch,
+    }
+
+
+@pytest.fixture
+def stub():
+    """Start a StubServer with the given knobs; stopped after the test."""
+    servers = []
+
+    def start(**knobs) -> StubServer:
+        knobs.setdefault("seed", 1)
+        knobs.setdefault("batch_sec", 0)
+        server = StubServer(**knobs).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def make_router(tmp_path, monkeypatch):
+    """Build an AIRouter over `providers` ({name: provider(...)}) with
+    `task_routing`, isolated under tmp_path, and install it as core.ai's
+    router. The response cache starts disabled."""
+    keys = tmp_path / "keys"
+    keys.mkdir()
+    (keys / KEY_FILE).write_text("test-key", encoding="utf-8")
+    data_dir = tmp_path / "user_data"
+    monkeypatch.setattr(_cfg, "keys_dir", lambda: str(keys))
+    monkeypatch.setattr(_cfg, "cache_dir", lambda: str(data_dir / "ai_cache"))
+    monkeypatch.setattr(_cfg, "fixtures_dir", lambda: str(data_dir / "ai_fixtures"))
+    monkeypatch.setattr(_cfg, "memory_path", lambda: str(data_dir / "ai_memory.sqlite3"))
+    monkeypatch.setattr(_cfg, "batch_dir", lambda: str(data_dir / "ai_batches"))
+    # The watcher thread outlives the test; keep it asleep.
+    monkeypatch.setattr(_router_mod, "_CONFIG_WATCH_SEC", 1e9)
+
+    def build(providers: dict, task_routing: dict | None = None):
+        r = _router_mod.AIRouter()
+        data = r._snap.data()
+        data["providers"] = providers
+        data["task_routing"] = task_routing or {}
+        with r._config_lock:
+            r._persist(data)
+            for name, cfg in providers.items():
+                r._limiter.configure(name, **_cfg.rate_limits(cfg))
+        r._stats.init_providers(list(providers))
+        r._cache.enabled = False
+        monkeypatch.setattr(ai, "router", r)
+        return r
+
+    return build
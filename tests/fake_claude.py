@@ -0,0 +1,30 @@
+"""Stand-in for the `claude` CLI in --input-format stream-json mode.
+
+Answers every stream-json user message on stdin with an `assistant` event
+and a `result` event whose text is "pid=<pid> turn=<n> <prompt>", so tests
+can tell which process served a prompt and how many turns its session had
+seen. A prompt containing "hang" is never answered.
+"""
+
+import json
+import os
+import sys
+
+
+def main() -> None:
+    turn = 0
+    for line in sys.stdin:
+        message = json.loads(line)
+        prompt = message["message"]["content"][0]["text"]
+        turn += 1
+        if "hang" in prompt:
+            continue
+        text = f"pid={os.getpid()} turn={turn} {prompt}"
+        for event in ({"type": "assistant",
+                       "message": {"content": [{"type": "text", "text": text}]}},
+                      {"type": "result", "result": text, "is_error": False}):
+            print(json.dumps(event), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Deadline.arm on the shared watcher thread."""
+
+import threading
+import time
+
+from core.ai import CancellationToken, Deadline
+
+
+def _wait_for(predicate, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < end:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_armed_token_is_cancelled_at_the_deadline():
+    token = CancellationToken()
+    started = time.monotonic()
+    Deadline(0.1).arm(token)
+    assert _wait_for(lambda: token.cancelled)
+    assert time.monotonic() - started >= 0.1
+
+
+def test_disarmed_token_is_left_alone():
+    token = CancellationToken()
+    disarm = Deadline(0.05).arm(token)
+    disarm()
+    time.sleep(0.2)
+    assert not token.cancelled
+
+
+def test_earlier_deadline_armed_later_fires_first():
+    late, early = CancellationToken(), CancellationToken()
+    Deadline(5).arm(late)
+    Deadline(0.05).arm(early)
+    assert _wait_for(lambda: early.cancelled)
+    assert not late.cancelled
+
+
+def test_many_armed_calls_share_one_thread():
+    Deadline(0.01).arm(CancellationToken())     # make sure the watcher exists
+    before = threading.active_count()
+    tokens = [CancellationToken() for _ in range(50)]
+    disarms = [Deadline(0.05 + i / 1000).arm(token) for i, token in enumerate(tokens)]
+    assert threading.active_count() == before
+    for disarm in disarms[::2]:
+        disarm()
+    assert _wait_for(lambda: all(token.cancelled for token in tokens[1::2]))
+    assert not any(token.cancelled for token in tokens[::2])
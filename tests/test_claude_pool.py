@@ -0,0 +1,63 @@
+"""Pooled ClaudeCode workers, driven by tests/fake_claude.py."""
+
+import os
+import sys
+import threading
+
+import pytest
+
+from core.ai import AIError, CancellationToken, Kind
+from core.ai.providers import claude_code
+from core.ai.providers._claude_pool import POOL
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="uses a shell launcher")
+
+FAKE = os.path.join(os.path.dirname(__file__), "fake_claude.py")
+
+
+@pytest.fixture
+def cfg(tmp_path):
+    launcher = tmp_path / "claude"
+    launcher.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE}" "$@"\n')
+    launcher.chmod(0o755)
+    yield {"executable": str(launcher), "pool_size": 1, "pool_max_requests": 1,
+           "timeout_sec": 10, "extra_args": []}
+    POOL.shutdown()
+
+
+def _served(answer: str) -> tuple:
+    pid, turn = answer.split()[:2]
+    return pid, turn
+
+
+def test_every_prompt_gets_a_fresh_conversation(cfg):
+    answers = [claude_code.call(cfg, "", f"prompt {i}") for i in range(3)]
+    assert [_served(a)[1] for a in answers] == ["turn=1"] * 3
+    assert len({_served(a)[0] for a in answers}) == 3
+    assert answers[2].endswith("prompt 2")
+    # The retired worker's successor is already running, idle.
+    assert POOL.size() == 1
+
+
+def test_worker_is_reused_up_to_the_cap(cfg):
+    cfg["pool_max_requests"] = 2
+    served = [_served(claude_code.call(cfg, "", "hi")) for _ in range(3)]
+    assert [turn for _pid, turn in served] == ["turn=1", "turn=2", "turn=1"]
+    assert served[0][0] == served[1][0] != served[2][0]
+
+
+def test_cancel_kills_the_worker(cfg):
+    token = CancellationToken()
+    threading.Timer(0.3, token.cancel).start()
+    with pytest.raises(AIError) as info:
+        claude_code.call(cfg, "", "hang", token)
+    assert info.value.kind == Kind.CANCELLED
+    # A fresh worker serves the next prompt.
+    assert _served(claude_code.call(cfg, "", "hi"))[1] == "turn=1"
+
+
+def test_timeout_kills_the_worker(cfg):
+    with pytest.raises(AIError) as info:
+        claude_code.call(cfg, "", "hang", timeout=0.3)
+    assert info.value.kind == Kind.NETWORK
+    assert _served(claude_code.call(cfg, "", "hi"))[1] == "turn=1"
@@ -0,0 +1,186 @@
+"""Router behaviour against the local stub server: fallback, 429 / 500
+injection, hedged requests, streaming routes and offline batch jobs."""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import core.ai as ai
+from core.ai import AIError, CancellationToken, Kind
+
+from conftest import _router_mod, provider
+
+SCHEMA = {
+    "type": "object",
+    "properties": {"translations": {"type": "array", "items": {
+        "type": "object",
+        "properties": {"index": {"type": "integer"}, "text": {"type": "string"}},
+    }}},
+}
+
+
+def test_complete_answers_from_stub(stub, make_router):
+    server = stub()
+    make_router({"Stub": provider(server.base_url)},
+                {"translate": {"provider": "Stub", "model": "stub"}})
+    assert ai.complete("first line\nsecond line", task="translate") == "second line"
+    assert server.requests["ok"] == 1
+    assert ai.get_stats()["Stub"]["calls"] == 1
+
+
+def test_500_falls_back_to_next_provider(stub, make_router):
+    broken, healthy = stub(rate_500=1.0), stub()
+    make_router({"Broken": provider(broken.base_url, model="m-broken"),
+                 "Healthy": provider(healthy.base_url, priority=2)},
+                {"translate": {"provider": "Broken", "model": "m-broken"}})
+    assert ai.complete("hello", task="translate") == "hello"
+    assert broken.requests["500"] == 1
+    assert healthy.requests["ok"] == 1
+    stats = ai.get_stats()
+    assert stats["Broken"]["errors"] == 1
+    assert stats["Healthy"]["calls"] == 1
+
+
+def test_explicit_provider_does_not_fall_back(stub, make_router):
+    broken, healthy = stub(rate_500=1.0), stub()
+    make_router({"Broken": provider(broken.base_url),
+                 "Healthy": provider(healthy.base_url, priority=2)})
+    with pytest.raises(Exception):
+        ai.complete("hello", provider="Broken")
+    assert broken.requests["500"] == 2      # the call plus one transient retry
+    assert healthy.requests["ok"] == 0
+
+
+@pytest.mark.parametrize("call", ["complete", "complete_stream", "acomplete"])
+def test_explicit_provider_retries_a_transient_error_once(stub, make_router, call):
+    # With seed 1 the stub rolls 0.13 then 0.85: a 500, then an answer.
+    server = stub(rate_500=0.5)
+    make_router({"Stub": provider(server.base_url)})
+    if call == "complete":
+        answer = ai.complete("hello", provider="Stub")
+    elif call == "complete_stream":
+        answer = "".join(ai.complete_stream("hello", provider="Stub"))
+    else:
+        answer = asyncio.run(ai.acomplete("hello", provider="Stub"))
+    assert answer == "hello"
+    assert (server.requests["500"], server.requests["ok"]) == (1, 1)
+
+
+def test_429_burst_halves_the_window_once(stub, make_router):
+    # Four requests in flight together all come back 429: one congestion
+    # event, so the window halves once and the pause is taken once.
+    server = stub(rate_429=1.0, retry_after=600, latency_ms=200)
+    r = make_router({"Stub": provider(server.base_url, max_concurrency=8)})
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(ai.complete, f"hello {i}", provider="Stub")
+                   for i in range(4)]
+    for future in futures:
+        assert isinstance(future.exception(), AIError)
+    limiter = r.get_limiter_stats()["Stub"]
+    assert server.requests["429"] == 4
+    assert limiter["rate_limited"] == 4
+    assert limiter["limit"] == 4.0
+
+
+def test_429_is_reported_as_rate_limit(stub, make_router):
+    # A Retry-After too long to wait out in place propagates to the caller.
+    server = stub(rate_429=1.0, retry_after=600)
+    r = make_router({"Stub": provider(server.base_url)})
+    with pytest.raises(AIError) as info:
+        ai.complete("hello", provider="Stub")
+    assert info.value.kind == Kind.RATE_LIMIT
+    assert server.requests["429"] == 1
+    assert r.get_limiter_stats()["Stub"]["rate_limited"] == 1
+
+
+@pytest.fixture
+def racer_tokens(monkeypatch):
+    """Every CancellationToken the router creates, in creation order; without
+    a deadline those are just the hedge legs' (primary first)."""
+    tokens = []
+
+    class Recorded(CancellationToken):
+        def __init__(self):
+            super().__init__()
+            tokens.append(self)
+
+    monkeypatch.setattr(_router_mod, "CancellationToken", Recorded)
+    return tokens
+
+
+def _hedged_routing(primary: str, after_ms: int) -> dict:
+    return {"translate": {"provider": primary, "model": "stub",
+                          "hedge": True, "hedge_after_ms": after_ms}}
+
+
+def test_hedge_backup_answers_a_slow_primary(stub, make_router, racer_tokens):
+    slow, fast = stub(latency_ms=1500), stub()
+    make_router({"Slow": provider(slow.base_url),
+                 "Fast": provider(fast.base_url, priority=2)},
+                _hedged_routing("Slow", 100))
+    started = time.monotonic()
+    assert ai.complete("hello", task="translate") == "hello"
+    assert time.monotonic() - started < 1.0
+    assert fast.requests["ok"] == 1
+    primary, backup = racer_tokens
+    assert primary.cancelled and not backup.cancelled
+
+
+def test_hedge_backup_starts_when_the_primary_fails(stub, make_router, racer_tokens):
+    # The delay is long enough that only the primary's error can have
+    # launched the backup.
+    broken, healthy = stub(rate_500=1.0), stub()
+    make_router({"Broken": provider(broken.base_url),
+                 "Healthy": provider(healthy.base_url, priority=2)},
+                _hedged_routing("Broken", 10_000))
+    started = time.monotonic()
+    assert ai.complete("hello", task="translate") == "hello"
+    assert time.monotonic() - started < 5.0
+    assert broken.requests["500"] == 1
+    assert healthy.requests["ok"] == 1
+    assert len(racer_tokens) == 2
+
+
+def test_json_stream_reports_the_answering_route(stub, make_router):
+    broken, healthy = stub(rate_500=1.0), stub()
+    make_router({"Broken": provider(broken.base_url, model="m-broken"),
+                 "Healthy": provider(healthy.base_url, priority=2)},
+                {"translate": {"provider": "Broken", "model": "m-broken"}})
+    route = {}
+    items = list(ai.complete_json_stream(
+        "【1】one\n\n【2】two", schema=SCHEMA, stream_key="translations",
+        task="translate", route=route))
+    assert [item["index"] for item in items] == [1, 2]
+    assert route == {"provider": "Healthy", "model": "stub"}
+
+
+def test_batch_job_answers_every_prompt(stub, make_router):
+    server = stub()
+    r = make_router({"Stub": provider(server.base_url, batch=True)},
+                    {"translate": {"provider": "Stub", "model": "stub"}})
+    prompts = ["【1】alpha", "【1】beta\n\n【2】gamma"]
+    route = {}
+    results = ai.complete_json_batch(prompts, schema=SCHEMA, task="translate",
+                                     poll_sec=0.05, route=route)
+    assert [len(res["translations"]) for res in results] == [1, 2]
+    assert route == {"provider": "Stub", "model": "stub"}
+    assert server.requests["batch"] == 1
+    jobs = r.get_batch_jobs()
+    assert [job["status"] for job in jobs] == ["completed"]
+
+
+def test_batch_job_keeps_failed_requests_apart(stub, make_router):
+    server = stub(rate_500=1.0)
+    make_router({"Stub": provider(server.base_url, batch=True)})
+    results = ai.complete_json_batch(["【1】alpha", "【1】beta"], schema=SCHEMA,
+                                     provider="Stub", poll_sec=0.05)
+    assert all(isinstance(res, Exception) for res in results)
+
+
+def test_batch_needs_a_batch_capable_provider(stub, make_router):
+    server = stub()
+    make_router({"Stub": provider(server.base_url, batch=False)})
+    with pytest.raises(RuntimeError):
+        ai.complete_json_batch(["【1】alpha"], schema=SCHEMA, provider="Stub")
@@ -0,0 +1,36 @@
+"""SubtitleStore against the srt library it replaces."""
+
+import pytest
+import srt
+
+from core.subtitle_store import SubtitleStore
+
+SAMPLE = (
+    "1\n00:00:01,000 --> 00:00:02,500\nfirst\n\n"
+    "2\r\n00:00:03.000 --> 00:00:04,000\r\ntwo\r\n\r\nlines\r\n\r\n"
+    "00:00:00,500 --> 00:00:00,900\nno index, earlier\n\n"
+    "4\n00:00:05,000 --> 00:00:05,000\nzero length\n"
+)
+
+
+@pytest.mark.parametrize("text", [SAMPLE, "﻿" + SAMPLE, ""])
+def test_compose_matches_srt(text):
+    assert SubtitleStore.parse(text).compose() == srt.compose(srt.parse(text))
+
+
+@pytest.mark.parametrize("text", [
+    "garbage\n\n1\n00:00:01,000 --> 00:00:02,000\nx\n",
+    "no cues at all",
+])
+def test_unparseable_text_raises_like_srt(text):
+    with pytest.raises(srt.SRTParseError):
+        list(srt.parse(text))
+    with pytest.raises(srt.SRTParseError):
+        SubtitleStore.parse(text)
+
+
+def test_subtitle_adapters_round_trip():
+    subs = list(srt.parse(SAMPLE))
+    store = SubtitleStore.from_subtitles(subs)
+    assert len(store) == len(subs)
+    assert srt.compose(store.to_subtitles()) == srt.compose(subs)
@@ -0,0 +1,137 @@
+"""translate_srt_file end to end against the stub server."""
+
+import os
+
+import pytest
+import srt
+
+import core.ai as ai
+from core import translate
+
+from conftest import provider
+
+
+@pytest.fixture(autouse=True)
+def fresh_batch_sizers(monkeypatch):
+    # Learned batch scales are process-wide; don't carry them across tests.
+    monkeypatch.setattr(translate, "_sizers", {})
+
+
+def _write_srt(path, lines):
+    path.write_text("".join(
+        f"{i + 1}\n00:00:{i:02d},000 --> 00:00:{i:02d},500\n{text}\n\n"
+        for i, text in enumerate(lines)), encoding="utf-8")
+    return str(path)
+
+
+def test_translates_every_line(stub, make_router, tmp_path):
+    server = stub()
+    make_router({"Stub": provider(server.base_url)},
+                {"translate": {"provider": "Stub", "model": "stub"}})
+    lines = [f"line {i}" for i in range(12)]
+    out = translate.translate_srt_file(_write_srt(tmp_path / "in.srt", lines),
+                                       source_lang="en", target_lang="fr",
+                                       batch_size=5)
+    text = open(out, encoding="utf-8").read()
+    # The stub echoes each marked line back as its "translation".
+    assert all(line in text for line in lines)
+    assert server.requests["ok"] == 3
+
+
+def test_unparseable_srt_raises_value_error(tmp_path):
+    path = tmp_path / "in.srt"
+    path.write_text("not a subtitle file", encoding="utf-8")
+    with pytest.raises(ValueError) as info:
+        translate.translate_srt_file(str(path), source_lang="en", target_lang="fr")
+    assert isinstance(info.value.__cause__, srt.SRTParseError)
+
+
+def test_memory_is_filed_under_the_answering_provider(stub, make_router, tmp_path):
+    broken, healthy = stub(rate_500=1.0), stub()
+    r = make_router({"Broken": provider(broken.base_url, model="m-broken"),
+                     "Healthy": provider(healthy.base_url, priority=2)},
+                    {"translate": {"provider": "Broken", "model": "m-broken"}})
+    translate.translate_srt_file(_write_srt(tmp_path / "in.srt", ["hello", "world"]),
+                                 source_lang="en", target_lang="fr")
+    remembered = r._memory._connect().execute(
+        "SELECT DISTINCT provider, model FROM memory").fetchall()
+    assert remembered == [("Healthy", "stub")]
+
+
+def test_repair_pass_fills_skipped_lines(stub, make_router, tmp_path, monkeypatch):
+    server = stub()
+    make_router({"Stub": provider(server.base_url)},
+                {"translate": {"provider": "Stub", "model": "stub"}})
+    real = ai.complete_json_stream
+
+    def skipping(prompt, **kwargs):
+        # Large batches lose every third item; the small repair batches don't.
+        size = prompt.count("【") - 1
+        for k, item in enumerate(real(prompt, **kwargs)):
+            if size > 5 and k % 3 == 0:
+                continue
+            yield item
+
+    monkeypatch.setattr(ai, "complete_json_stream", skipping)
+    lines = [f"line {i}" for i in range(20)]
+    logs = []
+    out = translate.translate_srt_file(_write_srt(tmp_path / "in.srt", lines),
+                                       source_lang="en", target_lang="fr",
+                                       batch_size=10, log_cb=logs.append)
+    assert any("补译第 1 轮" in message for message in logs)
+    assert any("所有 20 条字幕都已翻译" in message for message in logs)
+    assert not os.path.exists(out + ".journal")
+    assert open(out, encoding="utf-8").read().count("line ") == 20
+
+
+def test_multi_writes_one_file_per_language(stub, make_router, tmp_path):
+    server = stub()
+    make_router({"Stub": provider(server.base_url)},
+                {"translate": {"provider": "Stub", "model": "stub"}})
+    outputs = translate.translate_srt_multi(
+        _write_srt(tmp_path / "in.srt", ["hello", "world"]),
+        source_lang="en", targets=["fr", "de", "fr"])
+    assert list(outputs) == ["fr", "de"]
+    assert len(set(outputs.values())) == 2
+    assert all(os.path.exists(path) for path in outputs.values())
+
+
+@pytest.mark.parametrize("targets", [["jw", "jv"], ["xx", "yy"]])
+def test_multi_rejects_targets_sharing_an_output_name(tmp_path, targets):
+    with pytest.raises(ValueError):
+        translate.translate_srt_multi(_write_srt(tmp_path / "in.srt", ["hello"]),
+                                      source_lang="en", targets=targets)
+
+
+def test_lines_of_a_failed_batch_that_arrived_count_as_done(stub, make_router, tmp_path,
+                                                            monkeypatch):
+    server = stub()
+    make_router({"Stub": provider(server.base_url)},
+                {"translate": {"provider": "Stub", "model": "stub"}})
+    real = ai.complete_json_stream
+
+    def fails_after_the_items(prompt, **kwargs):
+        yield from real(prompt, **kwargs)
+        raise RuntimeError("connection reset after the last item")
+
+    monkeypatch.setattr(ai, "complete_json_stream", fails_after_the_items)
+    logs = []
+    out = translate.translate_srt_file(_write_srt(tmp_path / "in.srt", ["a", "b", "c"]),
+                                       source_lang="en", target_lang="fr",
+                                       log_cb=logs.append)
+    assert not any("未能翻译" in message for message in logs)
+    assert not os.path.exists(out + ".journal")
+
+
+def test_journal_skips_lines_that_are_not_objects(tmp_path):
+    path = tmp_path / "out.srt.journal"
+    path.write_text('{"key": "k"}\n1\n"x"\n{"lines": [1]}\n{"lines": {"3": "drei"}}\n',
+                    encoding="utf-8")
+    assert translate._Journal(str(path), "k").load() == {3: "drei"}
+
+
+@pytest.mark.parametrize("header", ["1", '"k"', "[]", "null"])
+def test_journal_without_an_object_header_is_ignored(tmp_path, header):
+    path = tmp_path / "out.srt.journal"
+    path.write_text(f'{header}\n{{"lines": {{"3": "drei"}}}}\n', encoding="utf-8")
+    assert translate._Journal(str(path), "k").load() == {}